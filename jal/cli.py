@@ -0,0 +1,270 @@
+import sys
+import os
+import logging
+import argparse
+import traceback
+from datetime import datetime, timezone
+from PySide6.QtCore import QCoreApplication
+
+from jal.constants import MarketDataFeed
+from jal.db.db import JalDB, JalDBError
+from jal.db.backend import DbBackend
+from jal.db.helpers import get_app_path
+from jal.widgets.helpers import set_headless
+
+COMMANDS = ['rebuild', 'import', 'quotes', 'tax']
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_DB_ERROR = 3
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Logging handler that counts errors which were reported during command execution (it defines command exit code)
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(level=logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Replacement of main window progress bar (see Ledger.setProgressBar()) that reports progress into log every 10%
+class ConsoleProgress:
+    STEPS = 10
+
+    def __init__(self, title: str):
+        self._title = title
+        self._total = 0
+        self._step = 0
+
+    def setRange(self, _minimum, maximum):
+        self._total = maximum
+        self._step = 0
+
+    def setValue(self, value):
+        if self._total <= 0:
+            return
+        step = (value + 1) * self.STEPS // self._total
+        if step > self._step:
+            self._step = step
+            logging.info(f"{self._title}: {min(step * 100 // self.STEPS, 100)}% ({value + 1}/{self._total})")
+
+    def showProgressBar(self, _visible):
+        pass
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Converts given date 'YYYY-MM-DD' (UTC) or integer timestamp value into timestamp
+def timestamp(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', YYYY-MM-DD or timestamp is expected")
+
+
+# Converts comma-separated list of data source names (MarketDataFeed constants like 'FX,US,COIN') into list of ids
+def sources(value: str) -> list:
+    sources_list = []
+    for name in value.split(','):
+        source = getattr(MarketDataFeed, name.strip().upper(), None)
+        if not isinstance(source, int) or source == MarketDataFeed.NA:
+            raise argparse.ArgumentTypeError(f"unknown data source '{name}'")
+        sources_list.append(source)
+    return sources_list
+
+
+# Returns True if command line arguments 'argv' ask for a command (or help): first argument after global options
+# should be one of COMMANDS. Other arguments (like file names) aren't checked as they may be anything.
+def has_command(argv: list) -> bool:
+    i = 0
+    while i < len(argv) and argv[i].split('=')[0] in ['--data-path', '--upgrade-schema', '--verbose']:
+        i += 2 if argv[i] == '--data-path' else 1
+    return i < len(argv) and argv[i] in COMMANDS + ['-h', '--help']
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="jal", description="JAL command line interface")
+    parser.add_argument("--data-path", default=get_app_path(),
+                        help="Folder with JAL database file (application folder by default)")
+    parser.add_argument("--upgrade-schema", action="store_true", help="Upgrade outdated database without confirmation")
+    parser.add_argument("--verbose", action="store_true", help="Report debug messages")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild", help="Re-build ledger")
+    rebuild.add_argument("--from", dest="start", type=timestamp, default=None,
+                         help="Re-build since given date (YYYY-MM-DD); incremental re-build if omitted")
+    rebuild.add_argument("--full", action="store_true", help="Re-build ledger from scratch")
+    rebuild.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    rebuild.add_argument("--fixed-point", choices=["on", "off"], default=None,
+                         help="Switch storage of ledger amounts to integers scaled by account precision (on) or to "
+                              "decimal text (off), ledger is re-built from scratch then")
+
+    statement = commands.add_parser("import", help="Import broker statement files")
+    statement.add_argument("--format", required=True, help="Statement module or class name (like 'ibkr')")
+    statement.add_argument("--no-rebuild", action="store_true", help="Don't re-build ledger after import")
+    statement.add_argument("--allow-overlap", action="store_true",
+                           help="Import statement that starts before last recorded operation of the account")
+    statement.add_argument("files", nargs='+', help="Statement files")
+
+    quotes = commands.add_parser("quotes", help="Download quotes and currency rates")
+    quotes.add_argument("--start", type=timestamp, required=True, help="Start date (YYYY-MM-DD)")
+    quotes.add_argument("--end", type=timestamp, default=int(datetime.now(tz=timezone.utc).timestamp()),
+                        help="End date (YYYY-MM-DD), today by default")
+    quotes.add_argument("--sources", type=sources,
+                        default=[x for x in MarketDataFeed().get_all_names() if x != MarketDataFeed.NA],
+                        help="Comma-separated list of data sources (FX,RU,US,EU,CA,GB,FRA,SMA_VICTORIA,COIN), "
+                             "all by default")
+
+    tax = commands.add_parser("tax", help="Export tax report into xlsx-file")
+    tax.add_argument("--country", required=True, help="Country code of tax report (pt, ru)")
+    tax.add_argument("--year", type=int, required=True, help="Year of tax report")
+    tax.add_argument("--account", required=True, help="Account id, name or number")
+    tax.add_argument("--output", required=True, help="Name of xlsx-file for report")
+    tax.add_argument("--no-settlement", action="store_true", help="Use trade date instead of settlement date")
+    return parser
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def rebuild(args) -> int:
+    from jal.db.ledger import Ledger
+    ledger = Ledger()
+    progress = ConsoleProgress("Ledger re-build")
+    ledger.setProgressBar(progress, progress)
+    if args.fixed_point is not None:
+        ledger.set_fixed_point(args.fixed_point == "on", workers=args.workers)
+        return EXIT_OK
+    from_timestamp = 0 if args.full else (-1 if args.start is None else args.start)
+    ledger.rebuild(from_timestamp=from_timestamp, workers=args.workers)
+    return EXIT_OK
+
+
+def import_statements(args) -> int:
+    from jal.db.ledger import Ledger
+    from jal.data_import.statements import Statements
+    from jal.data_import.statement import Statement_ImportError
+    statements = Statements(None)
+    loader = statements.find_loader(args.format)
+    if loader is None:
+        logging.error(f"Unknown statement format '{args.format}', available: " +
+                      ", ".join([x['module'].__name__.split('.')[-1] for x in statements.items]))
+        return EXIT_FAILURE
+    try:
+        result = statements.import_files(loader, args.files, allow_period_overlap=args.allow_overlap)
+    except Statement_ImportError as e:
+        logging.error(f"Import failed: {e}")
+        return EXIT_FAILURE
+    if result is None:
+        logging.warning("No statements were imported")
+    elif not args.no_rebuild:
+        Ledger().rebuild()
+    return EXIT_OK
+
+
+def download_quotes(args) -> int:
+    from jal.net.downloader import QuoteDownloader
+    from jal.net.helpers import close_sessions
+    try:
+        QuoteDownloader().DownloadData(args.start, args.end, args.sources)
+    finally:
+        close_sessions()
+    return EXIT_OK
+
+
+def export_tax_report(args) -> int:
+    from jal.db.account import JalAccount
+    from jal.data_export.taxes import TaxReport
+    from jal.data_export.xlsx import XLSX
+    country = [x for x in TaxReport.countries if TaxReport.countries[x]['flag'] == args.country.lower()]
+    if not country:
+        logging.error(f"Tax report isn't available for country '{args.country}'")
+        return EXIT_FAILURE
+    account = [x for x in JalAccount.get_all_accounts(active_only=False)
+               if args.account in [str(x.id()), x.name(), x.number()]]
+    if len(account) != 1:
+        logging.error(f"Account '{args.account}' wasn't found or isn't unique")
+        return EXIT_FAILURE
+    taxes = TaxReport.create_report(country[0])
+    tax_report = taxes.prepare_tax_report(args.year, account[0].id(), use_settlement=(not args.no_settlement))
+    if not tax_report:
+        logging.error("Tax report is empty")
+        return EXIT_FAILURE
+    reports_xls = XLSX(args.output)
+    parameters = taxes.report_parameters()
+    for section in tax_report:
+        reports_xls.output_data(tax_report[section], taxes.report_template(section), parameters)
+    reports_xls.save()
+    logging.info(f"Tax report was saved to file '{args.output}'")
+    return EXIT_OK
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Opens database in given folder. Returns JalDBError
+def open_db(data_path: str, upgrade_schema: bool) -> JalDBError:
+    error = JalDB().init_db(data_path, backend=DbBackend.SQLITE3)
+    if error.code == JalDBError.OutdatedDbSchema:
+        if not upgrade_schema:
+            JalDB.close_db()
+            return JalDBError(JalDBError.OutdatedDbSchema, details="(use --upgrade-schema option to update it)")
+        error = JalDB().update_db_schema(data_path, confirm=False)
+        if error.code == JalDBError.NoError:
+            error = JalDB().init_db(data_path, backend=DbBackend.SQLITE3)
+    return error
+
+
+# Runs command that is given by command line arguments 'argv' without application window.
+# Returns exit code: 0 if command was completed without errors, non-zero value otherwise.
+def main(argv=None) -> int:
+    if QCoreApplication.instance() is None:
+        _app = QCoreApplication([])
+    args = create_parser().parse_args(argv)
+    data_path = args.data_path if args.data_path.endswith(os.sep) else args.data_path + os.sep
+    logger = logging.getLogger()
+    log_handler = logging.StreamHandler(sys.stderr)
+    log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    error_counter = ErrorCounter()
+    log_level = logger.level
+    logger.addHandler(log_handler)
+    logger.addHandler(error_counter)
+    logger.setLevel(logging.DEBUG if args.verbose else logging.INFO)
+    set_headless(True)
+    commands = {
+        'rebuild': rebuild,
+        'import': import_statements,
+        'quotes': download_quotes,
+        'tax': export_tax_report
+    }
+    try:
+        error = open_db(data_path, args.upgrade_schema)
+        if error.code != JalDBError.NoError:
+            logging.error(f"Database initialization failed: {error.message} {error.details}")
+            return EXIT_DB_ERROR
+        start_time = datetime.now()
+        logging.info(f"Command '{args.command}' started")
+        try:
+            exit_code = commands[args.command](args)
+        except Exception:
+            logging.error(f"{traceback.format_exc()}")
+            exit_code = EXIT_FAILURE
+        finally:
+            JalDB.close_db()
+        if exit_code == EXIT_OK and error_counter.count:
+            exit_code = EXIT_FAILURE
+        logging.info(f"Command '{args.command}' {'completed' if exit_code == EXIT_OK else 'failed'}, "
+                     f"errors: {error_counter.count}, elapsed time: {datetime.now() - start_time}")
+        return exit_code
+    finally:
+        logger.removeHandler(log_handler)
+        logger.removeHandler(error_counter)
+        logger.setLevel(log_level)
+        set_headless(False)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,13 +8,28 @@ from PySide6.QtWidgets import QComboBox
 class Setup:
     DB_PATH = "jal.sqlite"
     DB_CONNECTION = "JAL.DB"
-    DB_REQUIRED_VERSION = 52
+    DB_BACKEND = "qtsql"      # Default backend for JalDB queries, may be changed by 'DbBackend' setting (see backend.py)
+    DB_REQUIRED_VERSION = 63
+    # SQLite pragmas that are applied to every database connection, they may be overridden by 'DbPragmas' setting
+    DB_PRAGMAS = {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -65536, "mmap_size": 268435456,
+                  "temp_store": "MEMORY"}
+    DB_READERS = 4            # Max number of read-only connections in a pool for concurrent readers
     SQLITE_MIN_VERSION = "3.35"
     MAIN_WND_NAME = "JAL_MainWindow"
     INIT_SCRIPT_PATH = 'jal_init.sql'
     UPDATES_PATH = 'updates'
     ICONS_PATH = "img"
     NET_PATH = "net"
+    NET_WORKERS = 4           # Number of concurrent downloads (every download uses a reader from DB connection pool)
+    NET_TIMEOUT = 60          # Timeout of network requests, seconds
+    NET_RETRIES = 3           # Number of retries of failed network requests
+    NET_BACKOFF = 0.5         # Retry delay factor: delays are 0.5s, 1s, 2s, ...
+    # Max number of requests per second for quote sources
+    NET_RATE_LIMITS = {"iss.moex.com": 10, "query1.finance.yahoo.com": 2, "live.euronext.com": 2,
+                       "app-money.tmx.com": 2, "sdw-wsrest.ecb.europa.eu": 5, "www.cbr.ru": 2, "api.coinbase.com": 5}
+    NET_CACHE_PATH = "net_cache"   # Folder for cached replies of daily quote sources (relative to database folder)
+    NET_CACHE_AGE = 180            # Cached replies that weren't used during this number of days are removed
+    NET_CACHE_SIZE = 64 * 1024 * 1024   # Max total size of cached replies, bytes (least recently used are removed)
     IMPORT_PATH = "data_import"
     EXPORT_PATH = "data_export"
     IMPORT_SCHEMA_NAME = "import_schema.json"
@@ -29,6 +44,7 @@ class Setup:
     DEFAULT_ACCOUNT_PRECISION = 2
     NULL_VALUE = '-.--'
     MAX_TIMESTAMP = 9999999999
+    HOLDINGS_SNAPSHOT_MONTHS = 1   # Holdings snapshots are stored at the end of every N-th month (see JalHoldings)
 
 
 #-----------------------------------------------------------------------------------------------------------------------
@@ -193,6 +209,19 @@ class MarketDataFeed(PredefinedList, QObject):
         }
 
 
+class QuoteCoverage:   # Status of a day in quotes coverage index (see JalQuoteCoverage)
+    Unknown = 0         # Quote source wasn't checked for the day
+    Complete = 1        # Quote for the day was downloaded
+    Missing = 2         # Quote source has no quote for the day (weekend, holiday)
+    Failed = 3          # Download of the day failed
+
+
+class QuoteState:      # State of a quotation that is in effect at given moment (see JalAsset.quote_state())
+    NoData = 0          # There are no quotes at all
+    Actual = 1          # Quote is the latest one that quote source has for the moment
+    Stale = 2           # There is an older quote but quote source wasn't checked for the moment
+
+
 class CustomColor:
     Black = QColor(0, 0, 0)
     DarkGreen = QColor(0, 100, 0)
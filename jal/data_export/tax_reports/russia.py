@@ -257,11 +257,10 @@ class TaxesRussia(TaxReport):
     def prepare_crypto(self):
         country = self.account.country()
         crypto_report = []
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() == PredefinedAsset.Crypto]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+        trades = self.account.closed_trades_list(begin=self.year_begin, end=self.year_end, settlement=True,
+                                                 asset_types=[PredefinedAsset.Crypto],
+                                                 open_types=[LedgerTransaction.Trade],
+                                                 close_types=[LedgerTransaction.Trade])
         for trade in trades:
             o_rate = self.account_currency.quote(trade.open_operation().timestamp(), self._currency_id)[1]
             c_rate = self.account_currency.quote(trade.close_operation().timestamp(), self._currency_id)[1]
@@ -383,10 +382,9 @@ class TaxesRussia(TaxReport):
     # -----------------------------------------------------------------------------------------------------------------------
     def prepare_corporate_actions(self):
         corporate_actions_report = []
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.CorporateAction]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+        trades = self.account.closed_trades_list(begin=self.year_begin, end=self.year_end, settlement=True,
+                                                 open_types=[LedgerTransaction.CorporateAction],
+                                                 close_types=[LedgerTransaction.Trade])
         trades = sorted(trades, key=lambda x: (x.asset().symbol(self.account_currency.id()), x.close_operation().timestamp()))
         group = 1
         share = Decimal('1.0')   # This will track share of processed asset, so it starts from 100.0%
@@ -457,8 +455,7 @@ class TaxesRussia(TaxReport):
 
     def next_corporate_action(self, actions, trade, qty, share, level, group):
         # get list of deals that were closed as result of current corporate action
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.CorporateAction]
+        trades = self.account.closed_trades_list(close_types=[LedgerTransaction.CorporateAction])
         trades = [x for x in trades if x.close_operation().id() == trade.open_operation().id()]
         for item in trades:
             if item.open_operation().type() == LedgerTransaction.Trade:
@@ -7,8 +7,10 @@ from PySide6.QtWidgets import QApplication
 
 from jal.constants import Setup, PredefinedAsset
 from jal.db.helpers import get_app_path
+from jal.widgets.helpers import ts2d
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
+from jal.db.peer import JalPeer
 from jal.db.operations import LedgerTransaction, Dividend
 
 REPORT_METHOD = 0
@@ -61,6 +63,16 @@ class TaxReport:
         else:
             return self.reports[report_name][REPORT_TEMPLATE]
 
+    # Returns parameters that are put into header of every report section in xlsx-file
+    def report_parameters(self) -> dict:
+        return {
+            "period": f"{ts2d(self.year_begin)} - {ts2d(self.year_end - 1)}",
+            "account": f"{self.account.number()} ({JalAsset(self.account.currency()).symbol()})",
+            "currency": JalAsset(self.account.currency()).symbol(),
+            "broker_name": JalPeer(self.account.organization()).name(),
+            "broker_iso_country": self.account.country().iso_code()
+        }
+
     # Loads report parameters for given year into self._parameters
     def load_parameters(self, year: int):
         year_key = str(year)
@@ -120,28 +132,25 @@ class TaxReport:
 
     # Returns a list of closed stock/ETF trades that should be included into the report for given year
     def shares_trades_list(self) -> list:
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() in [PredefinedAsset.Stock, PredefinedAsset.ETF]]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
+        trades = self.account.closed_trades_list(begin=self.year_begin, end=self.year_end, settlement=True,
+                                                 asset_types=[PredefinedAsset.Stock, PredefinedAsset.ETF],
+                                                 open_types=[LedgerTransaction.Trade, LedgerTransaction.Dividend],
+                                                 close_types=[LedgerTransaction.Trade])
         trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade or (
-                x.open_operation().type() == LedgerTransaction.Dividend and (
                 x.open_operation().subtype() == Dividend.StockDividend or
-                x.open_operation().subtype() == Dividend.StockVesting))]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+                x.open_operation().subtype() == Dividend.StockVesting)]
         return trades
 
     def derivatives_trades_list(self) -> list:
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() == PredefinedAsset.Derivative]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+        trades = self.account.closed_trades_list(begin=self.year_begin, end=self.year_end, settlement=True,
+                                                 asset_types=[PredefinedAsset.Derivative],
+                                                 open_types=[LedgerTransaction.Trade],
+                                                 close_types=[LedgerTransaction.Trade])
         return trades
 
     def bonds_trades_list(self) -> list:
-        trades = self.account.closed_trades_list()
-        trades = [x for x in trades if x.asset().type() == PredefinedAsset.Bond]
-        trades = [x for x in trades if x.close_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if x.open_operation().type() == LedgerTransaction.Trade]
-        trades = [x for x in trades if self.year_begin <= x.close_operation().settlement() <= self.year_end]
+        trades = self.account.closed_trades_list(begin=self.year_begin, end=self.year_end, settlement=True,
+                                                 asset_types=[PredefinedAsset.Bond],
+                                                 open_types=[LedgerTransaction.Trade],
+                                                 close_types=[LedgerTransaction.Trade])
         return trades
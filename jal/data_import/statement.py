@@ -15,7 +15,7 @@ from jal.db.helpers import get_app_path
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
 from jal.db.operations import LedgerTransaction, Dividend, CorporateAction
-from jal.widgets.helpers import ts2d
+from jal.widgets.helpers import ts2d, is_interactive
 from jal.widgets.account_select import SelectAccountDialog
 from jal.net.downloader import QuoteDownloader
 
@@ -120,6 +120,9 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         self._data = {}
         self._previous_accounts = {}
         self._last_selected_account = None
+        # Statement that starts before last recorded operation of account is imported in non-interactive mode only
+        # if this flag is set (interactive user is asked for confirmation)
+        self.allow_period_overlap = False
         self._section_loaders = {
             FOF.PERIOD: self._check_period,
             FOF.ASSETS: self._import_assets,
@@ -352,6 +355,13 @@ class Statement(QObject):   # derived from QObject to have proper string transla
         for account in accounts:
             if account['id'] < 0:  # Checks if report is after last transaction recorded for account.
                 if period[0] < JalAccount(-account['id']).last_operation_date():
+                    if not is_interactive():
+                        if not self.allow_period_overlap:
+                            raise Statement_ImportError(
+                                self.tr("Statement period starts before last recorded operation for the account") +
+                                f" '{JalAccount(-account['id']).name()}'")
+                        logging.warning(self.tr("Statement period starts before last recorded operation for the account"))
+                        continue
                     if QMessageBox().warning(None, self.tr("Confirmation"),
                                              self.tr("Statement period starts before last recorded operation for the account. Continue import?"),
                                              QMessageBox.Yes, QMessageBox.No) == QMessageBox.No:
@@ -567,6 +577,9 @@ class Statement(QObject):   # derived from QObject to have proper string transla
     def select_account(self, text, account_id, recent_account_id=0):
         if "pytest" in sys.modules:
             return 1    # Always return 1st account if we are in testing mode
+        if not is_interactive():
+            logging.warning(self.tr("Account can't be selected in non-interactive mode: ") + text)
+            return 0
         dialog = SelectAccountDialog(text, account_id, recent_account=recent_account_id)
         if dialog.exec() != QDialog.Accepted:
             return 0
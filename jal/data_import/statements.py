@@ -63,28 +63,44 @@ class Statements(QObject):
             return
         JalSettings().setRecentFolder(FolderFor.Statement, statement_files[0])
 
+        try:
+            result = self.import_files(statement_loader, statement_files)
+        except Statement_ImportError as e:
+            logging.error(self.tr("Import failed: ") + str(e))
+            self.load_failed.emit()
+            return
+        if result is not None:
+            self.load_completed.emit(*result)
+
+    # Returns statement loader item (from self.items) that has given module or class name or None if not found
+    def find_loader(self, name: str):
+        for item in self.items:
+            if name.lower() in [item['module'].__name__.split('.')[-1].lower(), item['loader_class'].lower()]:
+                return item
+        return None
+
+    # Imports statement files with help of given statement loader (an item from self.items)
+    # Returns a tuple (end of statement period, statement totals) for the last file or None if nothing was imported
+    # Raises Statement_ImportError if any file fails to be imported
+    # allow_period_overlap - import statements that start before last recorded operation without confirmation
+    def import_files(self, statement_loader, statement_files, allow_period_overlap=False):
         module = statement_loader['module']
         class_instance = getattr(module, statement_loader['loader_class'])
         if len(statement_files) > 1:
             if not Statement_Capabilities.MULTIPLE_LOAD in class_instance.capabilities():
-                logging.warning(statement_loader['name'] +
-                                self.tr(" - module doesn't support multiple statements load."))
-                return
+                raise Statement_ImportError(statement_loader['name'] +
+                                            self.tr(" - module doesn't support multiple statements load."))
             statement_files = class_instance.order_statements(statement_files)
         if not statement_files:
-            return
+            return None
         for statement_file in statement_files:
             statement = class_instance()
-            try:
-                statement.load(statement_file)
-                logging.info(self.tr("Statement file loaded successfully"))
-                statement.validate_format()
-                statement.match_db_ids()
-                logging.info(self.tr("Importing statement into database..."))
-                totals = statement.import_into_db()
-                logging.info(self.tr("Statement import completed successfully"))
-            except Statement_ImportError as e:
-                logging.error(self.tr("Import failed: ") + str(e))
-                self.load_failed.emit()
-                return
-        self.load_completed.emit(statement.period()[1], totals)
+            statement.allow_period_overlap = allow_period_overlap
+            statement.load(statement_file)
+            logging.info(self.tr("Statement file loaded successfully"))
+            statement.validate_format()
+            statement.match_db_ids()
+            logging.info(self.tr("Importing statement into database..."))
+            totals = statement.import_into_db()
+            logging.info(self.tr("Statement import completed successfully"))
+        return statement.period()[1], totals
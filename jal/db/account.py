@@ -1,3 +1,5 @@
+import json
+from bisect import insort, bisect_left, bisect_right
 from decimal import Decimal
 from jal.db.db import JalDB
 from jal.db.asset import JalAsset
@@ -10,20 +12,22 @@ from jal.db.helpers import format_decimal, now_ts
 
 
 class JalAccount(JalDB):
-    db_cache = []
+    db_cache = {}           # Account data by account id: {account_id: {field: value}}
+    _number_index = {}      # Account ids by account number: {number: [account_id]}
+    _cache_backend = None   # Database connection that db_cache was loaded from
     MONEY_FLOW = 1
     ASSETS_FLOW = 2
 
     def __init__(self, account_id: int = 0, data: dict = None, search: bool = False, create: bool = False) -> None:
         super().__init__(cached=True)
-        if not JalAccount.db_cache:
+        if not JalAccount.db_cache or JalAccount._cache_backend is not JalDB._backend:
             self._fetch_data()
         self._id = account_id
         if self._valid_data(data, search, create):
             if search:
                 self._id = self._find_account(data)
             if create and not self._id:   # If we haven't found peer before and requested to create new record
-                similar_id = self._read("SELECT id FROM accounts WHERE :number=number", [(":number", data['number'])])
+                similar_id = JalAccount._number_index.get(data['number'], [0])[0]
                 if similar_id:
                     self._id = self.__copy_similar_account(similar_id, data)
                 else:   # Create new account record
@@ -41,7 +45,7 @@ class JalAccount(JalDB):
                          (":country", data['country']), (":precision", data['precision'])], commit=True)
                     self._id = query.lastInsertId()
                 self._fetch_data(only_self=True)
-        self._data = next((x for x in self.db_cache if x['id']==self._id), None)
+        self._data = JalAccount.db_cache.get(self._id, None)
         self._type = self._data['type_id'] if self._data is not None else None
         self._name = self._data['name'] if self._data is not None else ''
         self._number = self._data['number'] if self._data is not None else None
@@ -63,18 +67,31 @@ class JalAccount(JalDB):
 
     def _fetch_data(self, only_self=False):
         if only_self:
-            element = next((x for x in self.db_cache if x['id']==self._id), None)
+            self._unindex_account(self._id)
             data = self._read("SELECT * FROM accounts WHERE id=:id", [(":id", self._id)], named=True)
             if data is not None:
-                if element is not None:
-                    JalAccount.db_cache[JalAccount.db_cache.index(element)] = data
-                else:
-                    JalAccount.db_cache.append(data)
+                self._index_account(data)
         else:
-            JalAccount.db_cache = []
+            JalAccount._cache_backend = JalDB._backend
+            JalAccount.db_cache = {}
+            JalAccount._number_index = {}
             query = self._exec("SELECT * FROM accounts ORDER BY id")
             while query.next():
-                JalAccount.db_cache.append(self._read_record(query, named=True))
+                self._index_account(self._read_record(query, named=True))
+
+    # Puts account data into cache and its number index (lists of ids in index are kept sorted)
+    @classmethod
+    def _index_account(cls, data: dict) -> None:
+        JalAccount.db_cache[data['id']] = data
+        insort(JalAccount._number_index.setdefault(data['number'], []), data['id'])
+
+    @classmethod
+    def _unindex_account(cls, account_id: int) -> None:
+        data = JalAccount.db_cache.pop(account_id, None)
+        if data is not None and data['number'] in JalAccount._number_index:
+            JalAccount._number_index[data['number']].remove(account_id)
+            if not JalAccount._number_index[data['number']]:
+                del JalAccount._number_index[data['number']]
 
     # Method returns a list of JalAccount objects for accounts of given type (or all if None given)
     # Flag "active_only" allows only active accounts output by default
@@ -181,6 +198,7 @@ class JalAccount(JalDB):
         _ = self._exec("UPDATE accounts SET organization_id=:peer_id WHERE id=:id",
                        [(":id", self._id), (":peer_id", peer_id)])
         self._organization_id = peer_id
+        self._fetch_data(only_self=True)
 
     def reconciled_at(self) -> int:
         return self._reconciled
@@ -194,10 +212,9 @@ class JalAccount(JalDB):
         return self._precision
 
     def last_operation_date(self) -> int:
-        last_timestamp = self._read("SELECT MAX(o.timestamp) FROM operation_sequence AS o "
-                                    "LEFT JOIN accounts AS a ON o.account_id=a.id WHERE a.id=:account_id",
+        last_timestamp = self._read("SELECT MAX(timestamp) FROM operation_sequence WHERE account_id=:account_id",
                                     [(":account_id", self._id)])
-        last_timestamp = 0 if last_timestamp == '' else last_timestamp
+        last_timestamp = 0 if last_timestamp in ['', None] else last_timestamp
         last_timestamp = now_ts() if last_timestamp > now_ts() else last_timestamp  # Skip future operations
         return last_timestamp
 
@@ -213,12 +230,13 @@ class JalAccount(JalDB):
             ") "
             "SELECT l.asset_id, amount_acc, value_acc "
             "FROM ledger l JOIN _last_ids d ON l.id=d.id "
-            "WHERE amount_acc!='0'",
+            "WHERE amount_acc!='0' AND amount_acc!=0",
             [(":account_id", self._id), (":timestamp", timestamp), (":assets", BookAccount.Assets)])
         while query.next():
-            try:
-                asset_id, amount, value = self._read_record(query, cast=[int, Decimal, Decimal])
-            except TypeError:  # Skip if None is returned (i.e. there are no assets)
+            asset_id, amount, value = self._read_record(query)
+            amount = self._ledger_decode(amount, self._precision)
+            value = self._ledger_decode(value, self._precision)
+            if asset_id == '' or amount is None or value is None:  # Skip if there are no assets
                 continue
             assets.append({"asset": JalAsset(asset_id), "amount": amount, "value": value})
         return assets
@@ -232,13 +250,13 @@ class JalAccount(JalDB):
                                "AND book_account=:money ORDER BY id DESC LIMIT 1",
                                [(":account_id", self._id), (":asset_id", asset_id),
                                 (":timestamp", timestamp), (":money", BookAccount.Money)])
-            money = Decimal('0') if money is None else Decimal(money)
+            money = Decimal('0') if money is None else self._ledger_decode(money, self._precision)
             debt = self._read("SELECT amount_acc FROM ledger "
                               "WHERE account_id=:account_id AND asset_id=:asset_id AND timestamp<=:timestamp "
                               "AND book_account=:liabilities ORDER BY id DESC LIMIT 1",
                               [(":account_id", self._id), (":asset_id", asset_id),
                                (":timestamp", timestamp), (":liabilities", BookAccount.Liabilities)])
-            debt = Decimal('0') if debt is None else Decimal(debt)
+            debt = Decimal('0') if debt is None else self._ledger_decode(debt, self._precision)
             return money + debt
         else:
             value = self._read("SELECT amount_acc FROM ledger "
@@ -246,30 +264,59 @@ class JalAccount(JalDB):
                                "AND book_account=:assets ORDER BY id DESC LIMIT 1",
                                [(":account_id", self._id), (":asset_id", asset_id),
                                 (":timestamp", timestamp), (":assets", BookAccount.Assets)])
-            amount = Decimal(value) if value is not None else Decimal('0')
+            amount = self._ledger_decode(value, self._precision) if value is not None else Decimal('0')
             return amount
 
     def get_book_turnover(self, book, begin, end) -> Decimal:
-        value = self._read("SELECT SUM(amount) FROM ledger WHERE account_id=:account_id AND book_account=:book "
-                           "AND timestamp>=:begin AND timestamp<=:end",
-                           [(":account_id", self._id), (":book", book), (":begin", begin), (":end", end)])
-        value = Decimal(value) if value else Decimal('0')
-        return value
+        return self._ledger_sum("SELECT amount FROM ledger WHERE account_id=:account_id AND book_account=:book "
+                                "AND timestamp>=:begin AND timestamp<=:end",
+                                [(":account_id", self._id), (":book", book), (":begin", begin), (":end", end)],
+                                self._precision)
 
     def get_category_turnover(self, category_id, begin, end) -> Decimal:
-        value = self._read("SELECT SUM(amount) FROM ledger WHERE account_id=:account_id AND category_id=:category "
-                           "AND timestamp>=:begin AND timestamp<=:end",
-                           [(":account_id", self._id), (":category", category_id), (":begin", begin), (":end", end)])
-        value = Decimal(value) if value else Decimal('0')
-        return value
-
-    # Returns a list of JalClosedTrade objects recorded for the account
-    def closed_trades_list(self) -> list:
-        trades = []
-        query = self._exec("SELECT id FROM trades_closed WHERE account_id=:account", [(":account", self._id)])
+        return self._ledger_sum("SELECT amount FROM ledger WHERE account_id=:account_id AND category_id=:category "
+                                "AND timestamp>=:begin AND timestamp<=:end",
+                                [(":account_id", self._id), (":category", category_id), (":begin", begin),
+                                 (":end", end)], self._precision)
+
+    # Returns a tuple of 2 dictionaries {book_account: [turnovers]} and {category_id: [turnovers]} with turnovers of
+    # given 'books' and 'categories' for every (begin, end) period in 'periods' list (the same values that
+    # get_book_turnover() and get_category_turnover() return). Periods may overlap as ledger records are selected with
+    # one query and running totals are accumulated for every book and category, so any period is a difference of two.
+    def get_turnovers(self, periods: list, books: list, categories: list) -> tuple:
+        book_turnovers = {x: [Decimal('0')] * len(periods) for x in books}
+        category_turnovers = {x: [Decimal('0')] * len(periods) for x in categories}
+        if not periods:
+            return book_turnovers, category_turnovers
+        running = {}   # {(is_category, key): ([timestamps], [running totals starting with 0])}
+        query = self._exec("SELECT book_account, coalesce(category_id, 0), timestamp, amount FROM ledger "
+                           "WHERE account_id=:account_id AND timestamp>=:begin AND timestamp<=:end "
+                           "AND (book_account IN (SELECT value FROM json_each(:books)) "
+                           "OR category_id IN (SELECT value FROM json_each(:categories))) ORDER BY timestamp",
+                           [(":account_id", self._id), (":begin", min([x[0] for x in periods])),
+                            (":end", max([x[1] for x in periods])), (":books", json.dumps(books)),
+                            (":categories", json.dumps(categories))], forward_only=True)
         while query.next():
-            trades.append(jal.db.closed_trade.JalClosedTrade(self._read_record(query, cast=[int])))
-        return trades
+            book, category_id, timestamp, amount = self._read_record(query, cast=[int, int, int, str])
+            amount = self._ledger_decode(amount, self._precision)
+            for key in [(False, book), (True, category_id)]:
+                if key[1] in (categories if key[0] else books):
+                    timestamps, totals = running.setdefault(key, ([], [Decimal('0')]))
+                    timestamps.append(timestamp)
+                    totals.append(totals[-1] + amount)
+        for (is_category, key), (timestamps, totals) in running.items():
+            turnovers = category_turnovers[key] if is_category else book_turnovers[key]
+            for i, (begin, end) in enumerate(periods):
+                turnovers[i] = totals[bisect_right(timestamps, end)] - totals[bisect_left(timestamps, begin)]
+        return book_turnovers, category_turnovers
+
+    # Returns a list of JalClosedTrade objects recorded for the account, filters are described in
+    # JalClosedTrade.get_list()
+    def closed_trades_list(self, begin: int = 0, end: int = Setup.MAX_TIMESTAMP, settlement: bool = False,
+                           asset_types: list = None, open_types: list = None, close_types: list = None) -> list:
+        return jal.db.closed_trade.JalClosedTrade.get_list(self._id, begin, end, settlement=settlement,
+                                                           asset_types=asset_types, open_types=open_types,
+                                                           close_types=close_types)
 
     # Creates a record in 'trades_open' table that manifests current asset position
     def open_trade(self, timestamp, otype, oid, asset, price, qty):
@@ -334,12 +381,9 @@ class JalAccount(JalDB):
         return True
 
     def _find_account(self, data: dict) -> int:
-        id = self._read("SELECT id FROM accounts WHERE number=:account_number AND currency_id=:currency",
-                        [(":account_number", data['number']), (":currency", data['currency'])], check_unique=True)
-        if id is None:
-            return 0
-        else:
-            return id
+        ids = [x for x in JalAccount._number_index.get(data['number'], [])
+               if JalAccount.db_cache[x]['currency_id'] == data['currency']]
+        return ids[0] if len(ids) == 1 else 0
 
     # Creates new account with different based on existing one.
     # Currency is taken from data['currency']. Name is auto-generated in form of AccountNumber.CurrencyName
@@ -364,24 +408,59 @@ class JalAccount(JalDB):
         signs = {'in': +1, 'out': -1}
         sign = signs[direction]
         sql = {
-            self.MONEY_FLOW: f"SELECT SUM(:sign*amount) FROM ledger WHERE (:sign*amount)>0 AND (book_account={BookAccount.Money} OR book_account={BookAccount.Liabilities})",
-            self.ASSETS_FLOW: f"SELECT SUM(:sign*value) FROM ledger WHERE (:sign*value)>0 AND book_account={BookAccount.Assets} AND op_type!={jal.db.operations.LedgerTransaction.CorporateAction}"
+            self.MONEY_FLOW: f"SELECT amount FROM ledger WHERE (:sign*amount)>0 AND (book_account={BookAccount.Money} OR book_account={BookAccount.Liabilities})",
+            self.ASSETS_FLOW: f"SELECT value FROM ledger WHERE (:sign*value)>0 AND book_account={BookAccount.Assets} AND op_type!={jal.db.operations.LedgerTransaction.CorporateAction}"
         }
-        value = self._read(sql[flow_type] + " AND account_id=:account_id AND timestamp>=:begin AND timestamp<=:end",
-                           [(":sign", sign), (":account_id", self._id), (":begin", begin), (":end", end)])
-        if value:
-            return Decimal(value)
-        else:
-            return Decimal('0')
+        value = self._ledger_sum(sql[flow_type] + " AND account_id=:account_id AND timestamp>=:begin AND timestamp<=:end",
+                                 [(":sign", sign), (":account_id", self._id), (":begin", begin), (":end", end)],
+                                 self._precision)
+        return sign * value
 
     # Returns account balance at given timestamp
     def balance(self, timestamp: int) -> Decimal:
-        value = Decimal('0')
-        assets = self.assets_list(timestamp)
-        for asset_data in assets:
-            asset = asset_data['asset']
-            asset_value = asset_data['amount'] * asset.quote(timestamp, self.currency())[1]
-            value += asset_value
-        money = self.get_asset_amount(timestamp, self.currency())
-        value += money
-        return value
+        money, assets = self.balance_history([timestamp])
+        return money[0] + assets[0]
+
+    # Returns a tuple of 2 lists (money, assets) with amount of money (including debts) and value of assets in account
+    # currency at every moment of sorted 'timestamps' list. Ledger state at the first moment is selected with one query,
+    # then ledger records up to the last moment are read with another one and replayed in timestamp order.
+    def balance_history(self, timestamps: list) -> tuple:
+        if not timestamps:
+            return [], []
+        condition = "account_id=:account_id AND (book_account=:assets OR " \
+                    "((book_account=:money OR book_account=:liabilities) AND asset_id=:currency))"
+        params = [(":account_id", self._id), (":assets", BookAccount.Assets), (":money", BookAccount.Money),
+                  (":liabilities", BookAccount.Liabilities), (":currency", self.currency())]
+        query = self._exec(f"WITH _last_ids AS (SELECT MAX(id) AS id FROM ledger WHERE {condition} "
+                           f"AND timestamp<=:begin GROUP BY book_account, asset_id) "
+                           f"SELECT l.timestamp, l.book_account, l.asset_id, l.amount_acc FROM ledger l "
+                           f"JOIN _last_ids d ON l.id=d.id", params + [(":begin", timestamps[0])])
+        records = []
+        while query.next():
+            records.append(self._read_record(query, cast=[int, int, int, str]))
+        query = self._exec(f"SELECT timestamp, book_account, asset_id, amount_acc FROM ledger WHERE {condition} "
+                           f"AND timestamp>:begin AND timestamp<=:end ORDER BY timestamp, id",
+                           params + [(":begin", timestamps[0]), (":end", timestamps[-1])], forward_only=True)
+        while query.next():
+            records.append(self._read_record(query, cast=[int, int, int, str]))
+        money = []
+        holdings = {}    # {asset_id: ([indices of timestamps], [amounts])} for moments when asset was held
+        amounts = {}     # Current ledger state {(book_account, asset_id): amount}
+        i = 0
+        for k, timestamp in enumerate(timestamps):
+            while i < len(records) and records[i][0] <= timestamp:
+                amounts[(records[i][1], records[i][2])] = self._ledger_decode(records[i][3], self._precision)
+                i += 1
+            money.append(amounts.get((BookAccount.Money, self.currency()), Decimal('0')) +
+                         amounts.get((BookAccount.Liabilities, self.currency()), Decimal('0')))
+            for (book, asset_id), amount in amounts.items():
+                if book == BookAccount.Assets and amount:
+                    holdings.setdefault(asset_id, ([], []))
+                    holdings[asset_id][0].append(k)
+                    holdings[asset_id][1].append(amount)
+        assets = [Decimal('0')] * len(timestamps)
+        for asset_id, (indices, asset_amounts) in holdings.items():
+            quotes = JalAsset(asset_id).quotes_at([timestamps[k] for k in indices], self.currency())
+            for k, amount, quote in zip(indices, asset_amounts, quotes):
+                assets[k] += amount * quote
+        return money, assets
@@ -1,30 +1,36 @@
 import logging
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from PySide6.QtCore import Qt, QDate
-from jal.constants import BookAccount, MarketDataFeed, AssetData, PredefinedAsset
+from jal.constants import BookAccount, MarketDataFeed, AssetData, PredefinedAsset, QuoteCoverage, QuoteState
 from jal.db.db import JalDB
-from jal.db.helpers import format_decimal, year_begin, year_end
+from jal.db.helpers import format_decimal, year_begin, year_end, nocase
 from jal.db.country import JalCountry
 from jal.db.tag import JalTag
+from jal.db.quote_coverage import JalQuoteCoverage
 from jal.widgets.helpers import ts2d
 
 
-# Helper function to convert db timestamp string into an integer and replace it as 0 if error happens
-def db_timestamp2int(timestamp_string: str) -> int:
-    try:
-        timestamp = int(timestamp_string)
-    except ValueError:
-        timestamp = 0
-    return timestamp
-
-
 class JalAsset(JalDB):
-    db_cache = []
+    db_cache = {}                   # Asset data by asset id: {asset_id: {field: value, 'symbols': [], 'data': {}}}
+    _isin_index = {}                # Asset ids by ISIN: {isin: [asset_id]}
+    _symbol_index = {}              # Active symbols: {symbol in upper case: [(asset_id, currency_id)]}
+    _reg_number_index = {}          # Asset ids by registration code: {reg_number: [asset_id]}
+    _name_index = {}                # Asset ids by full name: {name in upper case: [asset_id]}
+    _cache_backend = None           # Database connection that db_cache was loaded from
+    QUOTES_CACHE_SIZE = 500000      # Max number of quotes that are kept in memory (see _quotes_series())
+    QUOTES_CHUNK = 400              # Max number of quotes in one INSERT statement (SQLite has limit of 999 parameters)
+    _quotes_cache = OrderedDict()   # Quote series in LRU order: {(asset_id, currency_id): ([timestamps], [quotes])}
+    _quotes_cached = 0              # Size of _quotes_cache: number of quotes + number of series
+    _quotes_backend = None          # Database connection that cached quotes were loaded from
+    _quotes_version = 0             # Counter of quotes modifications, it allows other caches to detect changes
+    _base_currency_cache = None     # Base currency history ([timestamps], [currency ids]) or None if not loaded yet
 
     def __init__(self, asset_id: int = 0, data: dict = None, search: bool = False, create: bool = False) -> None:
         super().__init__(cached=True)
-        if not JalAsset.db_cache:
+        if not JalAsset.db_cache or JalAsset._cache_backend is not JalDB._backend:
             self._fetch_data()
         try:
             self._id = int(asset_id)
@@ -40,8 +46,8 @@ class JalAsset(JalDB):
                     [(":type", data['type']), (":full_name", data['name']),
                      (":isin", data['isin']), (":country", data['country'])], commit=True)
                 self._id = query.lastInsertId()
-                self._fetch_data()
-        self._data = next((x for x in self.db_cache if x['id'] == self._id), None)
+                self._fetch_data(self._id)
+        self._data = JalAsset.db_cache.get(self._id, None)
         self._type = self._data['type_id'] if self._data is not None else None
         self._name = self._data['full_name'] if self._data is not None else ''
         self._isin = self._data['isin'] if self._data is not None else None
@@ -57,33 +63,82 @@ class JalAsset(JalDB):
 
     def invalidate_cache(self):
         self._fetch_data()
+        self.drop_quotes_cache()
 
     # JalAsset maintains single cache available for all instances
     @classmethod
     def class_cache(cls) -> True:
         return True
 
-    def _fetch_data(self):
-        JalAsset.db_cache = []
-        query = self._exec("SELECT * FROM assets ORDER BY id")
+    # Loads data of all assets into cache or reloads only one asset if 'asset_id' is given (with help of 3 queries for
+    # assets, asset_tickers and asset_data tables)
+    @classmethod
+    def _fetch_data(cls, asset_id: int = None):
+        if asset_id is None:
+            JalAsset._cache_backend = JalDB._backend
+            JalAsset.db_cache = {}
+            JalAsset._isin_index = {}
+            JalAsset._symbol_index = {}
+            JalAsset._reg_number_index = {}
+            JalAsset._name_index = {}
+            condition, asset_condition, params = '', '', []
+        else:
+            cls._unindex_asset(asset_id)
+            condition, asset_condition, params = "WHERE asset_id=:id", "WHERE id=:id", [(":id", asset_id)]
+        assets = {}
+        query = cls._exec(f"SELECT * FROM assets {asset_condition} ORDER BY id", params)
         while query.next():
-            asset_data = self._read_record(query, named=True)
+            asset_data = cls._read_record(query, named=True)
             asset_data['symbols'] = []
-            symbols_query = self._exec("SELECT * FROM asset_tickers WHERE asset_id=:id", [(":id", asset_data['id'])])
-            while symbols_query.next():
-                symbol = self._read_record(symbols_query, named=True)
-                del symbol['id']
-                del symbol['asset_id']
+            assets[asset_data['id']] = asset_data
+        query = cls._exec(f"SELECT * FROM asset_tickers {condition} ORDER BY id", params)
+        while query.next():
+            symbol = cls._read_record(query, named=True)
+            asset_data = assets.get(symbol.pop('asset_id'), None)
+            del symbol['id']
+            if asset_data is not None:
                 asset_data['symbols'].append(symbol)
-            extra_data = {}
-            data_query = self._exec("SELECT datatype, value FROM asset_data WHERE asset_id=:id ORDER BY datatype",
-                                    [(":id", asset_data['id'])])
-            while data_query.next():
-                datatype, value = self._read_record(data_query)
-                extra_data[datatype] = value
-            if extra_data:
-                asset_data['data'] = extra_data
-            JalAsset.db_cache.append(asset_data)
+        query = cls._exec(f"SELECT asset_id, datatype, value FROM asset_data {condition} ORDER BY asset_id, datatype",
+                          params)
+        while query.next():
+            data_asset_id, datatype, value = cls._read_record(query)
+            if data_asset_id in assets:
+                assets[data_asset_id].setdefault('data', {})[datatype] = value
+        for asset_data in assets.values():
+            JalAsset.db_cache[asset_data['id']] = asset_data
+            cls._index_asset(asset_data)
+
+    # Adds asset into secondary indexes of cache. Lists of ids in indexes are kept sorted.
+    @classmethod
+    def _index_asset(cls, asset_data: dict) -> None:
+        asset_id = asset_data['id']
+        if asset_data['isin']:
+            insort(JalAsset._isin_index.setdefault(asset_data['isin'], []), asset_id)
+        if asset_data['full_name']:
+            insort(JalAsset._name_index.setdefault(nocase(asset_data['full_name']), []), asset_id)
+        reg_number = asset_data.get('data', {}).get(AssetData.RegistrationCode, '')
+        if reg_number:
+            insort(JalAsset._reg_number_index.setdefault(reg_number, []), asset_id)
+        for symbol in asset_data['symbols']:
+            if symbol['active'] == 1:
+                insort(JalAsset._symbol_index.setdefault(nocase(symbol['symbol']), []),
+                       (asset_id, symbol['currency_id'] if symbol['currency_id'] else 0))
+
+    # Removes asset from cache and its secondary indexes
+    @classmethod
+    def _unindex_asset(cls, asset_id: int) -> None:
+        asset_data = JalAsset.db_cache.pop(asset_id, None)
+        if asset_data is None:
+            return
+        indexes = [(JalAsset._isin_index, asset_data['isin']),
+                   (JalAsset._name_index, nocase(asset_data['full_name']) if asset_data['full_name'] else ''),
+                   (JalAsset._reg_number_index, asset_data.get('data', {}).get(AssetData.RegistrationCode, ''))]
+        indexes += [(JalAsset._symbol_index, nocase(x['symbol'])) for x in asset_data['symbols'] if x['active'] == 1]
+        for index, key in indexes:
+            if key in index:
+                index[key] = [x for x in index[key] if (x[0] if type(x) == tuple else x) != asset_id]
+                if not index[key]:
+                    del index[key]
 
     def dump(self) -> dict:
         return self._data
@@ -130,7 +185,7 @@ class JalAsset(JalDB):
             if existing['quote_source'] == MarketDataFeed.NA:
                 _ = self._exec("UPDATE asset_tickers SET quote_source=:data_source WHERE id=:id",
                                [(":data_source", data_source), (":id", existing['id'])])
-        self._fetch_data()
+        self._fetch_data(self._id)
 
     # Returns country object for the asset
     def country(self) -> JalCountry:
@@ -145,56 +200,136 @@ class JalAsset(JalDB):
     def quote(self, timestamp: int, currency_id: int) -> tuple:
         if self._id == currency_id:
             return timestamp, Decimal('1')
-        quote = self._read("SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id "
-                           "AND currency_id=:currency_id AND timestamp<=:timestamp ORDER BY timestamp DESC LIMIT 1",
-                           [(":asset_id", self._id), (":currency_id", currency_id), (":timestamp", timestamp)])
-        if quote is None:
-            if self._type == PredefinedAsset.Money and currency_id != self.get_base_currency(timestamp):  # find a cross-rate
-                rate1 = self.quote(timestamp, self.get_base_currency(timestamp))[1]
-                rate2 = JalAsset(currency_id).quote(timestamp, self.get_base_currency(timestamp))[1]
+        timestamps, quotes = self._quotes_series(currency_id)
+        i = bisect_right(timestamps, timestamp)
+        if i == 0:
+            base_currency = self.get_base_currency(timestamp)
+            if self._type == PredefinedAsset.Money and currency_id != base_currency:  # find a cross-rate
+                rate1 = self.quote(timestamp, base_currency)[1]
+                rate2 = JalAsset(currency_id).quote(timestamp, base_currency)[1]
                 rate = 0 if rate2 == Decimal('0') else rate1 / rate2
                 return timestamp, rate
             else:
                 logging.warning(self.tr("There are no quote/rate for ") +
                                 f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) {ts2d(timestamp)}")
                 return 0, Decimal('0')
-        return int(quote[0]), Decimal(quote[1])
+        return timestamps[i - 1], quotes[i - 1]
+
+    # Returns a list of quotes that quote() gives for every moment of sorted 'timestamps' list. Quotes are forward-filled
+    # from cached quotes series, quote() is called only for moments before the first quote (cross-rates or no data)
+    def quotes_at(self, timestamps: list, currency_id: int) -> list:
+        if self._id == currency_id:
+            return [Decimal('1')] * len(timestamps)
+        series, quotes = self._quotes_series(currency_id)
+        values = []
+        i = 0
+        for timestamp in timestamps:
+            while i < len(series) and series[i] <= timestamp:
+                i += 1
+            values.append(quotes[i - 1] if i > 0 else self.quote(timestamp, currency_id)[1])
+        return values
+
+    # Returns a state of quotation that quote() gives for given timestamp and currency (see QuoteState): it is actual
+    # if there is a quote for this day or quote source was checked for this day (i.e. it is a holiday) and stale if
+    # quote source wasn't checked for this day yet
+    def quote_state(self, timestamp: int, currency_id: int) -> int:
+        if self._id == currency_id:
+            return QuoteState.Actual
+        timestamps, _quotes = self._quotes_series(currency_id)
+        i = bisect_right(timestamps, timestamp)
+        if i == 0:
+            base_currency = self.get_base_currency(timestamp)
+            if self._type == PredefinedAsset.Money and currency_id != base_currency:  # check both legs of cross-rate
+                states = [self.quote_state(timestamp, base_currency),
+                          JalAsset(currency_id).quote_state(timestamp, base_currency)]
+                return QuoteState.NoData if QuoteState.NoData in states else max(states)
+            return QuoteState.NoData
+        day = timestamp - timestamp % 86400
+        if timestamps[i - 1] >= day:
+            return QuoteState.Actual
+        if self.quotes_coverage(currency_id).status(day) in [QuoteCoverage.Complete, QuoteCoverage.Missing]:
+            return QuoteState.Actual
+        return QuoteState.Stale
+
+    # Returns an index of days that were checked for quotes of the asset in given currency with current quote source
+    def quotes_coverage(self, currency_id: int) -> JalQuoteCoverage:
+        source = MarketDataFeed.FX if self._type == PredefinedAsset.Money else self.quote_source(currency_id)
+        return JalQuoteCoverage(self._id, currency_id, source)
+
+    # Returns a set of timestamps of days (between begin and end timestamps) that have quotes in given currency
+    def quoted_days(self, begin: int, end: int, currency_id: int) -> set:
+        return set([ts - ts % 86400 for ts, _quote in self.quotes(begin - begin % 86400, end, currency_id)])
 
     # Return a list of tuples (timestamp:int, quote:Decimal) of all quotes available for asset
     # for time interval begin-end
     def quotes(self, begin: int, end: int, currency_id: int) -> list:
-        quotes = []
-        query = self._exec(
-            "SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id "
-            "AND currency_id=:currency_id AND timestamp>=:begin AND timestamp<=:end ORDER BY timestamp",
-            [(":asset_id", self._id), (":currency_id", currency_id), (":begin", begin), (":end", end)])
-        while query.next():
-            timestamp, quote = self._read_record(query, cast=[int, Decimal])
-            quotes.append((timestamp, quote))
-        return quotes
+        timestamps, quotes = self._quotes_series(currency_id)
+        first = bisect_left(timestamps, begin)
+        last = bisect_right(timestamps, end)
+        return list(zip(timestamps[first:last], quotes[first:last]))
 
     # Returns tuple (begin_timestamp: int, end_timestamp: int) that defines timestamp range for which quotest are
     # available in database for given currency
     def quotes_range(self, currency_id: int) -> tuple:
-        try:
-            begin, end = self._read("SELECT MIN(timestamp), MAX(timestamp) FROM quotes "
-                                    "WHERE asset_id=:asset_id AND currency_id=:currency_id",
-                                    [(":asset_id", self._id), (":currency_id", currency_id)])
-        except TypeError:
-            begin = end = 0
-        begin = db_timestamp2int(begin)
-        end = db_timestamp2int(end)
-        return begin, end
+        timestamps, _quotes = self._quotes_series(currency_id)
+        if not timestamps:
+            return 0, 0
+        return timestamps[0], timestamps[-1]
+
+    # Returns a tuple of 2 lists ([timestamps], [quotes]) with all quotes of the asset in given currency sorted by
+    # timestamp. The series is loaded from db at first request and is kept in class cache afterwards. Least recently
+    # used series are dropped from cache if total number of cached quotes exceeds QUOTES_CACHE_SIZE.
+    def _quotes_series(self, currency_id: int) -> tuple:
+        self._check_quotes_cache()
+        key = (self._id, currency_id)
+        series = JalAsset._quotes_cache.get(key)
+        if series is not None:
+            JalAsset._quotes_cache.move_to_end(key)
+            return series
+        timestamps = []
+        quotes = []
+        query = self._exec("SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id AND currency_id=:currency_id "
+                           "ORDER BY timestamp", [(":asset_id", self._id), (":currency_id", currency_id)])
+        while query.next():
+            timestamp, quote = self._read_record(query, cast=[int, Decimal])
+            timestamps.append(timestamp)
+            quotes.append(quote)
+        series = (timestamps, quotes)
+        JalAsset._quotes_cache[key] = series
+        JalAsset._quotes_cached += len(timestamps) + 1   # Empty series take place in cache also
+        while JalAsset._quotes_cached > self.QUOTES_CACHE_SIZE and len(JalAsset._quotes_cache) > 1:
+            _key, (dropped, _quotes) = JalAsset._quotes_cache.popitem(last=False)
+            JalAsset._quotes_cached -= len(dropped) + 1
+        return series
+
+    # Drops cached quotes of given asset in given currency or all cached quotes (and base currency history) if asset
+    # isn't specified. It should be called after modification of 'quotes' table that isn't done via set_quotes()
+    @classmethod
+    def drop_quotes_cache(cls, asset_id: int = None, currency_id: int = None) -> None:
+        JalAsset._quotes_version += 1
+        if asset_id is None:
+            JalAsset._quotes_cache.clear()
+            JalAsset._quotes_cached = 0
+            JalAsset._base_currency_cache = None
+        else:
+            series = JalAsset._quotes_cache.pop((asset_id, currency_id), None)
+            if series is not None:
+                JalAsset._quotes_cached -= len(series[0]) + 1
+
+    # Drops all cached quotes if they were loaded from another database connection (i.e. database was re-opened)
+    @classmethod
+    def _check_quotes_cache(cls) -> None:
+        if JalAsset._quotes_backend is not JalDB._backend:
+            cls.drop_quotes_cache()
+            JalAsset._quotes_backend = JalDB._backend
 
     # Returns a quote source id defined for given currency (currency_id can be None)
     def quote_source(self, currency_id: int) -> int:
-        source_id = self._read("SELECT quote_source FROM asset_tickers "
-                               "WHERE asset_id=:asset AND currency_id IS :currency",
-                               [(":asset", self._id), (":currency", currency_id)])
-        if source_id is None:
+        if self._data is None:
             return MarketDataFeed.NA
-        else:
-            return source_id
+        currency_id = '' if currency_id is None else currency_id   # NULL value may be read as '' or None by backend
+        return next((x['quote_source'] for x in self._data['symbols']
+                     if ('' if x['currency_id'] is None else x['currency_id']) == currency_id), MarketDataFeed.NA)
 
     # Returns a dict (ID-Name) of all available data sources
     @classmethod
@@ -202,19 +337,71 @@ class JalAsset(JalDB):
         return MarketDataFeed().get_all_names()
 
     # Set quotations for given currency_id. Quotations is a list of {'timestamp':int, 'quote':Decimal} values
-    def set_quotes(self, quotations: list, currency_id: int) -> None:
-        data = [x for x in quotations if x['timestamp'] is not None and x['quote'] is not None]  # Drop Nones
-        if data:
-            for quote in quotations:
-                _ = self._exec("INSERT OR REPLACE INTO quotes (asset_id, currency_id, timestamp, quote) "
-                               "VALUES(:asset_id, :currency_id, :timestamp, :quote)",
-                               [(":asset_id", self._id), (":currency_id", currency_id),
-                                (":timestamp", quote['timestamp']), (":quote", format_decimal(quote['quote']))])
-            begin = min(data, key=lambda x: x['timestamp'])['timestamp']
-            end = max(data, key=lambda x: x['timestamp'])['timestamp']
+    # Returns a number of {'new', 'updated', 'unchanged'} quotations (see set_quotes_columns())
+    def set_quotes(self, quotations: list, currency_id: int) -> dict:
+        return self.set_quotes_columns([x['timestamp'] for x in quotations], [x['quote'] for x in quotations],
+                                       currency_id)
+
+    # Set quotations for given currency_id. Quotations are given as 2 columns of the same length (lists, numpy arrays
+    # or pandas series): 'timestamps' and 'quotes'. Rows with empty (None, NaN) or invalid values are dropped, the last
+    # value is taken for duplicated timestamps. Quotes that are already present in DB aren't written again, other
+    # quotes are inserted or updated in batches of QUOTES_CHUNK values within one transaction.
+    # Returns a number of {'new', 'updated', 'unchanged'} quotations ('new' and 'updated' are 0 if transaction failed).
+    def set_quotes_columns(self, timestamps, quotes, currency_id: int) -> dict:
+        data = {}
+        for timestamp, quote in zip(timestamps, quotes):
+            try:
+                timestamp = int(timestamp)
+                quote = quote if type(quote) == Decimal else Decimal(str(quote))
+            except (TypeError, ValueError, InvalidOperation):
+                continue
+            if quote.is_finite():
+                data[timestamp] = quote
+        stats = {'new': 0, 'updated': 0, 'unchanged': 0}
+        if not data:
+            return stats
+        begin = min(data)
+        end = max(data)
+        existing = {}
+        query = self._exec("SELECT timestamp, quote FROM quotes WHERE asset_id=:asset_id AND currency_id=:currency_id "
+                           "AND timestamp>=:begin AND timestamp<=:end",
+                           [(":asset_id", self._id), (":currency_id", currency_id), (":begin", begin), (":end", end)])
+        while query.next():
+            timestamp, quote = self._read_record(query, cast=[int, Decimal])
+            existing[timestamp] = quote
+        rows = []
+        for timestamp, quote in data.items():
+            if timestamp not in existing:
+                stats['new'] += 1
+            elif existing[timestamp] != quote:
+                stats['updated'] += 1
+            else:
+                stats['unchanged'] += 1
+                continue
+            rows.append((timestamp, format_decimal(quote)))
+        if rows:
+            self.begin_transaction()
+            for i in range(0, len(rows), self.QUOTES_CHUNK):
+                chunk = rows[i:i + self.QUOTES_CHUNK]
+                values = ", ".join([f"(:asset_id, :currency_id, :timestamp{j}, :quote{j})" for j in range(len(chunk))])
+                params = [(":asset_id", self._id), (":currency_id", currency_id)]
+                for j, (timestamp, quote) in enumerate(chunk):
+                    params += [(f":timestamp{j}", timestamp), (f":quote{j}", quote)]
+                query = self._exec(f"INSERT INTO quotes (asset_id, currency_id, timestamp, quote) VALUES {values} "
+                                   "ON CONFLICT(asset_id, currency_id, timestamp) DO UPDATE SET quote=excluded.quote",
+                                   params, cached=(len(chunk) == self.QUOTES_CHUNK))  # Don't cache the last chunk
+                if query is None:   # Nothing is stored if any chunk fails
+                    self.rollback()
+                    logging.error(self.tr("Failed to store quotations: ") +
+                                  f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) "
+                                  f"{ts2d(begin)} - {ts2d(end)}")
+                    return {'new': 0, 'updated': 0, 'unchanged': stats['unchanged']}
             self.commit()
-            logging.info(self.tr("Quotations were updated: ") +
-                         f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) {ts2d(begin)} - {ts2d(end)}")
+            self.drop_quotes_cache(self._id, currency_id)
+        logging.info(self.tr("Quotations were updated: ") +
+                     f"{self.symbol(currency_id)} ({JalAsset(currency_id).symbol()}) {ts2d(begin)} - {ts2d(end)}, "
+                     f"new: {stats['new']}, updated: {stats['updated']}, unchanged: {stats['unchanged']}")
+        return stats
 
     # returns expiration timestamp
     def expiry(self) -> int:
@@ -244,7 +431,7 @@ class JalAsset(JalDB):
                        "VALUES(:asset_id, :datatype, :expiry)",
                        [(":asset_id", self._id), (":datatype", AssetData.Tag), (":expiry", str(tag_id))])
         self._tag = JalTag(tag_id)
-        self._fetch_data()
+        self._fetch_data(self._id)
 
     # Updates relevant asset data fields with information provided in data dictionary
     def update_data(self, data: dict) -> None:
@@ -264,7 +451,7 @@ class JalAsset(JalDB):
                     updaters[key](data[key])
                 except KeyError:  # No updater for this key is present
                     continue
-        self._fetch_data()
+        self._fetch_data(self._id)
 
     def _update_isin(self, new_isin: str) -> None:
         if self._isin:
@@ -332,47 +519,52 @@ class JalAsset(JalDB):
         return True
 
     def _find_asset(self, data: dict) -> int:
-        id = None
         if data['isin']:
             # Select either by ISIN if no symbol given OR by both ISIN & symbol
-            id = self._read("SELECT id FROM assets_ext "
-                            "WHERE ((isin=:isin OR isin='') AND symbol=:symbol) OR (isin=:isin AND :symbol='')",
-                            [(":isin", data['isin']), (":symbol", data['symbol'])])
-            if id is None and data['symbol']:  # Make one more try by ISIN only if no match for ISIN+Symbol due to symbol change
-                id = self._read("SELECT id FROM assets_ext WHERE isin=:isin", [(":isin", data['isin'])])
-            if id is None:
-                return 0
+            if data['symbol']:
+                ids = [x for x in self._symbol_ids(data['symbol'], exact=True)
+                       if JalAsset.db_cache[x]['isin'] in [data['isin'], '']]
             else:
-                return id
+                ids = self._isin_ids(data['isin'])
+            if not ids and data['symbol']:  # Make one more try by ISIN only if no match for ISIN+Symbol due to symbol change
+                ids = self._isin_ids(data['isin'])
+            return ids[0] if ids else 0
         if data['reg_number']:
-            id = self._read("SELECT asset_id FROM asset_data WHERE datatype=:datatype AND value=:reg_number",
-                            [(":datatype", AssetData.RegistrationCode), (":reg_number", data['reg_number'])])
-            if id is not None:
-                return id
+            ids = JalAsset._reg_number_index.get(data['reg_number'], [])
+            if ids:
+                return ids[0]
         if data['symbol']:
+            ids = self._symbol_ids(data['symbol'])
             if 'type' in data:
+                ids = [x for x in ids if JalAsset.db_cache[x]['type_id'] == data['type']]
                 if 'expiry' in data:
-                    id = self._read("SELECT a.id FROM assets_ext a "
-                                    "LEFT JOIN asset_data d ON a.id=d.asset_id AND d.datatype=:datatype "
-                                    "WHERE symbol=:symbol COLLATE NOCASE AND type_id=:type AND value=:value",
-                                    [(":datatype", AssetData.ExpiryDate), (":symbol", data['symbol']),
-                                     (":type", data['type']), (":value", data['expiry'])])
-                else:
-                    id = self._read("SELECT id FROM assets_ext "
-                                    "WHERE symbol=:symbol COLLATE NOCASE and type_id=:type",
-                                    [(":symbol", data['symbol']), (":type", data['type'])])
-            else:
-                id = self._read("SELECT id FROM assets_ext WHERE symbol=:symbol COLLATE NOCASE",
-                                [(":symbol", data['symbol'])])
-            if id is not None:
-                return id
+                    ids = [x for x in ids if JalAsset.db_cache[x].get('data', {}).get(AssetData.ExpiryDate, None)
+                           == str(data['expiry'])]
+            if ids:
+                return ids[0]
         if data['name']:
-            id = self._read("SELECT id FROM assets_ext WHERE full_name=:name COLLATE NOCASE",
-                            [(":name", data['name'])])
-        if id is None:
-            return 0
-        else:
-            return id
+            ids = [x for x in JalAsset._name_index.get(nocase(data['name']), []) if self._has_active_symbol(x)]
+            if ids:
+                return ids[0]
+        return 0
+
+    # Returns sorted list of ids of assets that have active symbol equal to given one (case-insensitive if not exact)
+    @classmethod
+    def _symbol_ids(cls, symbol: str, exact: bool = False) -> list:
+        ids = sorted(set(x[0] for x in JalAsset._symbol_index.get(nocase(symbol), [])))
+        if exact:
+            ids = [x for x in ids
+                   if symbol in [s['symbol'] for s in JalAsset.db_cache[x]['symbols'] if s['active'] == 1]]
+        return ids
+
+    # Returns sorted list of ids of assets with given ISIN and any active symbol
+    @classmethod
+    def _isin_ids(cls, isin: str) -> list:
+        return [x for x in JalAsset._isin_index.get(isin, []) if cls._has_active_symbol(x)]
+
+    @classmethod
+    def _has_active_symbol(cls, asset_id: int) -> bool:
+        return any(x['active'] == 1 for x in JalAsset.db_cache[asset_id]['symbols'])
 
     # Method returns a list of {"asset": JalAsset, "currency" currency_id} that describes assets involved into ledger
     # operations between begin and end timestamps or that have non-zero value in ledger
@@ -383,7 +575,7 @@ class JalAsset(JalDB):
                           "FROM ledger l LEFT JOIN accounts a ON a.id=l.account_id "
                           "WHERE l.book_account=:assets "
                           "GROUP BY l.asset_id, a.currency_id "
-                          "HAVING l.amount_acc!='0' OR (l.timestamp>=:begin AND l.timestamp<=:end)",
+                          "HAVING (l.amount_acc!='0' AND l.amount_acc!=0) OR (l.timestamp>=:begin AND l.timestamp<=:end)",
                           [(":assets", BookAccount.Assets), (":begin", begin), (":end", end)])
         while query.next():
             try:
@@ -417,13 +609,23 @@ class JalAsset(JalDB):
     def get_base_currency(cls, timestamp: int=None) -> int:
         if timestamp is None:
             timestamp = QDate.currentDate().startOfDay(Qt.UTC).toSecsSinceEpoch()
-        base_id = cls._read("SELECT currency_id FROM base_currency WHERE since_timestamp<=:timestamp "
-                            "ORDER BY since_timestamp DESC LIMIT 1", [(":timestamp", timestamp)])
-        try:
-            base_id = int(base_id)
-        except TypeError:
-            base_id = 0
-        return base_id
+        since, currencies = cls.get_base_currency_series()
+        i = bisect_right(since, timestamp)
+        return currencies[i - 1] if i else 0
+
+    # Returns full history of base currency as a tuple of 2 sorted lists ([since_timestamp], [currency_id])
+    @classmethod
+    def get_base_currency_series(cls) -> tuple:
+        cls._check_quotes_cache()
+        if JalAsset._base_currency_cache is None:
+            history = ([], [])
+            query = cls._exec("SELECT since_timestamp, currency_id FROM base_currency ORDER BY since_timestamp")
+            while query.next():
+                since, currency_id = super(JalAsset, JalAsset)._read_record(query, cast=[int, int])
+                history[0].append(since)
+                history[1].append(currency_id)
+            JalAsset._base_currency_cache = history
+        return JalAsset._base_currency_cache
 
     # Return a list of (timestamp, currency_id) tuples that represent currency valid currency IDs that were in force
     # after between beginning_of_the_year(begin) and end_of_the_year(end) timestamps.
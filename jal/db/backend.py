@@ -0,0 +1,414 @@
+import re
+import queue
+import sqlite3
+import threading
+from decimal import Decimal
+from urllib.request import pathname2url
+from PySide6.QtSql import QSql, QSqlDatabase, QSqlQuery
+
+from jal.constants import Setup
+from jal.db.helpers import format_decimal
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Database backends that are used by JalDB to execute SQL queries. Every backend creates query objects that provide
+# the same subset of QSqlQuery interface: prepare(), setForwardOnly(), bindValue(), boundValue(), exec(), next(),
+# value(), record(), at(), finish(), lastInsertId() and lastError().
+# QtSqlBackend - executes queries via QtSql connection that is shared with Qt table models.
+# Sqlite3Backend - executes queries via python standard sqlite3 module. It avoids conversion of every value into
+#                  Qt variant and doesn't need Qt at all, so it may be used by headless tools and worker processes.
+#                  Qt table models still use QtSql connection to the same database file (if it is open).
+# ConnectionPool - a set of read-only Sqlite3Backend connections for concurrent readers in other threads.
+class DbBackend:
+    QTSQL = "qtsql"
+    SQLITE3 = "sqlite3"
+
+    def __init__(self):
+        self._db_file = ''
+
+    def name(self) -> str:
+        raise NotImplementedError("Method name() isn't implemented in DbBackend descendant")
+
+    # Opens given database file. Returns an error text or empty string if database was opened successfully
+    def open(self, db_file: str) -> str:
+        raise NotImplementedError("Method open() isn't implemented in DbBackend descendant")
+
+    def close(self):
+        raise NotImplementedError("Method close() isn't implemented in DbBackend descendant")
+
+    # Returns a name of database file in use
+    def database_name(self) -> str:
+        return self._db_file
+
+    # Returns a list of tables and views that are present in database
+    def tables(self) -> list:
+        raise NotImplementedError("Method tables() isn't implemented in DbBackend descendant")
+
+    # Returns new query object
+    def query(self):
+        raise NotImplementedError("Method query() isn't implemented in DbBackend descendant")
+
+    # Returns True if query object provides row() and field_names() methods to get all values of current record
+    def native_rows(self) -> bool:
+        return False
+
+    # Returns True if DECIMAL_SUM() aggregate function is available: it is an exact sum of decimal values stored as text
+    def decimal_sum(self) -> bool:
+        return False
+
+    # Executes sql_text with positional parameters for every tuple of values in rows.
+    # Returns (query, '', None) in case of success or (None, error_text, row) if execution failed at given row
+    def execute_many(self, sql_text: str, rows: list):
+        raise NotImplementedError("Method execute_many() isn't implemented in DbBackend descendant")
+
+    def transaction(self):
+        raise NotImplementedError("Method transaction() isn't implemented in DbBackend descendant")
+
+    # Sets SQLite pragmas {name: value} for the connection. Returns an error text or empty string if successful
+    def apply_pragmas(self, pragmas: dict) -> str:
+        for name, value in pragmas.items():
+            if re.fullmatch(r"\w+", name) is None or re.fullmatch(r"-?\w+", str(value)) is None:
+                return f"Invalid pragma: {name}={value}"
+            query = self.query()
+            if not query.prepare(f"PRAGMA {name} = {value}") or not query.exec():
+                return f"Pragma {name}={value} failed: {query.lastError().text()}"
+            query.finish()
+        return ''
+
+    def commit(self):
+        raise NotImplementedError("Method commit() isn't implemented in DbBackend descendant")
+
+    def rollback(self):
+        raise NotImplementedError("Method rollback() isn't implemented in DbBackend descendant")
+
+    # Creates backend object with given name
+    @staticmethod
+    def create(name: str):
+        backends = {
+            DbBackend.QTSQL: QtSqlBackend,
+            DbBackend.SQLITE3: Sqlite3Backend
+        }
+        try:
+            return backends[name]()
+        except KeyError:
+            raise ValueError(f"Unknown database backend: {name}")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+class QtSqlBackend(DbBackend):
+    def name(self) -> str:
+        return DbBackend.QTSQL
+
+    def open(self, db_file: str) -> str:
+        db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
+        if not db.isValid():
+            return "Sqlite driver initialization failed"
+        db.setDatabaseName(db_file)
+        db.setConnectOptions("QSQLITE_ENABLE_REGEXP=1")
+        if not db.open():
+            return db.lastError().text()
+        self._db_file = db_file
+        return ''
+
+    def close(self):
+        self._db().close()
+
+    def tables(self) -> list:
+        db = self._db()
+        return db.tables(QSql.Tables) + db.tables(QSql.Views)  # Bitwise or somehow doesn't work here :(
+
+    def query(self):
+        return QSqlQuery(self._db())
+
+    # QSqlQuery.execBatch() isn't used as it is emulated for SQLite and has quadratic complexity of binding
+    def execute_many(self, sql_text: str, rows: list):
+        query = QSqlQuery(self._db())
+        if not query.prepare(sql_text):
+            return None, query.lastError().text(), None
+        for row in rows:
+            for i, value in enumerate(row):
+                query.bindValue(i, value)
+            if not query.exec():
+                return None, query.lastError().text(), row
+        return query, '', None
+
+    def transaction(self):
+        self._db().transaction()
+
+    def commit(self):
+        self._db().commit()
+
+    def rollback(self):
+        self._db().rollback()
+
+    @staticmethod
+    def _db() -> QSqlDatabase:
+        return QSqlDatabase.database(Setup.DB_CONNECTION)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Replacement of QSqlError and QSqlRecord for Sqlite3Query
+class Sqlite3Error:
+    def __init__(self, message: str = ''):
+        self._message = message
+
+    def text(self) -> str:
+        return self._message
+
+
+class Sqlite3Record:
+    def __init__(self, description):
+        self._names = [x[0] for x in description] if description else []
+
+    def count(self) -> int:
+        return len(self._names)
+
+    def fieldName(self, i: int) -> str:
+        return self._names[i]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Query object of Sqlite3Backend that mimics QSqlQuery behaviour: parameters are bound by ":name" or by position,
+# NULL values are returned as empty strings. Statements are compiled by sqlite3 module and kept in its cache.
+class Sqlite3Query:
+    BEFORE_FIRST_ROW = -1    # The same values as QSql.BeforeFirstRow and QSql.AfterLastRow
+    AFTER_LAST_ROW = -2
+
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+        self._sql_text = ''
+        self._named = {}
+        self._positional = []
+        self._cursor = None
+        self._row = None
+        self._at = self.BEFORE_FIRST_ROW
+        self._error = Sqlite3Error()
+
+    def setForwardOnly(self, _forward_only: bool):
+        pass   # sqlite3 cursors are forward-only always
+
+    def prepare(self, sql_text: str) -> bool:
+        self._sql_text = sql_text
+        self._named = {}
+        self._positional = []
+        return True
+
+    def bindValue(self, param, value):
+        if isinstance(param, int):
+            self._positional.extend([None] * (param + 1 - len(self._positional)))
+            self._positional[param] = value
+        else:
+            self._named[param[1:]] = value
+
+    def boundValue(self, param):
+        if isinstance(param, int):
+            return self._positional[param]
+        return self._named[param[1:]]
+
+    def exec(self) -> bool:
+        self.finish()
+        try:
+            self._cursor = self._connection.execute(self._sql_text,
+                                                    self._positional if self._positional else self._named)
+        except sqlite3.Error as e:
+            self._error = Sqlite3Error(str(e))
+            return False
+        self._error = Sqlite3Error()
+        return True
+
+    def next(self) -> bool:
+        if self._cursor is None:
+            return False
+        self._row = self._cursor.fetchone()
+        if self._row is None:
+            self._at = self.AFTER_LAST_ROW
+            return False
+        self._at += 1
+        return True
+
+    def value(self, i: int):
+        return self._row[i]
+
+    # Returns all values of current record
+    def row(self) -> tuple:
+        return self._row
+
+    def field_names(self) -> list:
+        return [x[0] for x in self._cursor.description]
+
+    def record(self) -> Sqlite3Record:
+        return Sqlite3Record(self._cursor.description if self._cursor is not None else None)
+
+    def at(self) -> int:
+        return self._at
+
+    def finish(self):
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+        self._row = None
+        self._at = self.BEFORE_FIRST_ROW
+
+    def lastInsertId(self) -> int:
+        return self._cursor.lastrowid if self._cursor is not None else None
+
+    def lastError(self) -> Sqlite3Error:
+        return self._error
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# read_only=True - database file is opened in read-only mode (for connections of ConnectionPool)
+class Sqlite3Backend(DbBackend):
+    BUSY_TIMEOUT = 30    # Seconds to wait for a lock held by another connection (i.e. by QtSql models)
+
+    def __init__(self, read_only=False):
+        super().__init__()
+        self._connection = None
+        self._read_only = read_only
+
+    def name(self) -> str:
+        return DbBackend.SQLITE3
+
+    def open(self, db_file: str) -> str:
+        try:
+            # isolation_level=None keeps autocommit mode in the same way as QtSql does. Transactions are explicit.
+            if self._read_only:
+                self._connection = sqlite3.connect(f"file:{pathname2url(db_file)}?mode=ro", uri=True,
+                                                   timeout=self.BUSY_TIMEOUT, isolation_level=None,
+                                                   check_same_thread=False, cached_statements=512)
+            else:
+                self._connection = sqlite3.connect(db_file, timeout=self.BUSY_TIMEOUT, isolation_level=None,
+                                                   check_same_thread=False, cached_statements=512)
+        except sqlite3.Error as e:
+            return str(e)
+        self._connection.row_factory = self._row_factory
+        self._connection.create_function("REGEXP", 2, self._regexp, deterministic=True)
+        self._connection.create_aggregate("DECIMAL_SUM", 1, DecimalSum)
+        self._db_file = db_file
+        return ''
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def tables(self) -> list:
+        cursor = self._connection.execute("SELECT name FROM sqlite_master "
+                                          "WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'")
+        return [x[0] for x in cursor.fetchall()]
+
+    def query(self) -> Sqlite3Query:
+        return Sqlite3Query(self._connection)
+
+    def native_rows(self) -> bool:
+        return True
+
+    def decimal_sum(self) -> bool:
+        return True
+
+    def execute_many(self, sql_text: str, rows: list):
+        query = Sqlite3Query(self._connection)
+        current = [None]   # Row that is being executed (executemany() takes rows from iterator one by one)
+
+        def tracked_rows():
+            for row in rows:
+                current[0] = row
+                yield row
+
+        try:
+            query._cursor = self._connection.executemany(sql_text, tracked_rows())
+        except sqlite3.Error as e:
+            return None, str(e), current[0]
+        return query, '', None
+
+    def transaction(self):
+        if not self._connection.in_transaction:
+            self._connection.execute("BEGIN")
+
+    def commit(self):
+        if self._connection.in_transaction:
+            self._connection.commit()
+
+    def rollback(self):
+        if self._connection.in_transaction:
+            self._connection.rollback()
+
+    # Row factory that returns NULL values as empty strings, the same way as QSqlQuery.value() does
+    @staticmethod
+    def _row_factory(_cursor, row):
+        if None in row:
+            return tuple('' if x is None else x for x in row)
+        return row
+
+    # Implementation of SQLite REGEXP operator that is provided by QSQLITE_ENABLE_REGEXP option of QtSql driver
+    @staticmethod
+    def _regexp(pattern, value) -> bool:
+        return value is not None and re.search(pattern, str(value)) is not None
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# SQLite aggregate function DECIMAL_SUM(): an exact sum of values as Decimal, result is a text (NULL if no values)
+class DecimalSum:
+    def __init__(self):
+        self._total = None
+
+    def step(self, value):
+        if value is not None and value != '':
+            self._total = Decimal(str(value)) if self._total is None else self._total + Decimal(str(value))
+
+    def finalize(self):
+        return None if self._total is None else format_decimal(self._total)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Pool of read-only sqlite3 connections to database file. These connections are used by worker threads that read data
+# (see JalDB.reader()) concurrently with the main connection that writes data. Readers don't block the writer and
+# aren't blocked by it if database is in WAL journal mode.
+# Connections are opened on demand up to 'size' connections; acquire() waits for a free one if all are in use.
+class ConnectionPool:
+    PERSISTENT_PRAGMAS = ['journal_mode']   # Pragmas that are stored in database file and can't be set by reader
+
+    def __init__(self, db_file: str, size: int, pragmas: dict):
+        self._db_file = db_file
+        self._size = size
+        self._pragmas = {k: v for k, v in pragmas.items() if k not in self.PERSISTENT_PRAGMAS}
+        self._free = queue.LifoQueue()    # The most recently used connection has warm cache
+        self._connections = []
+        self._lock = threading.Lock()
+
+    # Returns Sqlite3Backend with read-only connection. It should be returned back to the pool with release().
+    # Raises RuntimeError if connection can't be opened or queue.Empty if no connection is free during 'timeout'
+    def acquire(self, timeout=None) -> Sqlite3Backend:
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self._size:
+                backend = Sqlite3Backend(read_only=True)
+                error = backend.open(self._db_file)
+                if not error:
+                    error = backend.apply_pragmas(self._pragmas)
+                if error:
+                    backend.close()
+                    raise RuntimeError(f"Read-only connection to '{self._db_file}' failed: {error}")
+                self._connections.append(backend)
+                return backend
+        return self._free.get(timeout=timeout)
+
+    def release(self, backend: Sqlite3Backend):
+        self._free.put(backend)
+
+    # Returns number of opened connections
+    def size(self) -> int:
+        return len(self._connections)
+
+    def close(self):
+        with self._lock:
+            for backend in self._connections:
+                backend.close()
+            self._connections = []
+            self._free = queue.LifoQueue()
+
+
+sqlite3.register_adapter(Decimal, format_decimal)
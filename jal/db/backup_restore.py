@@ -89,6 +89,10 @@ class JalBackup:
                 safe_extract(tar, tmp_path)
             try:
                 os.rename(tmp_path + os.sep + Setup.DB_PATH, self.file)
+                # WAL and currency rates matrix of replaced database are invalid now
+                for journal in [self.file + "-wal", self.file + "-shm", self.file + ".fx.npy", self.file + ".fx.json"]:
+                    if os.path.exists(journal):
+                        os.remove(journal)
             except:
                 logging.warning(self.tr("Failed to restore backup file"))
                 return False
@@ -119,7 +123,7 @@ class JalBackup:
         self.get_filename(False)
         if self.backup_name is None:
             return
-        JalDB.connection().close()
+        JalDB.close_db()
 
         if not self.validate_backup():
             logging.error(self.tr("Wrong format of backup file"))
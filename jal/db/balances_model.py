@@ -6,6 +6,7 @@ from PySide6.QtWidgets import QHeaderView
 from jal.constants import CustomColor, PredefinedAccountType
 from jal.db.asset import JalAsset
 from jal.db.account import JalAccount
+from jal.db.holdings import JalHoldings
 from jal.db.deposit import JalDeposit
 from jal.widgets.delegates import FloatDelegate
 
@@ -135,8 +136,9 @@ class BalancesModel(QAbstractTableModel):
     def calculateBalances(self):
         balances = []
         accounts = JalAccount.get_all_accounts(active_only=self._active_only)
+        positions = JalHoldings.positions(self._date)
         for account in accounts:
-            value = account.balance(self._date)
+            value = JalHoldings.balance(positions.get(account.id(), {}), account, self._date)
             rate = JalAsset(account.currency()).quote(self._date, self._currency)[1]
             if value != Decimal('0'):
                 balances.append({
@@ -1,4 +1,6 @@
+import json
 from decimal import Decimal
+from jal.constants import Setup
 from jal.db.db import JalDB
 from jal.db.helpers import format_decimal
 import jal.db.account
@@ -8,17 +10,28 @@ from jal.db.asset import JalAsset
 
 
 class JalClosedTrade(JalDB):
-    def __init__(self, id: int = 0) -> None:
+    # Trade is selected from database by its 'id' or it is created from already selected 'data' and operations
+    # (see get_list())
+    def __init__(self, id: int = 0, data: dict = None, open_op=None, close_op=None) -> None:
         super().__init__()
         self._id = id
-        self._data = self._read("SELECT account_id, asset_id, open_op_type, open_op_id, open_timestamp, open_price, "
-                                "close_op_type, close_op_id, close_timestamp, close_price, qty "
-                                "FROM trades_closed WHERE id=:id", [(":id", self._id)], named=True)
+        if data is None:
+            self._data = self._read("SELECT account_id, asset_id, open_op_type, open_op_id, open_timestamp, "
+                                    "open_price, close_op_type, close_op_id, close_timestamp, close_price, qty "
+                                    "FROM trades_closed WHERE id=:id", [(":id", self._id)], named=True)
+        else:
+            self._data = data
         if self._data:
             self._account = jal.db.account.JalAccount(self._data['account_id'])
             self._asset = jal.db.asset.JalAsset(self._data['asset_id'])
-            self._open_op = jal.db.operations.LedgerTransaction.get_operation(self._data['open_op_type'], self._data['open_op_id'], jal.db.operations.Transfer.Incoming)
-            self._close_op = jal.db.operations.LedgerTransaction.get_operation(self._data['close_op_type'], self._data['close_op_id'], jal.db.operations.Transfer.Outgoing)
+            if open_op is None:
+                open_op = jal.db.operations.LedgerTransaction.get_operation(
+                    self._data['open_op_type'], self._data['open_op_id'], jal.db.operations.Transfer.Incoming)
+            if close_op is None:
+                close_op = jal.db.operations.LedgerTransaction.get_operation(
+                    self._data['close_op_type'], self._data['close_op_id'], jal.db.operations.Transfer.Outgoing)
+            self._open_op = open_op
+            self._close_op = close_op
             self._open_price = Decimal(self._data['open_price'])
             self._close_price = Decimal(self._data['close_price'])
             self._qty = Decimal(self._data['qty'])
@@ -26,6 +39,58 @@ class JalClosedTrade(JalDB):
             self._account = self._asset = self._open_op = self._close_op = None
             self._open_price = self._close_price = self._qty = Decimal('0')
 
+    # Returns a list of JalClosedTrade objects for given account that were closed between 'begin' and 'end' timestamps
+    # (settlement of closing operation is used instead of its timestamp if 'settlement' is True). Optional lists
+    # 'asset_types', 'open_types' and 'close_types' limit selection by type of asset and type of open/close operation.
+    # All filters are applied by one query and all operations are loaded at once with LedgerTransaction.preload().
+    # Trades that were opened or closed by the same operation share one operation object.
+    @classmethod
+    def get_list(cls, account_id: int, begin: int = 0, end: int = Setup.MAX_TIMESTAMP, settlement: bool = False,
+                 asset_types: list = None, open_types: list = None, close_types: list = None) -> list:
+        trades = []
+        if settlement:
+            close_ts = "CASE c.close_op_type WHEN :trade THEN t.settlement WHEN :transfer THEN tr.deposit_timestamp " \
+                       "ELSE c.close_timestamp END"
+        else:
+            close_ts = "c.close_timestamp"
+        conditions = [f"c.account_id=:account_id AND {close_ts}>=:begin AND {close_ts}<=:end"]
+        params = [(":account_id", account_id), (":begin", begin), (":end", end),
+                  (":trade", jal.db.operations.LedgerTransaction.Trade),
+                  (":transfer", jal.db.operations.LedgerTransaction.Transfer)]
+        for field, values in [("a.type_id", asset_types), ("c.open_op_type", open_types),
+                              ("c.close_op_type", close_types)]:
+            if values is not None:
+                name = ":" + field.split('.')[1]
+                conditions.append(f"{field} IN (SELECT value FROM json_each({name}))")
+                params.append((name, json.dumps(values)))
+        query = cls._exec("SELECT c.id, c.account_id, c.asset_id, c.open_op_type, c.open_op_id, c.open_timestamp, "
+                          "c.open_price, c.close_op_type, c.close_op_id, c.close_timestamp, c.close_price, c.qty "
+                          "FROM trades_closed c LEFT JOIN assets a ON a.id=c.asset_id "
+                          "LEFT JOIN trades t ON c.close_op_type=:trade AND t.id=c.close_op_id "
+                          "LEFT JOIN transfers tr ON c.close_op_type=:transfer AND tr.id=c.close_op_id "
+                          f"WHERE {' AND '.join(conditions)} ORDER BY c.id", params, forward_only=True)
+        records = []
+        while query.next():
+            records.append(cls._read_record(query, named=True))
+        preloaded = jal.db.operations.LedgerTransaction.preload(
+            operations=[(x['open_op_type'], x['open_op_id']) for x in records] +
+                       [(x['close_op_type'], x['close_op_id']) for x in records])
+        operations = {}   # {(op_type, operation_id, display_type): LedgerTransaction}
+
+        def operation(op_type, oid, display_type):
+            if (op_type, oid, display_type) not in operations:
+                operations[(op_type, oid, display_type)] = jal.db.operations.LedgerTransaction.get_operation(
+                    op_type, oid, display_type, preloaded=preloaded.get((op_type, oid)))
+            return operations[(op_type, oid, display_type)]
+
+        for record in records:
+            trades.append(cls(record['id'], data=record,
+                              open_op=operation(record['open_op_type'], record['open_op_id'],
+                                                jal.db.operations.Transfer.Incoming),
+                              close_op=operation(record['close_op_type'], record['close_op_id'],
+                                                 jal.db.operations.Transfer.Outgoing)))
+        return trades
+
     @classmethod
     def create_from_trades(cls, open_trade, close_trade, qty, open_price, close_price):
         _ = cls._exec(
@@ -3,20 +3,19 @@ from jal.db.settings import JalSettings
 
 
 class JalCountry(JalDB):
-    db_cache = []
+    db_cache = {}           # Country data by country id: {country_id: {field: value}}
+    _code_index = {}        # Country ids by country code: {code: country_id}
+    _cache_backend = None   # Database connection that db_cache was loaded from
 
     def __init__(self, country_id: int = 0, data: dict = None, search=False) -> None:
         super().__init__(cached=True)
-        if not JalCountry.db_cache:
+        if not JalCountry.db_cache or JalCountry._cache_backend is not JalDB._backend:
             self._fetch_data()
         self._id = country_id
         if self._valid_data(data):
             if search:
                 self._id = self._find_country(data)
-        try:
-            self._data = [x for x in self.db_cache if x['id'] == self._id][0]
-        except IndexError:
-            self._data = None
+        self._data = JalCountry.db_cache.get(self._id, None)
         self._name = self._data['name'] if self._data is not None else None
         self._code = self._data['code'] if self._data is not None else None
         self._iso_code = self._data['iso_code'] if self._data is not None else None
@@ -30,10 +29,14 @@ class JalCountry(JalDB):
         return True
 
     def _fetch_data(self):
-        JalCountry.db_cache = []
+        JalCountry._cache_backend = JalDB._backend
+        JalCountry.db_cache = {}
+        JalCountry._code_index = {}
         query = self._exec("SELECT * FROM countries_ext ORDER BY id")
         while query.next():
-            JalCountry.db_cache.append(self._read_record(query, named=True))
+            country = self._read_record(query, named=True)
+            JalCountry.db_cache[country['id']] = country
+            JalCountry._code_index.setdefault(country['code'], country['id'])
 
     def id(self) -> int:
         return self._id
@@ -60,9 +63,4 @@ class JalCountry(JalDB):
         return True
 
     def _find_country(self, data: dict) -> int:
-        country_id = self._read("SELECT id FROM countries WHERE code=:code",
-                                [(":code", data['code'])], check_unique=True)
-        if country_id is None:
-            return 0
-        else:
-            return country_id
\ No newline at end of file
+        return JalCountry._code_index.get(data['code'], 0)
\ No newline at end of file
@@ -2,14 +2,21 @@ from typing import Union
 import os
 import sys
 import re
+import json
 import logging
+import threading
 import sqlparse
+from contextlib import contextmanager
+from collections import OrderedDict
+from decimal import Decimal
 from pkg_resources import parse_version
 from PySide6.QtWidgets import QApplication, QMessageBox
-from PySide6.QtSql import QSql, QSqlDatabase, QSqlQuery, QSqlTableModel
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtSql import QSqlDatabase, QSqlQuery, QSqlTableModel
 
 from jal.constants import Setup
-from jal.db.helpers import get_dbfilename
+from jal.db.helpers import get_dbfilename, format_decimal
+from jal.db.backend import DbBackend, QtSqlBackend, ConnectionPool
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -67,6 +74,9 @@ class JalSqlError:
     def show(self):
         if "pytest" in sys.modules:  # Throw exception if we are in test mode or handle it if we are live
             raise RuntimeError(self._message)
+        if not isinstance(QCoreApplication.instance(), QApplication):   # No GUI to show message box
+            logging.error(self._message)
+            return
         QMessageBox().warning(None, self.tr("Database error"), self._message, QMessageBox.Ok)
 
     def custom(self):
@@ -76,16 +86,68 @@ class JalSqlError:
         return self._message
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+# Query from statement cache of JalDB that is handed out by JalDB._exec(). Cache entry of the query is marked as used
+# until result is released: when next() reaches the end of result, when finish() is called or when the object is
+# dropped by the caller. Release finishes the query so partly read result doesn't keep read transaction open.
+# All other methods are forwarded to the query itself.
+class CachedQuery:
+    def __init__(self, entry: list):
+        self._query = entry[0]
+        self._entry = entry
+        self._lease = entry[2]
+
+    def __getattr__(self, name):
+        attribute = getattr(self._query, name)
+        setattr(self, name, attribute)   # Keep it to avoid __getattr__() call next time
+        return attribute
+
+    def __del__(self):
+        self.finish()
+
+    def next(self) -> bool:
+        if self._entry[2] == self._lease and self._query.next():
+            return True
+        self.finish()
+        return False
+
+    def finish(self) -> None:
+        if self._entry[2] == self._lease:   # Query wasn't released and is still checked out by this object
+            self._entry[2] = 0
+            self._query.finish()
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 class JalDB:
+    _backend = None          # DbBackend object that is used to execute all queries of JalDB
+    _native_rows = False     # True if query objects of backend provide row() and field_names() methods
+    _pragmas = {}            # SQLite pragmas that are applied to database connections (see configure_db())
+    _pool = None             # ConnectionPool of read-only connections for concurrent readers (see reader())
+    _thread = threading.local()   # Attribute 'backend' is set while current thread uses connection from _pool
     _tables = []
     _instances_with_cache = []
+    _cached_classes = set()  # Classes with class-level cache that already have an instance in _instances_with_cache
+    _cache_version = 0       # Is incremented by every invalidate_cache() call (see cache_version())
+    _fixed_point = None      # Storage mode of ledger amounts (see _ledger_fixed_point()), None if not known yet
+    LEDGER_INTEGER_LIMIT = 2**63 - 1   # SQLite INTEGER is a signed 64-bit value
+    STATEMENT_CACHE_SIZE = 256         # Max number of prepared queries that are kept by _exec() for re-use
+    # Prepared queries in LRU order: {(sql_text, forward_only): [query, params, lease]}, where lease is a number of
+    # current checkout of the query by _exec() or 0 if query is free (see CachedQuery)
+    _statements = OrderedDict()
+    _statement_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    _statement_leases = 0    # Number of the last checkout of a cached query
+    _validate_sql = "pytest" in sys.modules   # Check of _exec() parameters, it is slow and is enabled for tests only
 
     # By default, db objects don't cache data. But if and object may cache db data we need to track it so parameter
     # 'cached' to be set to True. Such objects should implement invalidate_cache(), class_cache() methods also.
+    # One instance is enough to invalidate class-level cache, so only the first instance of such class is tracked.
     def __init__(self, cached=False, **kwargs):
         if cached:
-            self._instances_with_cache.append(self)
+            if not self.class_cache():
+                self._instances_with_cache.append(self)
+            elif type(self) not in JalDB._cached_classes:
+                JalDB._cached_classes.add(type(self))
+                self._instances_with_cache.append(self)
         super().__init__()
 
     def tr(self, text):
@@ -97,44 +159,154 @@ class JalDB:
     #    if not - it will initialize DB with help of SQL-script
     # 2) checks that DB looks like a valid one:
     #    if schema version is invalid it will close DB
+    # backend - name of DbBackend that will be used for queries execution (see backend.py). If it isn't given then
+    #           backend is taken from 'DbBackend' setting or Setup.DB_BACKEND is used if the setting is empty
     # Returns: LedgerInitError(code == NoError(0) if db was initialized successfully)
-    def init_db(self, db_path) -> JalDBError:
-        db = QSqlDatabase.addDatabase("QSQLITE", Setup.DB_CONNECTION)
-        if not db.isValid():
-            return JalDBError(JalDBError.DbDriverFailure)
-        db.setDatabaseName(get_dbfilename(db_path))
-        db.setConnectOptions("QSQLITE_ENABLE_REGEXP=1")
-        db.open()
+    def init_db(self, db_path, backend=None) -> JalDBError:
+        error = self._open_db(backend or Setup.DB_BACKEND, get_dbfilename(db_path))
+        if error:
+            return JalDBError(JalDBError.DbDriverFailure, details=error)
         sqlite_version = self.get_engine_version()
         if parse_version(sqlite_version) < parse_version(Setup.SQLITE_MIN_VERSION):
-            db.close()
+            self.close_db()
             return JalDBError(JalDBError.OutdatedSqlite)
-        JalDB._tables = db.tables(QSql.Tables) + db.tables(QSql.Views)  # Bitwise or somehow doesn't work here :(
+        JalDB._tables = JalDB._backend.tables()
+        JalDB._fixed_point = None
         if not JalDB._tables:
             logging.info("Loading DB initialization script")
             error = self.run_sql_script(db_path + Setup.INIT_SCRIPT_PATH)
             if error.code != JalDBError.NoError:
                 return error
         if self._read("SELECT value FROM settings WHERE name='CleanDB'") == 1:
-            db.close()
+            self.close_db()
             os.remove(get_dbfilename(db_path))
-            db.open()
+            self._open_db(backend or Setup.DB_BACKEND, get_dbfilename(db_path))
             error = self.run_sql_script(db_path + Setup.INIT_SCRIPT_PATH)
             if error.code != JalDBError.NoError:
                 return error
         schema_version = self._read("SELECT value FROM settings WHERE name='SchemaVersion'")
-        if schema_version < Setup.DB_REQUIRED_VERSION:
-            db.close()
+        if schema_version < Setup.DB_REQUIRED_VERSION:   # Database is kept open for update_db_schema() call
             return JalDBError(JalDBError.OutdatedDbSchema)
         elif schema_version > Setup.DB_REQUIRED_VERSION:
-            db.close()
+            self.close_db()
             return JalDBError(JalDBError.NewerDbSchema,
                               details=f"(expected: {Setup.DB_REQUIRED_VERSION}, got: {schema_version})")
+        if backend is None:
+            error = self._switch_backend(get_dbfilename(db_path))
+            if error:
+                return JalDBError(JalDBError.DbDriverFailure, details=error)
+        error = self.configure_db()
+        if error:
+            self.close_db()
+            return JalDBError(JalDBError.DbInitFailure, details=error)
         self.enable_fk(True)
         self.enable_triggers(True)
 
         return JalDBError(JalDBError.NoError)
 
+    # Re-opens database file with backend that is set by 'DbBackend' setting if it differs from the current one.
+    # Returns an error text or empty string if successful.
+    def _switch_backend(self, db_file) -> str:
+        backend = self._read("SELECT value FROM settings WHERE name='DbBackend'") or Setup.DB_BACKEND
+        if backend not in [DbBackend.QTSQL, DbBackend.SQLITE3]:
+            logging.warning(f"Invalid 'DbBackend' setting is ignored: {backend}")
+            return ''
+        if backend == self.backend_name():
+            return ''
+        return self._open_db(backend, db_file)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Applies SQLite pragmas to database connections and creates a pool of read-only connections for readers.
+    # Pragmas are taken from Setup.DB_PRAGMAS and are overridden by JSON dictionary of 'DbPragmas' setting where
+    # null value disables a pragma, i.e. '{"journal_mode": "DELETE", "mmap_size": null}'.
+    # Returns an error text or empty string if successful.
+    def configure_db(self) -> str:
+        try:
+            overrides = json.loads(self._read("SELECT value FROM settings WHERE name='DbPragmas'") or '{}')
+            if not isinstance(overrides, dict):
+                raise ValueError("JSON dictionary is expected")
+        except ValueError as e:
+            logging.warning(f"Invalid 'DbPragmas' setting is ignored: {e}")
+            overrides = {}
+        pragmas = {**Setup.DB_PRAGMAS, **overrides}
+        JalDB._pragmas = {name: value for name, value in pragmas.items() if value is not None}
+        error = JalDB._backend.apply_pragmas(JalDB._pragmas)
+        if not error and self.backend_name() != DbBackend.QTSQL and QSqlDatabase.contains(Setup.DB_CONNECTION):
+            error = QtSqlBackend().apply_pragmas(JalDB._pragmas)   # The same for QtSql connection of table models
+        if error:
+            return error
+        JalDB._pool = ConnectionPool(self._db_path(), Setup.DB_READERS, JalDB._pragmas)
+        return ''
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Context manager that executes all JalDB queries of current thread via a read-only connection from the pool.
+    # It allows worker threads to read data concurrently with the main connection that writes data. Now these are
+    # threads of data loaders (see QuoteDownloader._download()). Table models and reports run in GUI thread and keep
+    # using the main connection as QtSql models are bound to it.
+    # Queries of such connection aren't kept in statement cache of _exec() - sqlite3 module caches them itself.
+    # Raises queue.Empty if no connection became free during 'timeout' seconds.
+    @classmethod
+    @contextmanager
+    def reader(cls, timeout=None):
+        if hasattr(JalDB._thread, 'backend'):   # Nested call, thread uses connection from the pool already
+            yield
+            return
+        backend = JalDB._pool.acquire(timeout)
+        JalDB._thread.backend = backend
+        try:
+            yield
+        finally:
+            del JalDB._thread.backend
+            JalDB._pool.release(backend)
+
+    # Returns backend that executes queries of current thread: reader from the pool or main one
+    @classmethod
+    def _active_backend(cls) -> DbBackend:
+        return getattr(JalDB._thread, 'backend', JalDB._backend)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Opens database file with help of backend with given name. Returns an error text or empty string if successful.
+    # Qt table models always use QtSql connection - it is opened in addition to non-Qt backend if Qt application is
+    # present (i.e. models may be created). Headless tools and worker processes don't need it.
+    @classmethod
+    def _open_db(cls, backend_name: str, db_file: str) -> str:
+        cls.close_db()
+        backend = DbBackend.create(backend_name)
+        error = backend.open(db_file)
+        if error:
+            return error
+        if backend.name() != DbBackend.QTSQL and QCoreApplication.instance() is not None:
+            error = QtSqlBackend().open(db_file)
+            if error:
+                backend.close()
+                return error
+        JalDB._backend = backend
+        JalDB._native_rows = backend.native_rows()
+        return ''
+
+    # Closes database connection(s). All prepared queries are dropped as they become invalid.
+    @classmethod
+    def close_db(cls):
+        cls.clear_statement_cache()
+        if JalDB._pool is not None:
+            JalDB._pool.close()
+            JalDB._pool = None
+        if JalDB._backend is not None:
+            JalDB._backend.close()
+            JalDB._backend = None
+        if QSqlDatabase.contains(Setup.DB_CONNECTION):
+            QSqlDatabase.database(Setup.DB_CONNECTION, False).close()
+
+    # Returns name of backend that is used for queries execution
+    @classmethod
+    def backend_name(cls) -> str:
+        return JalDB._backend.name()
+
+    # Starts explicit transaction. It lasts until commit() or until COMMIT/ROLLBACK statement execution
+    @classmethod
+    def begin_transaction(cls):
+        JalDB._backend.transaction()
+
     # ------------------------------------------------------------------------------------------------------------------
     # Returns current version of sqlite library
     def get_engine_version(self):
@@ -145,7 +317,8 @@ class JalDB:
         return self._read("SELECT last_insert_rowid()")
 
     # ------------------------------------------------------------------------------------------------------------------
-    # This function returns SQLite connection used by JAL or fails with RuntimeError exception
+    # This function returns QtSql connection used by JAL table models or fails with RuntimeError exception.
+    # All other queries are executed via _exec() and don't need it directly.
     @staticmethod
     def connection():
         db = QSqlDatabase.database(Setup.DB_CONNECTION)
@@ -158,29 +331,102 @@ class JalDB:
     # Returns a name of current database file in use
     @classmethod
     def _db_path(cls) -> str:
-        return cls.connection().databaseName()
+        return JalDB._backend.database_name()
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # Prepared queries are kept in LRU cache and are re-used by _exec() for the same sql_text. Cache should be cleared
+    # before db connection is closed as all prepared queries become invalid after it.
+    @classmethod
+    def clear_statement_cache(cls):
+        for entry in JalDB._statements.values():
+            entry[2] = 0     # Queries that are still held by callers shouldn't touch the cache after this
+        JalDB._statements.clear()
+
+    # Returns statistics of prepared queries cache usage: {"size", "hits", "misses", "evictions", "hit_rate"}
+    @classmethod
+    def statement_cache_stats(cls) -> dict:
+        stats = dict(JalDB._statement_stats)
+        stats['size'] = len(JalDB._statements)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        return stats
+
+    # Enables (or disables) validation of _exec() parameters: number of parameters should match query text
+    # and every value should be bound successfully
+    @classmethod
+    def set_sql_validation(cls, enabled: bool):
+        JalDB._validate_sql = enabled
+
+    # Returns a prepared query object for given sql_text (from cache if possible) together with a set of parameter names
+    # that are present in query text. Returns (None, None) if query can't be prepared.
+    # Cached query is checked out as CachedQuery and is re-used only after its previous result was released, i.e. read
+    # till the end, finished or dropped by the caller. Otherwise (nested call with the same sql_text while previous
+    # result is being iterated) a new query is created.
+    # cached=False - query is always prepared from scratch and isn't put into cache
+    @classmethod
+    def _prepare(cls, sql_text, forward_only, cached=True):
+        reader = getattr(JalDB._thread, 'backend', None)
+        if reader is not None:   # Statement cache belongs to the main connection and isn't used by readers
+            return cls._new_query(reader, sql_text, forward_only)
+        key = (sql_text, forward_only)
+        entry = JalDB._statements.get(key) if cached else None
+        if entry is not None and not entry[2]:
+            JalDB._statements.move_to_end(key)
+            JalDB._statement_stats['hits'] += 1
+            entry[0].finish()   # Reset any state of previous execution
+            return cls._checkout(entry), entry[1]
+        JalDB._statement_stats['misses'] += 1
+        query, query_params = cls._new_query(JalDB._backend, sql_text, forward_only)
+        if query is None:
+            return None, None
+        if cached and entry is None:
+            entry = JalDB._statements[key] = [query, query_params, 0]
+            while len(JalDB._statements) > cls.STATEMENT_CACHE_SIZE:
+                JalDB._statements.popitem(last=False)
+                JalDB._statement_stats['evictions'] += 1
+            return cls._checkout(entry), query_params
+        return query, query_params
+
+    # Marks cached query of given statement cache entry as used and returns it wrapped into CachedQuery
+    @classmethod
+    def _checkout(cls, entry) -> CachedQuery:
+        JalDB._statement_leases += 1
+        entry[2] = JalDB._statement_leases
+        return CachedQuery(entry)
+
+    # Creates new query of given backend and prepares it for given sql_text. Returns (query, set of parameter names)
+    # or (None, None) if query can't be prepared
+    @classmethod
+    def _new_query(cls, backend, sql_text, forward_only):
+        query = backend.query()
+        query.setForwardOnly(forward_only)
+        if not query.prepare(sql_text):
+            logging.error(f"SQL query preparation failure: '{query.lastError().text()}' for query '{sql_text}'")
+            return None, None
+        query_params = set(re.findall(r":(\w+)", sql_text, re.IGNORECASE))  # get all parameter names in query text
+        return query, query_params
 
     # -------------------------------------------------------------------------------------------------------------------
     # Executes an SQL query from given sql_text
     # params is a list of tuples (":param", value) which are used to prepare SQL query
     # Current transaction will be committed if 'commit' set to true
     # Parameter 'forward_only' may be used for optimization
-    # return value - QSqlQuery object (to allow iteration through result)
+    # Parameter 'cached' set to False disables re-use of prepared query (for one-time queries like db scripts)
+    # return value - QSqlQuery-like query object of backend (to allow iteration through result)
     @classmethod
-    def _exec(cls, sql_text, params=None, forward_only=True, commit=False):
+    def _exec(cls, sql_text, params=None, forward_only=True, commit=False, cached=True):
         if params is None:
             params = []
-        db = cls.connection()
-        query = QSqlQuery(db)
-        query.setForwardOnly(forward_only)
-        if not query.prepare(sql_text):
-            logging.error(f"SQL query preparation failure: '{query.lastError().text()}' for query '{sql_text}'")
+        query, query_params = cls._prepare(sql_text, forward_only, cached)
+        if query is None:
             return None
-        query_params = set(re.findall(r":(\w+)", sql_text, re.IGNORECASE))  # get all parameter names in query text
-        assert len(query_params) == len(params), f"SQL: wrong number of parameters {params} for '{sql_text}'"
+        if JalDB._validate_sql:
+            assert len(query_params) == len(params), f"SQL: wrong number of parameters {params} for '{sql_text}'"
         for param in params:
             query.bindValue(param[0], param[1])
-            assert query.boundValue(param[0]) == param[1], f"SQL: failed to assign parameter {param} in '{sql_text}'"
+            if JalDB._validate_sql:
+                assert query.boundValue(param[0]) == param[1], \
+                    f"SQL: failed to assign parameter {param} in '{sql_text}'"
         if not query.exec():
             error = JalSqlError(query.lastError().text())
             if error.custom():
@@ -189,7 +435,29 @@ class JalDB:
                 logging.error(f"SQL failure: '{error.message()}' for query '{sql_text}' with params '{params}'")
             return None
         if commit:
-            db.commit()
+            cls._active_backend().commit()
+        return query
+
+    # -------------------------------------------------------------------------------------------------------------------
+    # Executes an SQL query from given sql_text once for every tuple of values in 'rows' (executemany-style)
+    # sql_text should use positional '?' placeholders, every row is a tuple of values in the same order
+    # Query is prepared only once and then executed for every row with positionally bound values.
+    # Current transaction will be committed if 'commit' set to true
+    # return value - query object or None in case of failure
+    @classmethod
+    def _exec_many(cls, sql_text, rows, commit=False):
+        if rows:
+            assert sql_text.count('?') == len(rows[0]), f"SQL: wrong number of values {rows[0]} for '{sql_text}'"
+        query, error_text, row = cls._active_backend().execute_many(sql_text, rows)
+        if query is None:
+            error = JalSqlError(error_text)
+            if error.custom():
+                error.show()
+            else:
+                logging.error(f"SQL failure: '{error.message()}' for query '{sql_text}' with values '{row}'")
+            return None
+        if commit:
+            cls._active_backend().commit()
         return query
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -204,10 +472,11 @@ class JalDB:
         if query.next():
             res = cls._read_record(query, named=named)
             if check_unique and query.next():
-                return None  # More than one record in result when only one expected
-            return res
+                res = None  # More than one record in result when only one expected
         else:
-            return None
+            res = None
+        query.finish()   # Release the statement as it stays in cache
+        return res
 
     # ------------------------------------------------------------------------------------------------------------------
     # Method takes current active record of given query and returns its values as:
@@ -217,6 +486,8 @@ class JalDB:
     def _read_record(cls, query, named=False, cast=None):
         if cast is None:
             cast = []
+        if JalDB._native_rows or hasattr(JalDB._thread, 'backend'):   # Readers from the pool are sqlite3 always
+            return cls._read_row(query, named, cast)
         values = {} if named else []
         if cast:
             assert len(cast) == query.record().count()
@@ -234,8 +505,74 @@ class JalDB:
         else:
             return None
 
+    # The same as _read_record() but for backends that provide all record values at once
+    @classmethod
+    def _read_row(cls, query, named, cast):
+        values = query.row()
+        if cast:
+            assert len(cast) == len(values)
+            values = [convert(value) for convert, value in zip(cast, values)]
+        if not values:
+            return None
+        if named:
+            return dict(zip(query.field_names(), values))
+        if len(values) == 1:
+            return values[0]
+        return list(values)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # Amounts in 'ledger' and 'ledger_totals' tables are stored in one of 2 ways depending on 'LedgerFixedPoint' setting:
+    # 0 - as decimal TEXT (default)
+    # 1 - as INTEGER scaled by 10^precision, where precision is a decimal precision of account that owns the amount.
+    #     Ledger amounts are rounded to this precision anyway, so SQL aggregation of such values within one account
+    #     is exact and is done by SQLite natively without conversion of text into float.
+    # Returns True if ledger amounts are stored as scaled integers
+    @classmethod
+    def _ledger_fixed_point(cls) -> bool:
+        if JalDB._fixed_point is None:
+            JalDB._fixed_point = cls._read("SELECT value FROM settings WHERE name='LedgerFixedPoint'") == 1
+        return JalDB._fixed_point
+
+    # Returns a value that should be stored in ledger for 'amount' of account with given precision
+    @classmethod
+    def _ledger_encode(cls, amount: Decimal, precision: int):
+        if cls._ledger_fixed_point():
+            value = int(amount.scaleb(precision).to_integral_value())
+            if abs(value) > cls.LEDGER_INTEGER_LIMIT:
+                raise OverflowError(f"Ledger amount {amount} doesn't fit into integer with precision {precision}")
+            return value
+        return format_decimal(amount)
+
+    # Converts ledger value (or a result of its SQL aggregation) into Decimal. None value is returned as is.
+    @classmethod
+    def _ledger_decode(cls, value, precision: int) -> Decimal:
+        if value is None or value == '':
+            return None
+        if cls._ledger_fixed_point():
+            return Decimal(int(value)).scaleb(-precision)
+        return Decimal(value)
+
+    # Returns a sum of ledger values that are selected by sql_text query (it should return 1 column).
+    # Integers are summed by SQLite natively. But SQL SUM() of decimal text is calculated in floating point (and its
+    # result depends on SQLite version), so text values are summed as Decimal - by DECIMAL_SUM() aggregate function
+    # if backend provides it or by iteration over query result otherwise.
+    @classmethod
+    def _ledger_sum(cls, sql_text, params, precision: int) -> Decimal:
+        if cls._ledger_fixed_point():
+            value = cls._read(f"WITH _values(value) AS ({sql_text}) SELECT SUM(value) FROM _values", params)
+            return cls._ledger_decode(value, precision) if value else Decimal('0')
+        if cls._active_backend().decimal_sum():
+            value = cls._read(f"WITH _values(value) AS ({sql_text}) SELECT DECIMAL_SUM(value) FROM _values", params)
+            return Decimal(value) if value else Decimal('0')
+        total = Decimal('0')
+        query = cls._exec(sql_text, params)
+        while query.next():
+            total += Decimal(query.value(0))
+        return total
+
     # ------------------------------------------------------------------------------------------------------------------
     def invalidate_cache(self):
+        JalDB._cache_version += 1
         processed_cache_classes = set()   # a list of classes that were already invalidated and don't need extra action
         for item in self._instances_with_cache:
             if item.class_cache() and type(item) in processed_cache_classes:
@@ -244,6 +581,12 @@ class JalDB:
                 processed_cache_classes.add(type(item))
             item.invalidate_cache()
 
+    # Returns a number that is changed every time when cached data are invalidated. It allows to detect that values
+    # derived from cached data (like names of accounts and assets) should be re-calculated.
+    @classmethod
+    def cache_version(cls) -> int:
+        return JalDB._cache_version
+
     # Method returns true if data are cached on a class level, not in every instance
     @classmethod
     def class_cache(cls) -> True:
@@ -258,31 +601,32 @@ class JalDB:
             _ = self._exec("UPDATE settings SET value=0 WHERE name='TriggersEnabled'", commit=True)
 
     # ------------------------------------------------------------------------------------------------------------------
-    # Set synchronous mode ON if synchronous == True and OFF it otherwise
+    # Set synchronous mode ON (or configured one) if synchronous == True and OFF it otherwise
     def set_synchronous(self, synchronous):
         if synchronous:
-            _ = self._exec("PRAGMA synchronous = ON")
+            _ = self._exec(f"PRAGMA synchronous = {JalDB._pragmas.get('synchronous', 'ON')}")
         else:
             _ = self._exec("PRAGMA synchronous = OFF")
 
     # ------------------------------------------------------------------------------------------------------------------
     # Enables DB foreign keys if enable == True and disables it otherwise
     def enable_fk(self, enable):
-        if enable:
-            _ = self._exec("PRAGMA foreign_keys = ON")
-        else:
-            _ = self._exec("PRAGMA foreign_keys = OFF")
+        pragma = "PRAGMA foreign_keys = ON" if enable else "PRAGMA foreign_keys = OFF"
+        _ = self._exec(pragma)
+        if self.backend_name() != DbBackend.QTSQL and QSqlDatabase.contains(Setup.DB_CONNECTION):
+            _ = QSqlQuery(self.connection()).exec(pragma)   # The same for QtSql connection of table models
 
     # Method loads sql script into database
     def run_sql_script(self, script_file) -> JalDBError:
+        self.clear_statement_cache()   # Cached statements may lock tables that are modified by script
         try:
             with open(script_file, 'r', encoding='utf-8') as sql_script:
                 statements = sqlparse.split(sql_script)
                 for statement in statements:
                     clean_statement = sqlparse.format(statement, strip_comments=True)
-                    if self._exec(clean_statement, commit=False) is None:
+                    if self._exec(clean_statement, commit=False, cached=False) is None:
                         _ = self._exec("ROLLBACK")
-                        self.connection().close()
+                        self.close_db()
                         return JalDBError(JalDBError.SQLFailure, f"FAILED: {clean_statement}")
                     else:
                         logging.debug(f"EXECUTED OK:\n{clean_statement}")
@@ -291,12 +635,12 @@ class JalDB:
         return JalDBError(JalDBError.NoError)
 
     # updates current db schema to the latest available with help of scripts in 'updates' folder
-    def update_db_schema(self, db_path) -> JalDBError:
-        if QMessageBox().warning(None, QApplication.translate('DB', "Database format is outdated"),
+    # User is asked for confirmation if 'confirm' is True
+    def update_db_schema(self, db_path, confirm=True) -> JalDBError:
+        if confirm and QMessageBox().warning(None, QApplication.translate('DB', "Database format is outdated"),
                                  QApplication.translate('DB', "Do you agree to upgrade your data to newer format?"),
                                  QMessageBox.Yes, QMessageBox.No) == QMessageBox.No:
             return JalDBError(JalDBError.OutdatedDbSchema)
-        db = self.connection()
         version = self._read("SELECT value FROM settings WHERE name='SchemaVersion'")
         try:
             schema_version = int(version)
@@ -307,12 +651,17 @@ class JalDB:
             logging.info(f"Applying delta schema {step}->{step + 1} from {delta_file}")
             error = self.run_sql_script(delta_file)
             if error.code != JalDBError.NoError:
-                db.close()
+                self.close_db()
                 return error
         return JalDBError(JalDBError.NoError)
 
-    def commit(self):
-        self.connection().commit()
+    @classmethod
+    def commit(cls):
+        JalDB._backend.commit()
+
+    @classmethod
+    def rollback(cls):
+        JalDB._backend.rollback()
 
     # This method creates a db record in 'table' name that describes relevant operation.
     # 'data' is a dict that contains operation data and dict 'fields' describes it having
@@ -394,6 +743,13 @@ class JalModel(QSqlTableModel, JalDB):
         self.setTable(table_name)
         self._table = table_name
 
+    # Model data are stored via QtSql connection so last inserted id should be taken from it (JalDB backend may differ)
+    def last_insert_id(self):
+        query = QSqlQuery(self.database())
+        if not query.exec("SELECT last_insert_rowid()") or not query.next():
+            return None
+        return query.value(0)
+
     # Returns value of 'field_name' where 'key_field' is equal to 'search_value'
     def get_value(self, field_name: str, key_field: str, search_value: Union[int, str]) -> str:
         if ' ' in field_name or ' ' in key_field:
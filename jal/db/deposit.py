@@ -52,7 +52,7 @@ class JalDeposit(JalDB):
                            [(":book", BookAccount.Savings), (":type", LedgerTransaction.TermDeposit),
                             (":id", self._id), (":timestamp", timestamp)])
         while query.next():
-            balance += self._read_record(query, cast=[Decimal])
+            balance += self._ledger_decode(self._read_record(query), self._account.precision())
         return balance
 
     # Return a timestamp of deposit opening
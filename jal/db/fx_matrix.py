@@ -0,0 +1,215 @@
+import os
+import json
+import logging
+import numpy as np
+from jal.constants import PredefinedAsset
+from jal.db.db import JalDB
+from jal.db.asset import JalAsset
+
+DAY = 86400
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Daily matrix of currency rates that allows to convert arrays of amounts in one pass (see rates() method).
+# Matrix has shape [day, currency, currency] where day is a number of day since the first currency quotation and
+# currencies are indexed in order of their ids. Element [d, i, j] is the last known direct rate of currency i in
+# currency j at the end of day d, i.e. quotes from 'quotes' table are forward-filled (NaN if there were no quotes yet).
+# Rates that aren't available directly are calculated as cross-rates via base currency that was in effect at given
+# moment - the same way as JalAsset.quote() does.
+# Matrix is stored in memory-mapped file <db file>.fx.npy (its metadata are in <db file>.fx.json) and is updated
+# incrementally starting from the first day which quotes were modified after quotes modification.
+# Rates are floats and every row keeps the last rates of the day. So, unlike JalAsset.quote() that returns exact
+# Decimal quote in effect at given moment, a rate for a moment in the middle of a day includes quotes of the whole day.
+class FxMatrix(JalDB):
+    FILE_SUFFIX = ".fx"
+    NO_QUOTES = [0, 0.0, 0.0]   # Checksum of a day without quotes
+    _matrix = None            # numpy array [day, currency, currency] or None if it isn't loaded yet
+    _first_day = 0            # Day number (since epoch) of the first row of the matrix
+    _currencies = []          # Sorted list of currency ids, index in this list is an index in matrix
+    _sums = []                # Checksums of quotes that were included into every row of matrix (see _checksums())
+    _quotes_version = None    # Value of JalAsset._quotes_version that matrix corresponds to
+    _connection = None        # Database connection that matrix corresponds to
+
+    # Returns numpy array of rates to convert amounts of given 'currencies' (an array of currency ids) at moments given
+    # by 'timestamps' array into 'currency_id'. Rate is 0 if it isn't available.
+    @classmethod
+    def rates(cls, timestamps, currencies, currency_id: int) -> np.ndarray:
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        currencies = np.asarray(currencies, dtype=np.int64)
+        result = np.ones(len(timestamps))
+        converted = currencies != currency_id
+        if not converted.any():
+            return result
+        cls.update()
+        ids = np.array(FxMatrix._currencies, dtype=np.int64)
+        if FxMatrix._matrix is None or currency_id not in FxMatrix._currencies:
+            result[converted] = 0
+            return result
+        matrix = FxMatrix._matrix
+        ts = timestamps[converted]
+        days = ts // DAY - FxMatrix._first_day
+        known = (days >= 0) & np.isin(currencies[converted], ids)
+        days = np.clip(days, 0, len(matrix) - 1)
+        src = np.searchsorted(ids, currencies[converted]).clip(0, len(ids) - 1)
+        dst = FxMatrix._currencies.index(currency_id)
+        since, base_ids = JalAsset.get_base_currency_series()
+        base_idx = np.searchsorted(since, ts, side='right') - 1
+        base = np.where(base_idx >= 0, np.array(base_ids + [0], dtype=np.int64)[base_idx], 0)
+        known &= np.isin(base, ids)
+        base = np.searchsorted(ids, base).clip(0, len(ids) - 1)
+        rate = matrix[days, src, dst]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cross = matrix[days, src, base] / matrix[days, dst, base]
+        rate = np.where(np.isnan(rate), cross, rate)
+        rate[~known | ~np.isfinite(rate)] = 0
+        result[converted] = rate
+        return result
+
+    # Returns a rate to convert currency 'from_id' into currency 'to_id' at given timestamp (0 if rate isn't available)
+    @classmethod
+    def rate(cls, timestamp: int, from_id: int, to_id: int) -> float:
+        return float(cls.rates([timestamp], [from_id], to_id)[0])
+
+    # Brings matrix in line with 'quotes' table: loads it from file and/or updates it if quotes were modified.
+    # Quotes are compared with matrix by day checksums (see _checksums()) so the matrix is re-built starting from the
+    # first day where quotes were added, deleted or changed in any way.
+    @classmethod
+    def update(cls) -> None:
+        if FxMatrix._connection is JalDB._backend and FxMatrix._quotes_version == JalAsset._quotes_version:
+            return
+        if FxMatrix._connection is not JalDB._backend:
+            cls._load()
+        FxMatrix._connection = JalDB._backend
+        FxMatrix._quotes_version = JalAsset._quotes_version
+        currencies = []
+        query = cls._exec("SELECT id FROM assets WHERE type_id=:money ORDER BY id", [(":money", PredefinedAsset.Money)])
+        while query.next():
+            currencies.append(cls._read_record(query, cast=[int]))
+        checksums = cls._checksums()
+        if FxMatrix._matrix is None or currencies != FxMatrix._currencies or \
+                (checksums and min(checksums) < FxMatrix._first_day):
+            cls._build(currencies, checksums)
+            return
+        last_day = max(max(checksums, default=0), FxMatrix._first_day + len(FxMatrix._sums) - 1)
+        for row, day in enumerate(range(FxMatrix._first_day, last_day + 1)):
+            expected = FxMatrix._sums[row] if row < len(FxMatrix._sums) else cls.NO_QUOTES
+            if checksums.get(day, cls.NO_QUOTES) != expected:
+                cls._build(currencies, checksums, row)
+                return
+
+    # Returns a dictionary {day: [count, sum of quote x id, sum of time of day x id]} for days with currency quotes.
+    # Any modification of quotes of the day (including change of quote value) changes its checksum.
+    @classmethod
+    def _checksums(cls) -> dict:
+        checksums = {}
+        query = cls._exec(f"SELECT q.timestamp/{DAY} AS day, COUNT(q.id), TOTAL(q.quote*q.id), "
+                          f"TOTAL((q.timestamp%{DAY})*q.id) FROM ({cls._quotes_sql()}) q GROUP BY day",
+                          [(":money", PredefinedAsset.Money), (":begin", 0)])
+        while query.next():
+            day, count, quotes_sum, time_sum = cls._read_record(query, cast=[int, int, float, float])
+            checksums[day] = [count, quotes_sum, time_sum]
+        return checksums
+
+    # (Re)builds matrix for given currencies starting from given row. Rows before it are kept intact.
+    # 'checksums' are day checksums of all quotes that matrix will correspond to after the build.
+    @classmethod
+    def _build(cls, currencies: list, checksums: dict, from_row: int = 0) -> None:
+        if from_row == 0:
+            begin = 0
+            first_day = None
+        else:
+            begin = (FxMatrix._first_day + from_row) * DAY
+            first_day = FxMatrix._first_day
+        quotes = []
+        query = cls._exec(f"{cls._quotes_sql()} ORDER BY q.timestamp, q.id",
+                          [(":money", PredefinedAsset.Money), (":begin", begin)])
+        while query.next():
+            _quote_id, timestamp, asset_id, currency_id, quote = \
+                cls._read_record(query, cast=[int, int, int, int, float])
+            quotes.append((timestamp // DAY, asset_id, currency_id, quote))
+        if not quotes and from_row == 0:
+            cls._reset(currencies)
+            cls._save()
+            return
+        if first_day is None:
+            first_day = quotes[0][0]
+        last_day = max(quotes[-1][0] if quotes else first_day + from_row - 1, first_day + from_row - 1)
+        size = len(currencies)
+        rows = np.full((last_day - first_day + 1 - from_row, size, size), np.nan)
+        if quotes:
+            data = np.array(quotes)
+            days = data[:, 0].astype(np.int64) - first_day - from_row
+            src = np.searchsorted(currencies, data[:, 1].astype(np.int64))
+            dst = np.searchsorted(currencies, data[:, 2].astype(np.int64))
+            rows[days, src, dst] = data[:, 3]   # Quotes are sorted by timestamp so the last quote of the day wins
+        if from_row and len(rows):
+            previous = FxMatrix._matrix[from_row - 1]
+            rows[0] = np.where(np.isnan(rows[0]), previous, rows[0])
+        filled = np.where(np.isnan(rows), 0, np.arange(len(rows))[:, None, None])   # Forward-fill along days axis
+        np.maximum.accumulate(filled, axis=0, out=filled)
+        rows = np.take_along_axis(rows, filled, axis=0)
+        rows[:, np.arange(size), np.arange(size)] = 1
+        if from_row:
+            FxMatrix._matrix = np.concatenate([FxMatrix._matrix[:from_row], rows])
+        else:
+            FxMatrix._matrix = rows
+        FxMatrix._first_day = first_day
+        FxMatrix._currencies = currencies
+        FxMatrix._sums = [checksums.get(first_day + i, cls.NO_QUOTES) for i in range(len(FxMatrix._matrix))]
+        cls._save()
+
+    # Returns a text of SQL query that selects quotes of one currency in another currency since :begin timestamp
+    @classmethod
+    def _quotes_sql(cls) -> str:
+        return "SELECT q.id, q.timestamp, q.asset_id, q.currency_id, q.quote FROM quotes q " \
+               "JOIN assets a ON a.id=q.asset_id AND a.type_id=:money " \
+               "JOIN assets c ON c.id=q.currency_id AND c.type_id=:money WHERE q.timestamp>=:begin"
+
+    @classmethod
+    def _reset(cls, currencies: list = None) -> None:
+        FxMatrix._matrix = None
+        FxMatrix._first_day = 0
+        FxMatrix._currencies = currencies if currencies is not None else []
+        FxMatrix._sums = []
+
+    @classmethod
+    def _file_name(cls) -> str:
+        return cls._db_path() + cls.FILE_SUFFIX
+
+    # Loads matrix from file that is located next to database file (matrix is reset if there is no valid file)
+    @classmethod
+    def _load(cls) -> None:
+        cls._reset()
+        try:
+            with open(cls._file_name() + ".json", 'r') as metadata_file:
+                metadata = json.load(metadata_file)
+            matrix = np.load(cls._file_name() + ".npy", mmap_mode='r')
+            if matrix.shape != (len(metadata['sums']), len(metadata['currencies']), len(metadata['currencies'])):
+                return
+        except (OSError, ValueError, KeyError):
+            return
+        FxMatrix._matrix = matrix
+        FxMatrix._first_day = metadata['first_day']
+        FxMatrix._currencies = metadata['currencies']
+        FxMatrix._sums = metadata['sums']
+
+    # Saves matrix into file next to database file. Failure isn't critical as matrix may be re-built from quotes
+    @classmethod
+    def _save(cls) -> None:
+        metadata = {'first_day': FxMatrix._first_day, 'currencies': FxMatrix._currencies,
+                    'sums': FxMatrix._sums}
+        file_name = cls._file_name()
+        try:
+            if FxMatrix._matrix is None:
+                for suffix in [".npy", ".json"]:
+                    if os.path.exists(file_name + suffix):
+                        os.remove(file_name + suffix)
+                return
+            np.save(file_name + ".tmp.npy", FxMatrix._matrix)
+            os.replace(file_name + ".tmp.npy", file_name + ".npy")
+            with open(file_name + ".json", 'w') as metadata_file:
+                json.dump(metadata, metadata_file)
+        except OSError as e:
+            logging.warning(f"Can't save currency rates matrix into '{file_name}': {e}")
+            return
+        FxMatrix._matrix = np.load(file_name + ".npy", mmap_mode='r')
@@ -1,4 +1,5 @@
 import os
+import string
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal, InvalidOperation
 from PySide6.QtCore import QLocale
@@ -11,6 +12,12 @@ def format_decimal(d) -> str:
     return str(d.normalize())
 
 
+# Returns a key to compare strings the same way as SQLite NOCASE collation does (only ASCII letters are case-folded)
+NOCASE_TABLE = str.maketrans(string.ascii_lowercase, string.ascii_uppercase)
+def nocase(text: str) -> str:
+    return text.translate(NOCASE_TABLE)
+
+
 # Removes exponent and trailing zeros from Decimal number
 def remove_exponent(d) -> Decimal:
     return d.quantize(Decimal(1)) if d == d.to_integral() else d.normalize()
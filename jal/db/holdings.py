@@ -0,0 +1,144 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from jal.constants import Setup, BookAccount
+from jal.db.db import JalDB
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Holdings snapshots keep positions of accounts - last ledger values of (book_account, asset_id) pairs for Money, Assets
+# and Liabilities books - at checkpoints in 'holdings_snapshots' table. Checkpoints are the last seconds of every
+# Setup.HOLDINGS_SNAPSHOT_MONTHS-th month plus the moment of the last ledger record of every account (latest snapshot).
+# Snapshots are maintained by Ledger.rebuild() and position at any moment is a snapshot at preceding checkpoint with
+# ledger records after it applied on top, i.e. it takes O(positions) instead of O(ledger) to get it.
+# Ledger triggers remove records of changed accounts without touching snapshots. That is why snapshot of an account
+# is valid only if it was taken before the last ledger record of the account (periodic one) or exactly at this record
+# (latest one), all other snapshots are skipped and then replaced by next rebuild.
+class JalHoldings(JalDB):
+    BOOKS = [BookAccount.Money, BookAccount.Assets, BookAccount.Liabilities]
+
+    # Returns the last checkpoint before given timestamp
+    @staticmethod
+    def _checkpoint_before(timestamp: int) -> int:
+        moment = datetime.utcfromtimestamp(timestamp)
+        month = moment.year * 12 + moment.month - 1
+        month -= month % Setup.HOLDINGS_SNAPSHOT_MONTHS
+        begin = datetime(year=month // 12, month=month % 12 + 1, day=1, tzinfo=timezone.utc)
+        return int(begin.timestamp()) - 1
+
+    # Re-creates snapshots after ledger rebuild. 'accounts' are given the same way as Ledger.rebuild() does:
+    # {account_id: timestamp} dictionary of re-built accounts or None if all accounts were re-built since 'frontier'.
+    # Every account is replayed from its last valid periodic snapshot.
+    @classmethod
+    def update(cls, frontier: int, accounts: dict = None) -> None:
+        if accounts is None:
+            accounts = {}
+            query = cls._exec("SELECT id FROM accounts")
+            while query.next():
+                accounts[cls._read_record(query, cast=[int])] = frontier
+        snapshots = []
+        for account_id, timestamp in accounts.items():
+            last_ts = cls._read("SELECT MAX(timestamp) FROM ledger WHERE account_id=:account_id",
+                                [(":account_id", account_id)])
+            last_ts = 0 if last_ts is None or last_ts == '' else last_ts
+            _ = cls._exec("DELETE FROM holdings_snapshots WHERE account_id=:account_id "
+                          "AND (latest=1 OR timestamp>=:frontier)",
+                          [(":account_id", account_id), (":frontier", min(timestamp, last_ts))])
+            snapshots += cls._replay_account(account_id)
+        _ = cls._exec_many("INSERT INTO holdings_snapshots (timestamp, latest, account_id, book_account, asset_id, "
+                           "amount_acc, value_acc) VALUES (?, ?, ?, ?, ?, ?, ?)", snapshots)
+
+    # Returns a list of snapshot rows for the account since its last periodic snapshot
+    @classmethod
+    def _replay_account(cls, account_id: int) -> list:
+        snapshots = []
+        params = [(":account_id", account_id)]
+        start = cls._read("SELECT MAX(timestamp) FROM holdings_snapshots WHERE account_id=:account_id", params)
+        start = -1 if start is None or start == '' else start
+        state = {}    # {(book_account, asset_id): [amount_acc, value_acc]} with values as they are stored in db
+        query = cls._exec("SELECT book_account, asset_id, amount_acc, value_acc FROM holdings_snapshots "
+                          "WHERE account_id=:account_id AND timestamp=:start", params + [(":start", start)])
+        while query.next():
+            book, asset_id, amount, value = cls._read_record(query)
+            state[(book, asset_id)] = [amount, value]
+
+        def take_snapshot(timestamp, latest):
+            for (book_account, asset), (amount_acc, value_acc) in state.items():
+                if Decimal(str(amount_acc)):
+                    snapshots.append([timestamp, latest, account_id, book_account, asset, amount_acc, value_acc])
+
+        last_checkpoint = start
+        timestamp = None
+        query = cls._exec("SELECT timestamp, book_account, asset_id, amount_acc, value_acc FROM ledger "
+                          "WHERE account_id=:account_id AND timestamp>:start "
+                          "AND book_account IN (:money, :assets, :liabilities) ORDER BY timestamp, id",
+                          params + [(":start", start), (":money", BookAccount.Money), (":assets", BookAccount.Assets),
+                                    (":liabilities", BookAccount.Liabilities)], forward_only=True)
+        while query.next():
+            timestamp, book, asset_id, amount, value = cls._read_record(query)
+            checkpoint = cls._checkpoint_before(timestamp)
+            if checkpoint > last_checkpoint:   # State isn't changed between checkpoints without ledger records
+                take_snapshot(checkpoint, 0)
+                last_checkpoint = checkpoint
+            state[(book, asset_id)] = [amount, value]
+        if timestamp is not None:
+            take_snapshot(timestamp, 1)
+        return snapshots
+
+    # Returns positions of all accounts (or of one account if 'account_id' is given) at given timestamp as a dictionary
+    # {account_id: {(book_account, asset_id): (amount, value)}}. Positions with zero amount are omitted.
+    @classmethod
+    def positions(cls, timestamp: int, account_id: int = 0) -> dict:
+        positions = {}
+        query = cls._exec(
+            "WITH last_ts AS ("
+            "SELECT a.id AS account_id, (SELECT MAX(l.timestamp) FROM ledger l WHERE l.account_id=a.id) AS ts "
+            "FROM accounts a WHERE a.id=:account_id OR :account_id=0"
+            "), checkpoints AS ("
+            "SELECT t.account_id, (SELECT MAX(s.timestamp) FROM holdings_snapshots s "
+            "WHERE s.account_id=t.account_id AND s.timestamp<=:timestamp "
+            "AND ((s.latest=0 AND s.timestamp<t.ts) OR (s.latest=1 AND s.timestamp=t.ts))) AS ts FROM last_ts t"
+            ") "
+            "SELECT 0 AS delta, s.account_id, s.book_account, s.asset_id, s.amount_acc, s.value_acc "
+            "FROM checkpoints c JOIN holdings_snapshots s ON s.account_id=c.account_id AND s.timestamp=c.ts "
+            "UNION ALL "
+            "SELECT 1 AS delta, l.account_id, l.book_account, l.asset_id, l.amount_acc, l.value_acc FROM ledger l "
+            "WHERE l.id IN (SELECT MAX(d.id) FROM checkpoints c JOIN ledger d ON d.account_id=c.account_id "
+            "AND d.timestamp>COALESCE(c.ts, -1) AND d.timestamp<=:timestamp "
+            "WHERE d.book_account IN (:money, :assets, :liabilities) GROUP BY d.account_id, d.book_account, d.asset_id) "
+            "ORDER BY delta",
+            [(":account_id", account_id), (":timestamp", timestamp), (":money", BookAccount.Money),
+             (":assets", BookAccount.Assets), (":liabilities", BookAccount.Liabilities)])
+        while query.next():
+            _delta, account, book, asset_id, amount, value = cls._read_record(query, cast=[int, int, int, int, str, str])
+            precision = JalAccount(account).precision()
+            amount = cls._ledger_decode(amount, precision)
+            value = cls._ledger_decode(value, precision)
+            account_positions = positions.setdefault(account, {})
+            if amount:
+                account_positions[(book, asset_id)] = (amount, value)
+            else:   # Ledger record after checkpoint closes position
+                account_positions.pop((book, asset_id), None)
+        return positions
+
+    # Returns a list of assets in given positions of an account in the same form as JalAccount.assets_list() does
+    @staticmethod
+    def assets_list(positions: dict) -> list:
+        return [{"asset": JalAsset(asset_id), "amount": amount, "value": value}
+                for (book, asset_id), (amount, value) in positions.items() if book == BookAccount.Assets]
+
+    # Returns amount of money (including debts) in given currency from given positions of an account
+    @staticmethod
+    def money(positions: dict, currency_id: int) -> Decimal:
+        return positions.get((BookAccount.Money, currency_id), (Decimal('0'),))[0] + \
+            positions.get((BookAccount.Liabilities, currency_id), (Decimal('0'),))[0]
+
+    # Returns value of given positions of an account in its currency at given timestamp (the same as
+    # JalAccount.balance() returns)
+    @classmethod
+    def balance(cls, positions: dict, account: JalAccount, timestamp: int) -> Decimal:
+        value = cls.money(positions, account.currency())
+        for asset in cls.assets_list(positions):
+            value += asset['amount'] * asset['asset'].quotes_at([timestamp], account.currency())[0]
+        return value
@@ -10,6 +10,7 @@ from jal.db.helpers import now_ts, day_end
 from jal.db.tree_model import AbstractTreeItem, ReportTreeModel
 from jal.db.account import JalAccount
 from jal.db.asset import JalAsset
+from jal.db.holdings import JalHoldings
 from jal.db.operations import LedgerTransaction, Transfer, CorporateAction
 from jal.widgets.delegates import GridLinesDelegate, FloatDelegate, TimestampDelegate
 from jal.widgets.helpers import ts2d
@@ -215,9 +216,10 @@ class HoldingsModel(ReportTreeModel):
     def prepareData(self):
         holdings = []
         accounts = JalAccount.get_all_accounts(account_type=PredefinedAccountType.Investment, active_only=self._only_active_accounts)
+        positions = JalHoldings.positions(self._date)
         for account in accounts:
             account_holdings = []
-            assets = account.assets_list(self._date)
+            assets = JalHoldings.assets_list(positions.get(account.id(), {}))
             rate = JalAsset(account.currency()).quote(self._date, self._currency)[1]
             all_fields = ['currency', 'account', 'asset']
             display_fields = [y for y in all_fields if y not in [x.strip("_id") for x in self._groups]]
@@ -256,7 +258,7 @@ class HoldingsModel(ReportTreeModel):
                 }
                 record['header'] = ': '.join([record[x] for x in display_fields])
                 account_holdings.append(record)
-            money = account.get_asset_amount(self._date, account.currency())
+            money = JalHoldings.money(positions.get(account.id(), {}), account.currency())
             if money:
                 record = {
                     "currency_id": account.currency(),
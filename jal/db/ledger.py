@@ -1,17 +1,23 @@
 import sys
 import logging
 import traceback
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from decimal import Decimal
-from PySide6.QtCore import Signal, QObject, QDate
+from PySide6.QtCore import Signal, QObject, QDate, QCoreApplication
 from PySide6.QtWidgets import QDialog, QMessageBox
 from jal.constants import BookAccount
 from jal.db.helpers import format_decimal
 from jal.db.db import JalDB
+from jal.db.backend import DbBackend
 from jal.db.account import JalAccount
+from jal.db.closed_trade import JalClosedTrade
+from jal.db.holdings import JalHoldings
 from jal.db.settings import JalSettings
-from jal.db.operations import LedgerTransaction, LedgerError
-from jal.widgets.helpers import ts2dt, ts2d
+from jal.db.operations import LedgerTransaction, Transfer, LedgerError
+from jal.widgets.helpers import ts2dt, ts2d, is_interactive
 from jal.ui.ui_rebuild_window import Ui_ReBuildDialog
 
 
@@ -75,7 +81,8 @@ class LedgerAmounts(dict, JalDB):
                                 f"{self.__time_filter__} "
                                 f"ORDER BY id DESC LIMIT 1",
                                 [(":book", key[BOOK]), (":account_id", key[ACCOUNT]), (":asset_id", key[ASSET])])
-            amount = Decimal(amount) if amount is not None else Decimal('0')
+            amount = self._ledger_decode(amount, JalAccount(key[ACCOUNT]).precision())
+            amount = Decimal('0') if amount is None else amount
             super().__setitem__(key, amount)
             return amount
 
@@ -84,6 +91,23 @@ class LedgerAmounts(dict, JalDB):
 class Ledger(QObject, JalDB):
     updated = Signal()
     SILENT_REBUILD_THRESHOLD = 1000
+    REBUILDS_KEPT = 100   # Number of the last ledger re-builds those frontiers are kept for views
+    rebuilds = deque(maxlen=REBUILDS_KEPT)   # Frontiers of the last ledger re-builds (see frontier_since())
+    rebuild_count = 0     # Number of all ledger re-builds
+    BATCH_SIZE = 10000    # Number of buffered ledger rows that triggers flush into database in batched mode
+    # Query that selects content of 'operation_sequence' table from operations (the table is maintained by triggers)
+    SEQUENCE_SOURCE = \
+        "SELECT op_type, 1 AS seq, id, timestamp, account_id, 0 AS subtype FROM actions " \
+        "UNION ALL SELECT op_type, 2 AS seq, id, timestamp, account_id, type AS subtype FROM dividends " \
+        "UNION ALL SELECT op_type, 3 AS seq, id, timestamp, account_id, type AS subtype FROM asset_actions " \
+        "UNION ALL SELECT op_type, 4 AS seq, id, timestamp, account_id, 0 AS subtype FROM trades " \
+        "UNION ALL SELECT op_type, 5 AS seq, id, withdrawal_timestamp, withdrawal_account, -1 AS subtype " \
+        "FROM transfers " \
+        "UNION ALL SELECT op_type, 5 AS seq, id, withdrawal_timestamp, fee_account, 0 AS subtype FROM transfers " \
+        "WHERE NOT fee IS NULL " \
+        "UNION ALL SELECT op_type, 5 AS seq, id, deposit_timestamp, deposit_account, 1 AS subtype FROM transfers " \
+        "UNION ALL SELECT td.op_type, 6 AS seq, td.id, da.timestamp, td.account_id, da.id AS subtype " \
+        "FROM deposit_actions AS da JOIN term_deposits AS td ON da.deposit_id=td.id WHERE da.action_type<=100"
 
     def __init__(self):
         super().__init__()
@@ -91,27 +115,58 @@ class Ledger(QObject, JalDB):
         self.values = LedgerAmounts("value_acc")      # together with corresponding value
         self.main_window = None
         self.progress_bar = None
+        # Buffers that are used for batched rebuild
+        self._batched = False
+        self._ledger_rows = []           # ledger rows that are not flushed into database yet
+        self._trades_opened_rows = []    # the same for 'trades_opened' table
+        self._trades_closed_rows = []    # the same for 'trades_closed' table
+        self._pending_records = {}       # not flushed ledger rows indexed by [op_type, operation_id, book]
+        self._totals = {}                # last ledger row for [op_type, operation_id, book, account, asset]
+        self._open_trades = {}           # open positions for [account, asset] indexed by [op_type, operation_id]
+
+    # Returns the earliest frontier of ledger re-builds that happened after 'rebuild_count' re-builds and current
+    # number of re-builds. Views use it to find outdated data after 'updated' signal. Frontier is 0 if there were no
+    # re-builds since then (as 'updated' is emitted after other changes also) or if they aren't kept anymore.
+    @classmethod
+    def frontier_since(cls, rebuild_count: int) -> (int, int):
+        missed = Ledger.rebuild_count - rebuild_count
+        if missed <= 0 or missed > len(Ledger.rebuilds):
+            return 0, Ledger.rebuild_count
+        return min(list(Ledger.rebuilds)[-missed:]), Ledger.rebuild_count
 
     def setProgressBar(self, main_window, progress_widget):
         self.main_window = main_window
         self.progress_bar = progress_widget
 
-    # Returns timestamp of last operations that were calculated into ledger
+    # Returns timestamp since which all accounts have their operations calculated into ledger
     def getCurrentFrontier(self):
         current_frontier = self._read("SELECT ledger_frontier FROM frontier")
-        if current_frontier == '':
+        if current_frontier is None or current_frontier == '':
             current_frontier = 0
         return current_frontier
 
+    # Returns a list of {op_type, seq, id, timestamp, account_id, subtype} of operations between 'begin' and 'end'
+    # (for given account only if account_id isn't 0) in order of their processing.
+    # Result may be fetched page by page: 'limit' is a maximum number of records to return and 'after' is the last
+    # record of previous page (keyset pagination that uses 'operation_sequence_idx' index)
     @classmethod
-    def get_operations_sequence(cls, begin: int, end: int, account_id: int = 0) -> list:
+    def get_operations_sequence(cls, begin: int, end: int, account_id: int = 0, after: dict = None,
+                                limit: int = 0) -> list:
         sequence = []
-        query_text = "SELECT op_type, id, timestamp, account_id, subtype " \
+        query_text = "SELECT op_type, seq, id, timestamp, account_id, subtype " \
                      "FROM operation_sequence WHERE timestamp>=:begin AND timestamp<=:end"
         params = [(":begin", begin), (":end", end)]
         if account_id:
             query_text += " AND account_id=:account"
             params += [(":account", account_id)]
+        if after is not None:
+            query_text += " AND (timestamp, seq, subtype, id) > (:timestamp, :seq, :subtype, :id)"
+            params += [(":timestamp", after['timestamp']), (":seq", after['seq']), (":subtype", after['subtype']),
+                       (":id", after['id'])]
+        query_text += " ORDER BY timestamp, seq, subtype, id"
+        if limit:
+            query_text += " LIMIT :limit"
+            params += [(":limit", limit)]
         query = cls._exec(query_text, params, forward_only=True)
         while query.next():
             sequence.append(cls._read_record(query, named=True))
@@ -178,6 +233,16 @@ class Ledger(QObject, JalDB):
                 (self.values[(book, operation.account_id(), asset_id)] != Decimal('0')):
             rounding_error = Decimal('0') - self.values[(book, operation.account_id(), asset_id)]
             self.values[(book, operation.account_id(), asset_id)] += rounding_error
+        if self._batched:
+            self._buffer_ledger_row((operation.timestamp(), operation.type(), operation.oid(), book, asset_id,
+                                     operation.account_id(), self._ledger_encode(amount, precision),
+                                     self._ledger_encode(value, precision),
+                                     self._ledger_encode(self.amounts[(book, operation.account_id(), asset_id)],
+                                                         precision),
+                                     self._ledger_encode(self.values[(book, operation.account_id(), asset_id)],
+                                                         precision),
+                                     peer, category, tag))
+            return rounding_error
         _ = self._exec("INSERT INTO ledger (timestamp, op_type, operation_id, book_account, asset_id, "
                        "account_id, amount, value, amount_acc, value_acc, peer_id, category_id, tag_id) "
                        "VALUES(:timestamp, :op_type, :operation_id, :book, :asset_id, :account_id, "
@@ -185,12 +250,132 @@ class Ledger(QObject, JalDB):
                        [(":timestamp", operation.timestamp()), (":op_type", operation.type()),
                         (":operation_id", operation.oid()), (":book", book), (":asset_id", asset_id),
                         (":account_id", operation.account_id()),
-                        (":amount", format_decimal(amount)), (":value", format_decimal(value)),
-                        (":amount_acc", format_decimal(self.amounts[(book, operation.account_id(), asset_id)])),
-                        (":value_acc", format_decimal(self.values[(book, operation.account_id(), asset_id)])),
+                        (":amount", self._ledger_encode(amount, precision)),
+                        (":value", self._ledger_encode(value, precision)),
+                        (":amount_acc",
+                         self._ledger_encode(self.amounts[(book, operation.account_id(), asset_id)], precision)),
+                        (":value_acc",
+                         self._ledger_encode(self.values[(book, operation.account_id(), asset_id)], precision)),
                         (":peer_id", peer), (":category_id", category), (":tag_id", tag)])
         return rounding_error
 
+    # Puts a row of 'ledger' table into the buffer of batched rebuild and updates in-memory ledger totals.
+    # Row is a tuple of (timestamp, op_type, operation_id, book, asset_id, account_id, amount, value,
+    # amount_acc, value_acc, peer_id, category_id, tag_id) with Decimal values encoded for storage (see _ledger_encode())
+    def _buffer_ledger_row(self, row):
+        self._ledger_rows.append(row)
+        self._pending_records.setdefault((row[1], row[2], row[3]), []).append(row)
+        totals_key = (row[1], row[2], row[3], row[5], row[4])
+        self._totals.pop(totals_key, None)   # Re-insert key in order to keep dict ordered the same way as ledger rows
+        self._totals[totals_key] = (row[1], row[2], row[0], row[3], row[4], row[5], row[8], row[9])
+        if len(self._ledger_rows) >= self.BATCH_SIZE:
+            self._flush()
+
+    # Writes all buffered rows into 'ledger', 'trades_opened' and 'trades_closed' tables
+    def _flush(self):
+        results = [
+            self._exec_many("INSERT INTO ledger (timestamp, op_type, operation_id, book_account, asset_id, account_id, "
+                            "amount, value, amount_acc, value_acc, peer_id, category_id, tag_id) "
+                            "VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._ledger_rows),
+            self._exec_many("INSERT INTO trades_opened(timestamp, op_type, operation_id, account_id, asset_id, "
+                            "price, remaining_qty) VALUES(?, ?, ?, ?, ?, ?, ?)", self._trades_opened_rows),
+            self._exec_many("INSERT INTO trades_closed(account_id, asset_id, open_op_type, open_op_id, "
+                            "open_timestamp, open_price, close_op_type, close_op_id, close_timestamp, close_price, "
+                            "qty) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self._trades_closed_rows)
+        ]
+        self._ledger_rows = []
+        self._trades_opened_rows = []
+        self._trades_closed_rows = []
+        self._pending_records = {}
+        if None in results:   # Buffers are cleared anyway as failed rows can't be stored by repeated attempt
+            raise LedgerError(self.tr("Failed to store ledger records into database"))
+
+    # Returns a list of {"account_id", "timestamp", "amount", "value"} ledger records of given book that were created
+    # for operation with given op_type and oid. Takes into account buffered records that aren't stored in db yet.
+    # Values of amount and value are returned as Decimal.
+    def get_operation_records(self, op_type, oid, book) -> list:
+        records = []
+        query = self._exec("SELECT account_id, timestamp, amount, value FROM ledger "
+                           "WHERE book_account=:book AND op_type=:op_type AND operation_id=:oid ORDER BY id",
+                           [(":book", book), (":op_type", op_type), (":oid", oid)])
+        while query.next():
+            records.append(self._read_record(query, named=True))
+        for row in self._pending_records.get((op_type, oid, book), []):
+            records.append({"account_id": row[5], "timestamp": row[0], "amount": row[6], "value": row[7]})
+        for record in records:
+            precision = JalAccount(record['account_id']).precision()
+            record['amount'] = self._ledger_decode(record['amount'], precision)
+            record['value'] = self._ledger_decode(record['value'], precision)
+        return records
+
+    # Records a new state of open position for given account and asset (see JalAccount.open_trade())
+    # 'operation' is an operation that opened the position, timestamp - time of position change
+    def open_trade(self, account, timestamp, operation, asset, price, qty):
+        if not self._batched:
+            account.open_trade(timestamp, operation.type(), operation.id(), asset, price, qty)
+            return
+        self._trades_opened_rows.append((timestamp, operation.type(), operation.id(), account.id(), asset.id(),
+                                         format_decimal(price), format_decimal(qty)))
+        positions = self._get_open_positions(account, asset)
+        position = positions.get((operation.type(), operation.id()), None)
+        # keep the same selection rule as JalAccount.open_trades_list(): the latest timestamp wins
+        if position is not None and timestamp < position['timestamp']:
+            return
+        if format_decimal(qty) == format_decimal(Decimal('0')):   # Closed positions aren't kept in memory
+            positions.pop((operation.type(), operation.id()), None)
+        else:
+            positions[(operation.type(), operation.id())] = {
+                "timestamp": timestamp, "operation": operation,
+                "price": Decimal(format_decimal(price)), "remaining_qty": Decimal(format_decimal(qty))}
+
+    # Returns a list of open positions for given account and asset (see JalAccount.open_trades_list())
+    def open_trades_list(self, account, asset) -> list:
+        if not self._batched:
+            return account.open_trades_list(asset)
+        trades = []
+        positions = self._get_open_positions(account, asset)
+        for key in sorted(positions, key=lambda x: (positions[x]['timestamp'], -x[0], x[1])):
+            position = positions[key]
+            if position['operation'] is None:
+                position['operation'] = LedgerTransaction().get_operation(key[0], key[1], Transfer.Incoming)
+            trades.append({"operation": position['operation'], "price": position['price'],
+                           "remaining_qty": position['remaining_qty']})
+        return trades
+
+    # Returns a dictionary of open positions that is kept in memory for given account and asset during batched rebuild
+    # Dictionary is initialized with data from db if it is accessed for the first time.
+    # Positions with zero remaining quantity are dropped as operations are processed in timestamp order and such
+    # positions can't be re-opened by a trade with earlier timestamp
+    def _get_open_positions(self, account, asset) -> dict:
+        try:
+            return self._open_trades[(account.id(), asset.id())]
+        except KeyError:
+            pass
+        positions = {}
+        query = self._exec("WITH open_trades_numbered AS "
+                           "(SELECT timestamp, op_type, operation_id, price, remaining_qty, "
+                           "ROW_NUMBER() OVER (PARTITION BY op_type, operation_id ORDER BY timestamp DESC, id DESC) AS row_no "
+                           "FROM trades_opened WHERE account_id=:account AND asset_id=:asset) "
+                           "SELECT timestamp, op_type, operation_id, price, remaining_qty "
+                           "FROM open_trades_numbered WHERE row_no=1 AND remaining_qty!=:zero",
+                           [(":account", account.id()), (":asset", asset.id()),
+                            (":zero", format_decimal(Decimal('0')))])
+        while query.next():
+            timestamp, op_type, oid, price, qty = self._read_record(query, cast=[int, int, int, Decimal, Decimal])
+            positions[(op_type, oid)] = {"timestamp": timestamp, "operation": None, "price": price, "remaining_qty": qty}
+        self._open_trades[(account.id(), asset.id())] = positions
+        return positions
+
+    # Records a closed trade (see JalClosedTrade.create_from_trades())
+    def close_trade(self, open_trade, close_trade, qty, open_price, close_price):
+        if not self._batched:
+            JalClosedTrade.create_from_trades(open_trade, close_trade, qty, open_price, close_price)
+            return
+        self._trades_closed_rows.append((close_trade.account().id(), close_trade.asset().id(), open_trade.type(),
+                                         open_trade.id(), open_trade.timestamp(), format_decimal(open_price),
+                                         close_trade.type(), close_trade.id(), close_trade.timestamp(),
+                                         format_decimal(close_price), format_decimal(qty)))
+
     # Returns Amount measured in current account currency or asset that 'book' has at current ledger frontier
     def getAmount(self, book, account_id, asset_id=None):
         if asset_id is None:
@@ -217,26 +402,108 @@ class Ledger(QObject, JalDB):
             self.appendTransaction(operation, BookAccount.Liabilities, debit)
         return debit
 
+    # Returns a dictionary {account_id: timestamp} of accounts where ledger should be re-built since given timestamp.
+    # Triggers remove ledger records of changed account only, i.e. the last remaining ledger record of an account
+    # is its own frontier (or its first operation if there are no ledger records, accounts without operations are
+    # skipped). Then invalidation is propagated via asset transfers as incoming asset value depends on ledger records
+    # of withdrawal account.
+    def _get_invalidated_accounts(self) -> dict:
+        accounts = {}
+        query = self._exec("SELECT account_id, MIN(timestamp), "
+                           "(SELECT MAX(l.timestamp) FROM ledger l WHERE l.account_id=s.account_id) "
+                           "FROM operation_sequence s GROUP BY account_id", forward_only=True)
+        while query.next():
+            account_id, first_timestamp, timestamp = self._read_record(query)
+            accounts[account_id] = first_timestamp if timestamp is None or timestamp == '' else timestamp
+        transfers = []
+        query = self._exec("SELECT withdrawal_account, withdrawal_timestamp, deposit_account, deposit_timestamp "
+                           "FROM transfers WHERE asset IS NOT NULL", forward_only=True)
+        while query.next():
+            transfers.append(self._read_record(query))
+        changed = True
+        while changed:
+            changed = False
+            for withdrawal_account, withdrawal_timestamp, deposit_account, deposit_timestamp in transfers:
+                if withdrawal_timestamp >= accounts[withdrawal_account] and \
+                        deposit_timestamp < accounts[deposit_account]:
+                    accounts[deposit_account] = deposit_timestamp
+                    changed = True
+        return accounts
+
+    # Returns a number of records that differ between 'operation_sequence' table and operations (missing, extra or
+    # duplicated records). The table is re-filled from operations if there are differences and 'repair' is True.
+    def check_operations_sequence(self, repair=True) -> int:
+        fields = "op_type, seq, id, timestamp, account_id, subtype"
+        differences = self._read(
+            f"WITH records AS (SELECT {fields}, 1 AS n FROM ({self.SEQUENCE_SOURCE}) "
+            f"UNION ALL SELECT {fields}, -1 AS n FROM operation_sequence) "
+            f"SELECT COALESCE(SUM(ABS(n)), 0) FROM (SELECT SUM(n) AS n FROM records GROUP BY {fields})")
+        if differences and repair:
+            logging.warning(self.tr("Operations sequence is inconsistent and will be restored, differences: ") +
+                            f"{differences}")
+            self.begin_transaction()
+            _ = self._exec("DELETE FROM operation_sequence")
+            _ = self._exec(f"INSERT INTO operation_sequence ({fields}) {self.SEQUENCE_SOURCE}")
+            self.commit()
+        return differences
+
+    # Returns SQL condition that selects records of given accounts since given timestamps.
+    # 'accounts' is a dictionary {account_id: timestamp} or None if all accounts should be selected since 'frontier'
+    @staticmethod
+    def _accounts_condition(frontier, accounts, timestamp_field='timestamp') -> str:
+        if accounts is None:
+            return f"{timestamp_field} >= {frontier:d}"
+        if not accounts:
+            return "0"
+        frontiers = " ".join([f"WHEN {account:d} THEN {timestamp:d}" for account, timestamp in accounts.items()])
+        return f"{timestamp_field} >= {frontier:d} AND {timestamp_field} >= CASE account_id {frontiers} END"
+
+    # Switches storage of ledger amounts between decimal text (enabled=False) and integers scaled by account
+    # precision (enabled=True). Ledger is re-built from scratch as all its records should be re-written.
+    # It is switched by 'jal-cli rebuild --fixed-point on|off' command.
+    def set_fixed_point(self, enabled: bool, workers=1):
+        JalSettings().setValue('LedgerFixedPoint', 1 if enabled else 0)
+        JalDB._fixed_point = None
+        self.rebuild(from_timestamp=0, workers=workers)
+
     # Rebuild transaction sequence and recalculate all amounts
     # timestamp:
-    # -1 - re-build from last valid operation (from ledger frontier)
+    # -1 - re-build from last valid operation of every account (incremental mode)
+    #      Only accounts that were changed (and accounts that depend on them via asset transfers) are re-built.
+    #      Ledger records of other accounts are kept intact.
     #      will asks for confirmation if we have more than SILENT_REBUILD_THRESHOLD operations require rebuild
+    #      (there is no confirmation in non-interactive mode, i.e. if it is called from command line interface)
     # 0 - re-build from scratch
     # any - re-build all operations after given timestamp
-    def rebuild(self, from_timestamp=-1, fast_and_dirty=False):
+    # batched:
+    # True - ledger rows, open and closed trades are kept in memory and written into db by large batches in a
+    #        single transaction. Result in db is the same as with batched=False but it works much faster
+    # False - every ledger row and trade is written into db immediately
+    # workers:
+    # 1 - all operations are processed one by one in current process
+    # N - accounts are split into independent groups (connected by asset transfers) and every group is processed
+    #     by one of N worker processes. Results are merged and written into db in the same order as serial rebuild
+    #     does, so the ledger is the same. Batched mode is always used in this case.
+    def rebuild(self, from_timestamp=-1, fast_and_dirty=False, batched=True, workers=1):
         exception_happened = False
         last_timestamp = 0
         self.amounts.clear()
         self.values.clear()
+        self._open_trades = {}
+        self._totals = {}
+        if from_timestamp == 0:   # Full re-build is a good moment to verify operations sequence
+            self.check_operations_sequence()
         if from_timestamp >= 0:
             frontier = from_timestamp
-            operations_count = self._read("SELECT COUNT(id) FROM operation_sequence WHERE timestamp >= :frontier",
-                                          [(":frontier", frontier)])
+            accounts = None
+            condition = self._accounts_condition(frontier, accounts)
+            operations_count = self._read(f"SELECT COUNT(id) FROM operation_sequence WHERE {condition}")
         else:
-            frontier = self.getCurrentFrontier()
-            operations_count = self._read("SELECT COUNT(id) FROM operation_sequence WHERE timestamp >= :frontier",
-                                          [(":frontier", frontier)])
-            if operations_count > self.SILENT_REBUILD_THRESHOLD:
+            accounts = self._get_invalidated_accounts()
+            frontier = min(accounts.values()) if accounts else 0
+            condition = self._accounts_condition(frontier, accounts)
+            operations_count = self._read(f"SELECT COUNT(id) FROM operation_sequence WHERE {condition}")
+            if operations_count > self.SILENT_REBUILD_THRESHOLD and is_interactive():
                 if QMessageBox().warning(None, self.tr("Confirmation"), f"{operations_count}" +
                                          self.tr(" operations require rebuild. Do you want to do it right now?"),
                                          QMessageBox.Yes, QMessageBox.No) == QMessageBox.No:
@@ -250,24 +517,50 @@ class Ledger(QObject, JalDB):
             self.main_window.showProgressBar(True)
         logging.info(self.tr("Re-building ledger since: ") + f"{ts2dt(frontier)}")
         start_time = datetime.now()
-        _ = self._exec("DELETE FROM trades_closed WHERE close_timestamp >= :frontier", [(":frontier", frontier)])
-        _ = self._exec("DELETE FROM ledger WHERE timestamp >= :frontier", [(":frontier", frontier)])
-        _ = self._exec("DELETE FROM ledger_totals WHERE timestamp >= :frontier", [(":frontier", frontier)])
-        _ = self._exec("DELETE FROM trades_opened WHERE timestamp >= :frontier", [(":frontier", frontier)])
+        if accounts is None:
+            _ = self._exec("DELETE FROM trades_closed WHERE close_timestamp >= :frontier", [(":frontier", frontier)])
+            _ = self._exec("DELETE FROM ledger WHERE timestamp >= :frontier", [(":frontier", frontier)])
+            _ = self._exec("DELETE FROM ledger_totals WHERE timestamp >= :frontier", [(":frontier", frontier)])
+            _ = self._exec("DELETE FROM trades_opened WHERE timestamp >= :frontier", [(":frontier", frontier)])
+        else:
+            for account_id, timestamp in accounts.items():
+                params = [(":account", account_id), (":frontier", timestamp)]
+                _ = self._exec("DELETE FROM trades_closed WHERE account_id=:account AND close_timestamp >= :frontier",
+                               params)
+                _ = self._exec("DELETE FROM ledger WHERE account_id=:account AND timestamp >= :frontier", params)
+                _ = self._exec("DELETE FROM ledger_totals WHERE account_id=:account AND timestamp >= :frontier",
+                               params)
+                _ = self._exec("DELETE FROM trades_opened WHERE account_id=:account AND timestamp >= :frontier",
+                               params)
+        last_id = self._read("SELECT COALESCE(MAX(id), 0) FROM ledger")
 
+        if workers > 1:
+            batched = True
         self.enable_triggers(False)
         if fast_and_dirty:  # For 30k operations difference of execution time is - with 0:02:41 / without 0:11:44
             self.set_synchronous(False)
+        if batched:
+            self._batched = True
+            self.begin_transaction()
         try:
-            query = self._exec("SELECT op_type, id, timestamp, account_id, subtype FROM operation_sequence "
-                               "WHERE timestamp >= :frontier", [(":frontier", frontier)])
-            while query.next():
-                data = self._read_record(query, named=True)
-                last_timestamp = data['timestamp']
-                operation = LedgerTransaction().get_operation(data['op_type'], data['id'], data['subtype'])
-                operation.processLedger(self)
-                if self.progress_bar is not None:
-                    self.progress_bar.setValue(query.at())
+            if workers > 1:
+                last_timestamp = self._rebuild_in_parallel(condition, workers)
+            else:
+                sequence = []
+                query = self._exec(f"SELECT op_type, id, timestamp, account_id, subtype FROM operation_sequence "
+                                   f"WHERE {condition} ORDER BY timestamp, seq, subtype, id")
+                while query.next():
+                    sequence.append(self._read_record(query, named=True))
+                # Incremental rebuild loads selected operations only as 'frontier' may be far behind for some accounts
+                preloaded = LedgerTransaction.preload(
+                    frontier, None if accounts is None else [(x['op_type'], x['id']) for x in sequence])
+                for n, data in enumerate(sequence):
+                    last_timestamp = data['timestamp']
+                    operation = LedgerTransaction().get_operation(data['op_type'], data['id'], data['subtype'],
+                                                                  preloaded=preloaded.get((data['op_type'], data['id'])))
+                    operation.processLedger(self)
+                    if self.progress_bar is not None:
+                        self.progress_bar.setValue(n)
         except Exception as e:
             if "pytest" in sys.modules:  # Throw exception if we are in test mode or handle it if we are live
                 raise e
@@ -277,32 +570,185 @@ class Ledger(QObject, JalDB):
             else:
                 logging.error(f"{traceback.format_exc()}")  # and full log for anything unexpected
         finally:
+            if batched:
+                try:
+                    self._flush()
+                except LedgerError as e:   # Exception can't be raised here as clean-up below should be completed
+                    exception_happened = True
+                    logging.error(e)
+                self._batched = False
+            # Fill ledger totals values
+            # NOFIXME: Table 'ledger_totals' may be replaced by a view. But it will impact performance heavily as
+            # this view won't have indices for optimal performance
+            self._fill_totals(last_id, batched)
+            JalHoldings.update(frontier, accounts)
+            if batched:
+                self.commit()
             if fast_and_dirty:
                 self.set_synchronous(True)
             self.enable_triggers(True)
             if self.progress_bar is not None:
                 self.main_window.showProgressBar(False)
-        # Fill ledger totals values
-        # NOFIXME: Table 'ledger_totals' may be replaced by a view. But it will impact performance heavily as
-        # this view won't have indices for optimal performance
-        _ = self._exec(
-            "INSERT INTO ledger_totals"
-            "(op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc) "
-            "SELECT op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc "
-            "FROM ledger "
-            "WHERE id IN (SELECT MAX(id) FROM ledger WHERE timestamp >= :frontier "
-            "GROUP BY op_type, operation_id, book_account, account_id, asset_id)", [(":frontier", frontier)])
         JalSettings().setValue('RebuildDB', 0)
         if exception_happened:
             logging.error(self.tr("Exception happened. Ledger is incomplete. Please correct errors listed in log"))
         else:
             logging.info(self.tr("Ledger is complete. Elapsed time: ") + f"{datetime.now() - start_time}" +
                          self.tr(", new frontier: ") + f"{ts2dt(last_timestamp)}")
-
+        Ledger.rebuilds.append(frontier)
+        Ledger.rebuild_count += 1
         self.updated.emit()
 
+    # Returns a dictionary {account_id: group_id} where accounts with the same group_id are linked via asset transfers
+    # (directly or indirectly) and can't be processed independently. Accounts without asset transfers aren't included.
+    def _get_account_groups(self) -> dict:
+        groups = {}
+
+        def group_of(account):
+            while groups.setdefault(account, account) != account:
+                account = groups[account]
+            return account
+
+        query = self._exec("SELECT withdrawal_account, deposit_account FROM transfers WHERE asset IS NOT NULL",
+                           forward_only=True)
+        while query.next():
+            withdrawal_account, deposit_account = self._read_record(query)
+            groups[group_of(withdrawal_account)] = group_of(deposit_account)
+        return {account: group_of(account) for account in groups}
+
+    # Processes operations selected by 'condition' from 'operation_sequence' in 'workers' separate processes.
+    # Every process has its own db connection and keeps results in memory. Then results of all processes are
+    # put into ledger buffers in the order of operation sequence. Returns timestamp of the last operation.
+    # If an operation fails then other groups stop before operations that follow the failed one in the sequence,
+    # so ledger is the same as serial rebuild leaves after the failure.
+    def _rebuild_in_parallel(self, condition, workers) -> int:
+        last_timestamp = 0
+        groups = self._get_account_groups()
+        sequence = {}
+        query = self._exec(f"SELECT op_type, id, timestamp, account_id, subtype FROM operation_sequence "
+                           f"WHERE {condition} ORDER BY timestamp, seq, subtype, id")
+        while query.next():
+            op_type, oid, last_timestamp, account_id, subtype = self._read_record(query)
+            sequence.setdefault(groups.get(account_id, account_id), []).append((query.at(), op_type, oid, subtype))
+        if not sequence:
+            return last_timestamp
+        results = []
+        errors = []
+        processed_count = 0
+        start_time = datetime.now()
+        context = multiprocessing.get_context('spawn')
+        stop_at = context.Value('q', sys.maxsize)   # Number of the first failed operation in the sequence
+        with ProcessPoolExecutor(max_workers=min(workers, len(sequence)), mp_context=context,
+                                 initializer=_init_rebuild_worker, initargs=(stop_at,)) as executor:
+            futures = [executor.submit(_rebuild_operations_group, self._db_path(), self.backend_name(), operations)
+                       for operations in sequence.values()]
+            for future in as_completed(futures):
+                processed, error = future.result()
+                results += processed
+                processed_count += len(processed)
+                if error is not None:
+                    errors.append(error)
+                if self.progress_bar is not None:
+                    self.progress_bar.setValue(processed_count)
+        logging.info(self.tr("Operations were processed by parallel workers: ") + f"{processed_count}, " +
+                     self.tr("workers: ") + f"{min(workers, len(sequence))}, " +
+                     self.tr("elapsed time: ") + f"{datetime.now() - start_time}")
+        results = sorted([x for x in results if x[0] < stop_at.value], key=lambda x: x[0])
+        for _n, ledger_rows, trades_opened_rows, trades_closed_rows in results:
+            for row in ledger_rows:
+                self._buffer_ledger_row(row)
+            self._trades_opened_rows += trades_opened_rows
+            self._trades_closed_rows += trades_closed_rows
+        if errors:
+            _n, ledger_error, message = min(errors)
+            raise LedgerError(message) if ledger_error else RuntimeError(message)
+        return last_timestamp
+
+    # Processes given list of operations (n, op_type, id, subtype) without writing anything into db.
+    # 'stop_at' is a shared value with number n of the first failed operation of all parallel workers: processing
+    # stops before operations that follow it. Number of failed operation is put into 'stop_at' in case of exception.
+    # Returns a list of (n, ledger_rows, trades_opened_rows, trades_closed_rows) for every processed operation and
+    # (n, is_ledger_error, message) tuple if processing was interrupted by an exception or None otherwise
+    def _process_detached(self, operations, stop_at=None) -> (list, tuple):
+        processed = []
+        error = None
+        self.BATCH_SIZE = sys.maxsize   # All rows are kept in memory and aren't flushed
+        self._batched = True
+        try:
+            preloaded = LedgerTransaction.preload(operations=[(op_type, oid) for _n, op_type, oid, _s in operations])
+            for n, op_type, oid, subtype in operations:
+                if stop_at is not None and n > stop_at.value:
+                    break
+                ledger_count = len(self._ledger_rows)
+                opened_count = len(self._trades_opened_rows)
+                closed_count = len(self._trades_closed_rows)
+                operation = LedgerTransaction().get_operation(op_type, oid, subtype,
+                                                              preloaded=preloaded.get((op_type, oid)))
+                operation.processLedger(self)
+                processed.append((n, self._ledger_rows[ledger_count:], self._trades_opened_rows[opened_count:],
+                                  self._trades_closed_rows[closed_count:]))
+        except LedgerError as e:
+            error = (True, str(e))
+        except Exception:
+            error = (False, traceback.format_exc())
+        finally:
+            self._batched = False
+        if error is None:
+            return processed, None
+        n = operations[len(processed)][0]   # Number of failed operation
+        self._stop_detached(n, stop_at)
+        return processed, (n, *error)
+
+    # Puts number n of failed operation into shared 'stop_at' value of parallel workers if it precedes current value
+    @staticmethod
+    def _stop_detached(n, stop_at) -> None:
+        if stop_at is not None:
+            with stop_at.get_lock():
+                stop_at.value = min(stop_at.value, n)
+
+    # Fills 'ledger_totals' table with last accumulated values of every operation that was processed by rebuild,
+    # i.e. has ledger records with id greater than 'last_id'
+    # Values are taken from in-memory totals collected by batched rebuild or directly from 'ledger' table otherwise
+    def _fill_totals(self, last_id, batched):
+        if batched:
+            _ = self._exec_many("INSERT INTO ledger_totals(op_type, operation_id, timestamp, book_account, asset_id, "
+                                "account_id, amount_acc, value_acc) VALUES(?, ?, ?, ?, ?, ?, ?, ?)",
+                                list(self._totals.values()))
+            self._totals = {}
+        else:
+            _ = self._exec(
+                "INSERT INTO ledger_totals"
+                "(op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc) "
+                "SELECT op_type, operation_id, timestamp, book_account, asset_id, account_id, amount_acc, value_acc "
+                "FROM ledger "
+                "WHERE id IN (SELECT MAX(id) FROM ledger WHERE id > :last_id "
+                "GROUP BY op_type, operation_id, book_account, account_id, asset_id)", [(":last_id", last_id)])
+
     def showRebuildDialog(self, parent):
         rebuild_dialog = RebuildDialog(parent, self.getCurrentFrontier())
         if rebuild_dialog.exec():
             self.rebuild(from_timestamp=rebuild_dialog.getTimestamp(),
                          fast_and_dirty=rebuild_dialog.isFastAndDirty())
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Shared number of the first failed operation of parallel ledger rebuild (it is assigned by _init_rebuild_worker())
+_stop_rebuild = None
+
+
+# Initializer of worker processes for parallel ledger rebuild
+def _init_rebuild_worker(stop) -> None:
+    global _stop_rebuild
+    _stop_rebuild = stop
+
+
+# Entry point of a worker process for parallel ledger rebuild (see Ledger._rebuild_in_parallel())
+# It opens its own connection to database file 'db_file' and processes given operations with Ledger._process_detached()
+def _rebuild_operations_group(db_file, backend, operations) -> (list, tuple):
+    if backend == DbBackend.QTSQL:
+        _app = QCoreApplication.instance() or QCoreApplication([])
+    error = JalDB._open_db(backend, db_file)
+    if error:
+        Ledger._stop_detached(operations[0][0], _stop_rebuild)
+        return [], (operations[0][0], False, f"Failed to open database '{db_file}': {error}")
+    return Ledger()._process_detached(operations, _stop_rebuild)
@@ -1,3 +1,4 @@
+import json
 import logging
 from decimal import Decimal
 from PySide6.QtWidgets import QApplication
@@ -7,7 +8,6 @@ from jal.db.helpers import format_decimal
 from jal.db.db import JalDB
 import jal.db.account
 from jal.db.asset import JalAsset
-from jal.db.closed_trade import JalClosedTrade
 from jal.widgets.helpers import ts2dt
 from jal.widgets.icons import JalIcon
 
@@ -18,6 +18,22 @@ class LedgerError(Exception):
     pass
 
 
+# ----------------------------------------------------------------------------------------------------------------------
+# Lightweight record that keeps operation data loaded from database in bulk by LedgerTransaction.preload()
+# 'data' is a dict with the same fields as operation class selects for itself (operations take a copy of it as
+# they may modify own data - for example with dump() method)
+# 'details' keeps child records of operation (action_details, action_results or deposit_actions) if any
+# 'totals' keeps 'ledger_totals' records of operation as {(account_id, book_account, asset_id): amount_acc} if they
+# were loaded (it is None otherwise)
+class PreloadedOperation:
+    __slots__ = ('data', 'details', 'totals')
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.details = []
+        self.totals = None
+
+
 # ----------------------------------------------------------------------------------------------------------------------
 class LedgerTransaction(JalDB):
     NoOpException = 'NoLedgerOperation'
@@ -28,6 +44,7 @@ class LedgerTransaction(JalDB):
     Transfer = 4
     CorporateAction = 5
     TermDeposit = 6
+    _op_type = NA    # Transaction type of the class
     _db_table = ''   # Table where operation is stored in DB
     _db_fields = {}
 
@@ -51,6 +68,7 @@ class LedgerTransaction(JalDB):
         self._asset = None
         self._number = ''
         self._reconciled = False
+        self._totals = None    # Preloaded 'ledger_totals' records (see PreloadedOperation)
 
     def tr(self, text):
         return QApplication.translate("LedgerTransaction", text)
@@ -63,22 +81,92 @@ class LedgerTransaction(JalDB):
                 self._data[key] = jal.db.account.JalAccount(self._data[key]).name()
         return str(self._data)
 
+    # Returns operation object of given type and id. Operation data are taken from 'preloaded' record if it is given
+    # (see LedgerTransaction.preload()) or selected from database otherwise.
     @staticmethod
-    def get_operation(operation_type, operation_id, display_type=None):
+    def get_operation(operation_type, operation_id, display_type=None, preloaded=None):
         if operation_type == LedgerTransaction.IncomeSpending:
-            return IncomeSpending(operation_id)
+            operation = IncomeSpending(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.Dividend:
-            return Dividend(operation_id)
+            operation = Dividend(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.Trade:
-            return Trade(operation_id)
+            operation = Trade(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.Transfer:
-            return Transfer(operation_id, display_type)
+            operation = Transfer(operation_id, display_type, preloaded=preloaded)
         elif operation_type == LedgerTransaction.CorporateAction:
-            return CorporateAction(operation_id)
+            operation = CorporateAction(operation_id, preloaded=preloaded)
         elif operation_type == LedgerTransaction.TermDeposit:
-            return TermDeposit(operation_id, display_type)
+            operation = TermDeposit(operation_id, display_type, preloaded=preloaded)
         else:
             raise ValueError(f"An attempt to select unknown operation type: {operation_type}")
+        if preloaded is not None:
+            operation._totals = preloaded.totals
+        return operation
+
+    # Loads data of all operations that happened since given timestamp (or only operations given by a list of
+    # (op_type, operation_id) tuples) with one query per database table. Records of 'ledger_totals' table are loaded
+    # for these operations also if 'totals' is True (this isn't possible during ledger re-build).
+    # Returns a dictionary of PreloadedOperation records with (op_type, operation_id) tuple as a key.
+    # These records may be used by get_operation() in order to avoid a separate select for every operation.
+    @staticmethod
+    def preload(timestamp: int = 0, operations: list = None, totals: bool = False) -> dict:
+        records = {}
+        for operation_class in [IncomeSpending, Dividend, Trade, Transfer, CorporateAction, TermDeposit]:
+            if operations is None:
+                operation_class._preload(timestamp, None, records)
+                continue
+            ids = sorted(set([x[1] for x in operations if x[0] == operation_class._op_type]))
+            if ids:
+                operation_class._preload(timestamp, ids, records)
+                if totals:
+                    operation_class._preload_totals(ids, records)
+        return records
+
+    # Puts PreloadedOperation records for all operations of the class since given timestamp (or for operations with
+    # given 'ids' if they aren't None) into 'records' dictionary
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        raise NotImplementedError(f"_preload() method is not defined in {cls.__name__} class")
+
+    # Returns SQL condition and its parameters that select operations for _preload(): 'id_field' should be one of
+    # given 'ids' or 'timestamp_condition' should be met for :timestamp parameter if ids are None
+    @staticmethod
+    def _preload_filter(timestamp: int, ids: list, id_field: str, timestamp_condition: str) -> tuple:
+        if ids is None:
+            return timestamp_condition, [(":timestamp", timestamp)]
+        return f"{id_field} IN (SELECT value FROM json_each(:ids))", [(":ids", json.dumps(ids))]
+
+    # Puts 'ledger_totals' records of operations with given ids into 'totals' of corresponding 'records'
+    @classmethod
+    def _preload_totals(cls, ids: list, records: dict) -> None:
+        for oid in ids:
+            if (cls._op_type, oid) in records:
+                records[(cls._op_type, oid)].totals = {}
+        query = cls._exec("SELECT operation_id, account_id, book_account, asset_id, amount_acc FROM ledger_totals "
+                          "WHERE op_type=:op_type AND operation_id IN (SELECT value FROM json_each(:ids))",
+                          [(":op_type", cls._op_type), (":ids", json.dumps(ids))])
+        while query.next():
+            oid, account_id, book, asset_id, amount = cls._read_record(query)
+            if (cls._op_type, oid) in records:
+                records[(cls._op_type, oid)].totals[(account_id, book, asset_id)] = amount
+
+    # Selects all records with help of 'sql_text' and 'params' and puts them into 'records' dictionary as
+    # PreloadedOperation with key (op_type, id). Field 'id' is removed from operation data.
+    @classmethod
+    def _preload_data(cls, op_type, records, sql_text, params):
+        query = cls._exec(sql_text, params)
+        while query.next():
+            data = cls._read_record(query, named=True)
+            records[(op_type, data.pop('id'))] = PreloadedOperation(data)
+
+    # Selects all child records with help of 'sql_text' and 'params' and appends them to details of PreloadedOperation
+    # records with key (op_type, pid). Field 'pid' is removed from child data.
+    @classmethod
+    def _preload_details(cls, op_type, records, sql_text, params):
+        query = cls._exec(sql_text, params)
+        while query.next():
+            data = cls._read_record(query, named=True)
+            records[(op_type, data.pop('pid'))].details.append(data)
 
     @staticmethod
     def create_new(operation_type, operation_data):
@@ -131,27 +219,36 @@ class LedgerTransaction(JalDB):
     def view_rows(self) -> int:
         return self._view_rows
 
+    # Returns 'amount_acc' value of 'ledger_totals' record of the operation for given account and book (and asset if it
+    # is given) or None if there is no such record. Preloaded records are used if they are available.
+    def _ledger_total(self, account_id, book, asset_id=None):
+        if self._totals is not None:
+            return next((amount for (account, book_account, asset), amount in self._totals.items()
+                         if account == account_id and book_account == book and asset_id in [None, asset]), None)
+        if asset_id is None:
+            return self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
+                              "account_id = :account_id AND book_account=:book",
+                              [(":op_type", self._otype), (":oid", self._oid),
+                               (":account_id", account_id), (":book", book)])
+        return self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
+                          "account_id=:account_id AND asset_id=:asset_id AND book_account=:book",
+                          [(":op_type", self._otype), (":oid", self._oid), (":account_id", account_id),
+                           (":asset_id", asset_id), (":book", book)])
+
     def _money_total(self, account_id) -> Decimal:
-        money = self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
-                           "account_id = :account_id AND book_account=:book",
-                           [(":op_type", self._otype), (":oid", self._oid),
-                            (":account_id", account_id), (":book", BookAccount.Money)])
-        debt = self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
-                          "account_id = :account_id AND book_account=:book",
-                          [(":op_type", self._otype), (":oid", self._oid),
-                           (":account_id", account_id), (":book", BookAccount.Liabilities)])
+        money = self._ledger_total(account_id, BookAccount.Money)
+        debt = self._ledger_total(account_id, BookAccount.Liabilities)
         if money is None and debt is None:
             return Decimal('NaN')
-        money = Decimal('0') if money is None else Decimal(money)
-        debt = Decimal('0') if debt is None else Decimal(debt)
+        precision = jal.db.account.JalAccount(account_id).precision()
+        money = Decimal('0') if money is None else self._ledger_decode(money, precision)
+        debt = Decimal('0') if debt is None else self._ledger_decode(debt, precision)
         return money + debt
 
     def _asset_total(self, account_id, asset_id) -> Decimal:
-        amount = self._read("SELECT amount_acc FROM ledger_totals WHERE op_type=:op_type AND operation_id=:oid AND "
-                            "account_id=:account_id AND asset_id=:asset_id AND book_account=:book",
-                            [(":op_type", self._otype), (":oid", self._oid), (":account_id", account_id),
-                             (":asset_id", asset_id), (":book", BookAccount.Assets)])
-        amount = Decimal('NaN') if amount is None else Decimal(amount)
+        amount = self._ledger_total(account_id, BookAccount.Assets, asset_id)
+        precision = jal.db.account.JalAccount(account_id).precision()
+        amount = Decimal('NaN') if amount is None else self._ledger_decode(amount, precision)
         return amount
 
     # Performs FIFO deals match in ledger: takes current open positions from 'trades_opened' table and converts
@@ -159,13 +256,14 @@ class LedgerTransaction(JalDB):
     # deal_sign = +1 if closing deal is Buy operation and -1 if it is Sell operation.
     # qty - quantity of asset that closes previous open positions
     # price is None if we process corporate action or transfer where we keep initial value and don't have profit or loss
+    # Open positions are taken and new trades are stored via 'ledger' as it may keep them buffered during rebuild.
     # Returns total qty, value of deals created.
-    def _close_deals_fifo(self, deal_sign, qty, price):
+    def _close_deals_fifo(self, ledger, deal_sign, qty, price):
         assert self._asset.id() == self.asset().id()   # The function works with these assumptions as any operation may take only one incoming asset
         assert self._account.id() == self.account().id()
         processed_qty = Decimal('0')
         processed_value = Decimal('0')
-        open_trades = self._account.open_trades_list(self._asset)
+        open_trades = ledger.open_trades_list(self._account, self._asset)
         for operation in open_trades:
             remaining_qty = operation['remaining_qty']
             next_deal_qty = remaining_qty
@@ -173,8 +271,8 @@ class LedgerTransaction(JalDB):
                 next_deal_qty = qty - processed_qty    # If it happens - just process the remainder of the trade
             open_price = operation['price']
             close_price = operation['price'] if price is None else price
-            self._account.open_trade(self.timestamp(), operation['operation'].type(), operation['operation'].id(), self._asset, open_price, remaining_qty - next_deal_qty)
-            JalClosedTrade.create_from_trades(operation['operation'], self, (-deal_sign) * next_deal_qty, open_price, close_price)
+            ledger.open_trade(self._account, self.timestamp(), operation['operation'], self._asset, open_price, remaining_qty - next_deal_qty)
+            ledger.close_trade(operation['operation'], self, (-deal_sign) * next_deal_qty, open_price, close_price)
             processed_qty += next_deal_qty
             processed_value += (next_deal_qty * open_price)
             if processed_qty == qty:
@@ -255,6 +353,7 @@ class LedgerTransaction(JalDB):
 
 # ----------------------------------------------------------------------------------------------------------------------
 class IncomeSpending(LedgerTransaction):
+    _op_type = LedgerTransaction.IncomeSpending
     _db_table = "actions"
     _db_fields = {
         "timestamp": {"mandatory": True, "validation": False},
@@ -275,13 +374,16 @@ class IncomeSpending(LedgerTransaction):
         }
     }
 
-    def __init__(self, operation_id=None):
+    def __init__(self, operation_id=None, preloaded=None):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.IncomeSpending
-        self._data = self._read("SELECT a.timestamp, a.account_id, a.peer_id, p.name AS peer, "
-                                "a.alt_currency_id AS currency FROM actions AS a "
-                                "LEFT JOIN agents AS p ON a.peer_id = p.id WHERE a.id=:oid",
-                                [(":oid", self._oid)], named=True)
+        if preloaded is not None:
+            self._data = preloaded.data.copy()
+        else:
+            self._data = self._read("SELECT a.timestamp, a.account_id, a.peer_id, p.name AS peer, "
+                                    "a.alt_currency_id AS currency FROM actions AS a "
+                                    "LEFT JOIN agents AS p ON a.peer_id = p.id WHERE a.id=:oid",
+                                    [(":oid", self._oid)], named=True)
         self._timestamp = self._data['timestamp']
         self._account = jal.db.account.JalAccount(self._data['account_id'])
         self._account_name = self._account.name()
@@ -290,14 +392,17 @@ class IncomeSpending(LedgerTransaction):
         self._peer_id = self._data['peer_id']
         self._peer = self._data['peer']
         self._currency = self._data['currency']
-        details_query = self._exec("SELECT d.category_id, c.name AS category, d.tag_id, t.tag, "
-                                   "d.amount, d.amount_alt, d.note FROM action_details AS d "
-                                   "LEFT JOIN categories AS c ON c.id=d.category_id "
-                                   "LEFT JOIN tags AS t ON t.id=d.tag_id "
-                                   "WHERE d.pid= :pid", [(":pid", self._oid)])
-        self._details = []
-        while details_query.next():
-            self._details.append(self._read_record(details_query, named=True))
+        if preloaded is not None:
+            self._details = preloaded.details
+        else:
+            details_query = self._exec("SELECT d.category_id, c.name AS category, d.tag_id, t.tag, "
+                                       "d.amount, d.amount_alt, d.note FROM action_details AS d "
+                                       "LEFT JOIN categories AS c ON c.id=d.category_id "
+                                       "LEFT JOIN tags AS t ON t.id=d.tag_id "
+                                       "WHERE d.pid= :pid", [(":pid", self._oid)])
+            self._details = []
+            while details_query.next():
+                self._details.append(self._read_record(details_query, named=True))
         self._amount = sum(Decimal(line['amount']) for line in self._details)
         if self._amount < 0:
             self._icon = JalIcon[JalIcon.MINUS]
@@ -310,6 +415,23 @@ class IncomeSpending(LedgerTransaction):
             self._currency_name = JalAsset(self._currency).symbol()
         self._amount_alt = sum(Decimal(line['amount_alt']) for line in self._details)
 
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        condition, params = cls._preload_filter(timestamp, ids, "a.id", "a.timestamp>=:timestamp")
+        cls._preload_data(LedgerTransaction.IncomeSpending, records,
+                          "SELECT a.id, a.timestamp, a.account_id, a.peer_id, p.name AS peer, "
+                          "a.alt_currency_id AS currency FROM actions AS a "
+                          f"LEFT JOIN agents AS p ON a.peer_id = p.id WHERE {condition}", params)
+        # Details are filtered by their own field as SQLite re-evaluates id list for every row if joined field is used
+        condition, params = cls._preload_filter(timestamp, ids, "d.pid", "a.timestamp>=:timestamp")
+        cls._preload_details(LedgerTransaction.IncomeSpending, records,
+                             "SELECT d.pid, d.category_id, c.name AS category, d.tag_id, t.tag, "
+                             "d.amount, d.amount_alt, d.note FROM action_details AS d "
+                             "JOIN actions AS a ON a.id=d.pid "
+                             "LEFT JOIN categories AS c ON c.id=d.category_id "
+                             "LEFT JOIN tags AS t ON t.id=d.tag_id "
+                             f"WHERE {condition} ORDER BY d.id", params)
+
     def description(self) -> str:
         description = self._peer
         if self._currency:
@@ -385,6 +507,7 @@ class Dividend(LedgerTransaction):
     StockVesting = 4
     BondAmortization = 5
     Fee = 6
+    _op_type = LedgerTransaction.Dividend
     _db_table = "dividends"
     _db_fields = {
         "timestamp": {"mandatory": True, "validation": True},
@@ -398,7 +521,7 @@ class Dividend(LedgerTransaction):
         "note": {"mandatory": False, "validation": True}
     }
 
-    def __init__(self, operation_id=None):
+    def __init__(self, operation_id=None, preloaded=None):
         icons = {
             Dividend.Dividend: JalIcon.DIVIDEND,
             Dividend.BondInterest: JalIcon.BOND_INTEREST,
@@ -419,13 +542,16 @@ class Dividend(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.Dividend
         self._view_rows = 2
-        self._data = self._read("SELECT d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, "
-                                "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note "
-                                "FROM dividends AS d "
-                                "LEFT JOIN assets AS a ON d.asset_id = a.id "
-                                "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id "
-                                "AND l.book_account = :book_assets WHERE d.id=:oid",
-                                [(":book_assets", BookAccount.Assets), (":oid", self._oid)], named=True)
+        if preloaded is not None:
+            self._data = preloaded.data.copy()
+        else:
+            self._data = self._read("SELECT d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, "
+                                    "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note "
+                                    "FROM dividends AS d "
+                                    "LEFT JOIN assets AS a ON d.asset_id = a.id "
+                                    "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id "
+                                    "AND l.book_account = :book_assets WHERE d.id=:oid",
+                                    [(":book_assets", BookAccount.Assets), (":oid", self._oid)], named=True)
         self._subtype = self._data['type']
         self._oname = self.names[self._subtype]
         try:
@@ -445,6 +571,17 @@ class Dividend(LedgerTransaction):
         self._note = self._data['note']
         self._broker = self._account.organization()
 
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        condition, params = cls._preload_filter(timestamp, ids, "d.id", "d.timestamp>=:timestamp")
+        cls._preload_data(LedgerTransaction.Dividend, records,
+                          "SELECT d.id, d.type, d.timestamp, d.ex_date, d.number, d.account_id, d.asset_id, "
+                          "d.amount, d.tax, l.amount_acc AS t_qty, d.note AS note "
+                          "FROM dividends AS d "
+                          "LEFT JOIN ledger_totals AS l ON l.op_type=d.op_type AND l.operation_id=d.id "
+                          f"AND l.book_account = :book_assets WHERE {condition}",
+                          [(":book_assets", BookAccount.Assets)] + params)
+
     # Returns a list of Dividend objects for given asset, account and subtype
     # if asset_id is 0 - return for all assets, if subtype is 0 - return all types
     # skip_accrued=True - don't include accrued interest in resulting list
@@ -603,7 +740,7 @@ class Dividend(LedgerTransaction):
         if asset_amount < Decimal('0'):
             raise NotImplemented(self.tr("Not supported action: stock dividend or vesting closes short trade.") +
                                  f" Operation: {self.dump()}")
-        self._account.open_trade(self._timestamp, self._otype, self._oid, self._asset, self.price(), self._amount)
+        ledger.open_trade(self._account, self._timestamp, self, self._asset, self.price(), self._amount)
         ledger.appendTransaction(self, BookAccount.Assets, self._amount,
                                  asset_id=self._asset.id(), value=self._amount * self.price())
         if self._tax:
@@ -623,6 +760,7 @@ class Dividend(LedgerTransaction):
 
 # ----------------------------------------------------------------------------------------------------------------------
 class Trade(LedgerTransaction):
+    _op_type = LedgerTransaction.Trade
     _db_table = "trades"
     _db_fields = {
         "timestamp": {"mandatory": True, "validation": True},
@@ -638,13 +776,16 @@ class Trade(LedgerTransaction):
 
     # operation_data is either an integer to select operation from database or a dict with operation data that is used
     # to create a new operation in database and then select it
-    def __init__(self, operation_data=None):
+    def __init__(self, operation_data=None, preloaded=None):
         super().__init__(operation_data)
         self._otype = LedgerTransaction.Trade
         self._view_rows = 2
-        self._data = self._read("SELECT t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, "
-                                "t.price, t.fee, t.note FROM trades AS t WHERE t.id=:oid",
-                                [(":oid", self._oid)], named=True)
+        if preloaded is not None:
+            self._data = preloaded.data.copy()
+        else:
+            self._data = self._read("SELECT t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, "
+                                    "t.price, t.fee, t.note FROM trades AS t WHERE t.id=:oid",
+                                    [(":oid", self._oid)], named=True)
         self._timestamp = self._data['timestamp']
         self._settlement = self._data['settlement']
         self._account = jal.db.account.JalAccount(self._data['account_id'])
@@ -665,6 +806,13 @@ class Trade(LedgerTransaction):
             self._icon = JalIcon[JalIcon.BUY]
             self._oname = self.tr("Buy")
 
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        condition, params = cls._preload_filter(timestamp, ids, "t.id", "t.timestamp>=:timestamp")
+        cls._preload_data(LedgerTransaction.Trade, records,
+                          "SELECT t.id, t.timestamp, t.settlement, t.number, t.account_id, t.asset_id, t.qty, "
+                          f"t.price, t.fee, t.note FROM trades AS t WHERE {condition}", params)
+
     def settlement(self) -> int:
         return self._settlement
 
@@ -734,7 +882,7 @@ class Trade(LedgerTransaction):
         # Get asset amount accumulated before current operation
         asset_amount = ledger.getAmount(BookAccount.Assets, self._account.id(), self._asset.id())
         if ((-deal_sign) * asset_amount) > Decimal('0'):  # Match trade if we have asset that is opposite to operation
-            processed_qty, processed_value = self._close_deals_fifo(deal_sign, qty, self._price)
+            processed_qty, processed_value = self._close_deals_fifo(ledger, deal_sign, qty, self._price)
         if deal_sign > 0:
             credit_value = ledger.takeCredit(self, self._account.id(), trade_value)
         else:
@@ -749,7 +897,7 @@ class Trade(LedgerTransaction):
                                      deal_sign * ((self._price * processed_qty) - processed_value + rounding_error),
                                      category=PredefinedCategory.Profit, peer=self._broker)
         if processed_qty < qty:  # We have a reminder that opens a new position
-            self._account.open_trade(self._timestamp, self._otype, self._oid, self._asset, self._price, (qty - processed_qty))
+            ledger.open_trade(self._account, self._timestamp, self, self._asset, self._price, (qty - processed_qty))
             ledger.appendTransaction(self, BookAccount.Assets, deal_sign * (qty - processed_qty),
                                      asset_id=self._asset.id(), value=deal_sign * (qty - processed_qty) * self._price)
         if self._fee:
@@ -761,6 +909,7 @@ class Transfer(LedgerTransaction):
     Fee = 0
     Outgoing = -1
     Incoming = 1
+    _op_type = LedgerTransaction.Transfer
     _db_table = "transfers"
     _db_fields = {
         "withdrawal_timestamp": {"mandatory": True, "validation": True},
@@ -776,7 +925,7 @@ class Transfer(LedgerTransaction):
         "note": {"mandatory": False, "validation": False}
     }
 
-    def __init__(self, operation_id=None, display_type=None):
+    def __init__(self, operation_id=None, display_type=None, preloaded=None):
         assert display_type in [Transfer.Outgoing, Transfer.Incoming, Transfer.Fee], "Unknown transfer type"
         icons = {
             (Transfer.Outgoing, True): JalIcon.TRANSFER_OUT,
@@ -797,10 +946,13 @@ class Transfer(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.Transfer
         self._display_type = display_type
-        self._data = self._read("SELECT t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, "
-                                "t.deposit_timestamp, t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, "
-                                "t.number, t.note FROM transfers AS t WHERE t.id=:oid",
-                                [(":oid", self._oid)], named=True)
+        if preloaded is not None:
+            self._data = preloaded.data.copy()
+        else:
+            self._data = self._read("SELECT t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, "
+                                    "t.deposit_timestamp, t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, "
+                                    "t.number, t.note FROM transfers AS t WHERE t.id=:oid",
+                                    [(":oid", self._oid)], named=True)
         self._withdrawal_account = jal.db.account.JalAccount(self._data['withdrawal_account'])
         self._withdrawal_account_name = self._withdrawal_account.name()
         self._withdrawal_timestamp = int(self._data['withdrawal_timestamp'])
@@ -828,6 +980,15 @@ class Transfer(LedgerTransaction):
         if self._display_type == Transfer.Fee:
             self._reconciled = self._fee_account.reconciled_at() >= self._withdrawal_timestamp
 
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        condition, params = cls._preload_filter(timestamp, ids, "t.id", "t.withdrawal_timestamp>=:timestamp "
+                                                                        "OR t.deposit_timestamp>=:timestamp")
+        cls._preload_data(LedgerTransaction.Transfer, records,
+                          "SELECT t.id, t.withdrawal_timestamp, t.withdrawal_account, t.withdrawal, "
+                          "t.deposit_timestamp, t.deposit_account, t.deposit, t.fee_account, t.fee, t.asset, "
+                          f"t.number, t.note FROM transfers AS t WHERE {condition}", params)
+
     def timestamp(self):
         if self._display_type == Transfer.Incoming:
             return self._deposit_timestamp
@@ -959,7 +1120,7 @@ class Transfer(LedgerTransaction):
                 raise LedgerError(self.tr("Asset amount is not enough for asset transfer processing. Date: ")
                                   + f"{ts2dt(self._withdrawal_timestamp)}, Asset amount: {asset_amount}, "
                                   + f"Required: {transfer_amount}, Operation: {self.dump()}")
-            processed_qty, processed_value = self._close_deals_fifo(Decimal('-1.0'), transfer_amount, None)
+            processed_qty, processed_value = self._close_deals_fifo(ledger, Decimal('-1.0'), transfer_amount, None)
             if processed_qty < transfer_amount:
                 raise LedgerError(self.tr("Processed asset amount is less than transfer amount. Date: ")
                                   + f"{ts2dt(self._withdrawal_timestamp)}, Processed amount: {processed_qty}, "
@@ -970,18 +1131,16 @@ class Transfer(LedgerTransaction):
                                      asset_id=self._asset.id(), value=processed_value)
         elif self._display_type == Transfer.Incoming:
             # get initial value of withdrawn asset
-            value = self._read("SELECT value FROM ledger "
-                               "WHERE book_account=:book_transfers AND op_type=:op_type AND operation_id=:id",
-                               [(":book_transfers", BookAccount.Transfers), (":op_type", self._otype),
-                                (":id", self._oid)], check_unique=True)
-            if not value:
+            records = ledger.get_operation_records(self._otype, self._oid, BookAccount.Transfers)
+            value = records[0]['value'] if len(records) == 1 else None
+            if value is None:
                 raise LedgerError(self.tr("Asset withdrawal not found for transfer.") + f" Operation:  {self.dump()}")
             if self._withdrawal_account.currency() == self._deposit_account.currency():
-                transferred_value = Decimal(value)
+                transferred_value = value
             else:
                 transferred_value = self._deposit
             price = transferred_value / transfer_amount
-            self._deposit_account.open_trade(self._deposit_timestamp, self._otype, self._oid, self._asset, price, transfer_amount)
+            ledger.open_trade(self._deposit_account, self._deposit_timestamp, self, self._asset, price, transfer_amount)
             ledger.appendTransaction(self, BookAccount.Transfers, -transfer_amount,
                                      asset_id=self._asset.id(), value=-transferred_value)
             ledger.appendTransaction(self, BookAccount.Assets, transfer_amount,
@@ -997,6 +1156,7 @@ class CorporateAction(LedgerTransaction):
     SymbolChange = 3
     Split = 4
     Delisting = 5
+    _op_type = LedgerTransaction.CorporateAction
     _db_table = "asset_actions"
     _db_fields = {
         "timestamp": {"mandatory": True, "validation": True},
@@ -1018,7 +1178,7 @@ class CorporateAction(LedgerTransaction):
         }
     }
 
-    def __init__(self, operation_id=None):
+    def __init__(self, operation_id=None, preloaded=None):
         icons = {
             CorporateAction.NA: JalIcon.NONE,
             CorporateAction.Merger: JalIcon.MERGER,
@@ -1037,13 +1197,17 @@ class CorporateAction(LedgerTransaction):
         }
         super().__init__(operation_id)
         self._otype = LedgerTransaction.CorporateAction
-        self._data = self._read("SELECT a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note "
-                                "FROM asset_actions AS a WHERE a.id=:oid", [(":oid", self._oid)], named=True)
-        results_query = self._exec("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
-                                   [(":oid", self._oid)])
-        self._results = []
-        while results_query.next():
-            self._results.append(self._read_record(results_query, named=True))
+        if preloaded is not None:
+            self._data = preloaded.data.copy()
+            self._results = preloaded.details
+        else:
+            self._data = self._read("SELECT a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note "
+                                    "FROM asset_actions AS a WHERE a.id=:oid", [(":oid", self._oid)], named=True)
+            results_query = self._exec("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
+                                       [(":oid", self._oid)])
+            self._results = []
+            while results_query.next():
+                self._results.append(self._read_record(results_query, named=True))
         self._view_rows = len(self._results) + 1
         self._subtype = self._data['type']
         self._oname = self.names[self._subtype]
@@ -1061,6 +1225,17 @@ class CorporateAction(LedgerTransaction):
         self._note = self._data['note']
         self._broker = self._account.organization()
 
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        condition, params = cls._preload_filter(timestamp, ids, "a.id", "a.timestamp>=:timestamp")
+        cls._preload_data(LedgerTransaction.CorporateAction, records,
+                          "SELECT a.id, a.type, a.timestamp, a.number, a.account_id, a.qty, a.asset_id, a.note "
+                          f"FROM asset_actions AS a WHERE {condition}", params)
+        condition, params = cls._preload_filter(timestamp, ids, "r.action_id", "a.timestamp>=:timestamp")
+        cls._preload_details(LedgerTransaction.CorporateAction, records,
+                             "SELECT r.action_id AS pid, r.asset_id, r.qty, r.value_share FROM action_results AS r "
+                             f"JOIN asset_actions AS a ON a.id=r.action_id WHERE {condition} ORDER BY r.id", params)
+
     # Settlement returns timestamp as corporate action happens immediately in Jal
     def settlement(self) -> int:
         return self._timestamp
@@ -1168,14 +1343,13 @@ class CorporateAction(LedgerTransaction):
                               + f"Asset amount: {asset_amount}, Operation: {self.dump()}")
         # Calculate total asset allocation after corporate action and verify it equals 100%
         allocation = Decimal('0')
-        query = self._exec("SELECT value_share FROM action_results WHERE action_id=:oid", [(":oid", self._oid)])
-        while query.next():
-            allocation += self._read_record(query, cast=[Decimal])
+        for result in self._results:
+            allocation += Decimal(result['value_share'])
         if self._subtype != CorporateAction.Delisting and allocation != Decimal('1.0'):
             raise LedgerError(self.tr("Results value of corporate action doesn't match 100% of initial asset value. ")
                                       + f"Date: {ts2dt(self._timestamp)}, Asset amount: {asset_amount}, " 
                                         f"Distributed: {100.0 * float(allocation)}%, Operation: {self.dump()}")
-        processed_qty, processed_value = self._close_deals_fifo(Decimal('-1.0'), self._qty, None)
+        processed_qty, processed_value = self._close_deals_fifo(ledger, Decimal('-1.0'), self._qty, None)
         # Withdraw value with old quantity of old asset
         ledger.appendTransaction(self, BookAccount.Assets, -processed_qty,
                                  asset_id=self._asset.id(), value=-processed_value)
@@ -1183,21 +1357,20 @@ class CorporateAction(LedgerTransaction):
             ledger.appendTransaction(self, BookAccount.Costs, processed_value, category=PredefinedCategory.Profit, peer=self._broker)
             return
         # Process assets after corporate action
-        query = self._exec("SELECT asset_id, qty, value_share FROM action_results WHERE action_id=:oid",
-                           [(":oid", self._oid)])
-        while query.next():
-            asset, qty, share = self._read_record(query, cast=[JalAsset, Decimal, Decimal])
+        for result in self._results:
+            asset, qty, share = JalAsset(result['asset_id']), Decimal(result['qty']), Decimal(result['value_share'])
             if asset.type() == PredefinedAsset.Money:
                 ledger.appendTransaction(self, BookAccount.Money, qty)
                 ledger.appendTransaction(self, BookAccount.Incomes, -qty, category=PredefinedCategory.Interest, peer=self._broker)
             else:
                 value = share * processed_value
                 price = value / qty
-                self._account.open_trade(self._timestamp, self._otype, self._oid, asset, price, qty)
+                ledger.open_trade(self._account, self._timestamp, self, asset, price, qty)
                 ledger.appendTransaction(self, BookAccount.Assets, qty, asset_id=asset.id(), value=value)
 
 # ----------------------------------------------------------------------------------------------------------------------
 class TermDeposit(LedgerTransaction):
+    _op_type = LedgerTransaction.TermDeposit
     _db_table = "term_deposits"
     _db_fields = {
         "account_id": {"mandatory": True, "validation": False},
@@ -1214,7 +1387,7 @@ class TermDeposit(LedgerTransaction):
         }
     }
 
-    def __init__(self, operation_id=None, display_type=None):
+    def __init__(self, operation_id=None, display_type=None, preloaded=None):
         icons = {
             DepositActions.Opening: JalIcon.DEPOSIT_OPEN,
             DepositActions.TopUp: JalIcon.DEPOSIT_OPEN,
@@ -1227,10 +1400,16 @@ class TermDeposit(LedgerTransaction):
         super().__init__(operation_id)
         self._otype = LedgerTransaction.TermDeposit
         self._aid = display_type   # action id
-        self._data = self._read("SELECT da.timestamp, td.account_id, da.action_type, da.amount, td.note "
-                                "FROM term_deposits td LEFT JOIN deposit_actions da ON td.id=da.deposit_id "
-                                "WHERE td.id=:oid AND da.id=:aid",
-                                [(":oid", self._oid), (":aid", self._aid)], named=True)
+        if preloaded is not None:
+            actions = [x for x in preloaded.details if x['id'] == self._aid]
+            self._data = None if len(actions) != 1 else {
+                'timestamp': actions[0]['timestamp'], 'account_id': preloaded.data['account_id'],
+                'action_type': actions[0]['action_type'], 'amount': actions[0]['amount'], 'note': preloaded.data['note']}
+        else:
+            self._data = self._read("SELECT da.timestamp, td.account_id, da.action_type, da.amount, td.note "
+                                    "FROM term_deposits td LEFT JOIN deposit_actions da ON td.id=da.deposit_id "
+                                    "WHERE td.id=:oid AND da.id=:aid",
+                                    [(":oid", self._oid), (":aid", self._aid)], named=True)
         if self._data is None:
             raise IndexError(LedgerTransaction.NoOpException)
         self._timestamp = self._data['timestamp']
@@ -1244,14 +1423,23 @@ class TermDeposit(LedgerTransaction):
         self._oname = f'{DepositActions().get_name(self._action)}'
         self._bank = self._account.organization()
 
-    def _get_deposit_amount(self) -> Decimal:
+    @classmethod
+    def _preload(cls, timestamp: int, ids: list, records: dict) -> None:
+        condition, params = cls._preload_filter(
+            timestamp, ids, "td.id", "td.id IN (SELECT deposit_id FROM deposit_actions WHERE timestamp>=:timestamp)")
+        cls._preload_data(LedgerTransaction.TermDeposit, records,
+                          f"SELECT td.id, td.account_id, td.note FROM term_deposits AS td WHERE {condition}", params)
+        condition, params = cls._preload_filter(timestamp, ids, "deposit_id", "timestamp>=:timestamp")
+        cls._preload_details(LedgerTransaction.TermDeposit, records,
+                             "SELECT deposit_id AS pid, id, timestamp, action_type, amount FROM deposit_actions "
+                             f"WHERE {condition} ORDER BY id", params)
+
+    def _get_deposit_amount(self, ledger) -> Decimal:
         amount = Decimal('0')
-        query = self._exec("SELECT amount FROM ledger WHERE op_type=:op_type AND operation_id=:oid AND "
-                           "book_account=:book AND account_id=:account_id AND timestamp<=:timestamp",
-                           [(":op_type", self._otype), (":oid", self._oid), (":timestamp", self._timestamp),
-                            (":account_id", self._account.id()), (":book", BookAccount.Savings)])
-        while query.next():
-            amount += self._read_record(query, cast=[Decimal])
+        records = ledger.get_operation_records(self._otype, self._oid, BookAccount.Savings)
+        for record in records:
+            if record['account_id'] == self._account.id() and record['timestamp'] <= self._timestamp:
+                amount += record['amount']
         return amount
 
     def description(self) -> str:
@@ -1279,8 +1467,9 @@ class TermDeposit(LedgerTransaction):
                            (":account_id", self._account.id()), (":book", BookAccount.Liabilities), (":timestamp", self._timestamp)])
         if money is None and debt is None:
             return []
-        money = Decimal('0') if money is None else Decimal(money)
-        debt = Decimal('0') if debt is None else Decimal(debt)
+        precision = self._account.precision()
+        money = Decimal('0') if money is None else self._ledger_decode(money, precision)
+        debt = Decimal('0') if debt is None else self._ledger_decode(debt, precision)
         return [money + debt]
 
     def amount(self) -> Decimal:
@@ -1290,7 +1479,7 @@ class TermDeposit(LedgerTransaction):
         if not self._bank:
             raise LedgerError(self.tr("Can't process deposit as bank isn't set for account: ") + self._account_name)
         if self._action in [DepositActions.Opening, DepositActions.TopUp, DepositActions.Closing, DepositActions.PartialWithdrawal]:
-            amount = self._get_deposit_amount() if self._action == DepositActions.Closing else self._amount
+            amount = self._get_deposit_amount(ledger) if self._action == DepositActions.Closing else self._amount
             if self._action in [DepositActions.Opening, DepositActions.TopUp]:
                 amount = -amount
             if amount < Decimal('0'):
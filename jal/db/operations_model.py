@@ -1,8 +1,10 @@
 from decimal import Decimal
+from collections import OrderedDict
 from PySide6.QtCore import Qt, Slot, QDate, QAbstractTableModel, QModelIndex
 from PySide6.QtGui import QFontDatabase
 from PySide6.QtWidgets import QStyledItemDelegate, QHeaderView
 from jal.constants import CustomColor, Setup
+from jal.db.db import JalDB
 from jal.db.ledger import Ledger
 from jal.db.helpers import localize_decimal
 from jal.db.operations import LedgerTransaction
@@ -18,8 +20,17 @@ def long_fraction(x: Decimal) -> bool:
         return False
     return abs(x - round(x, Setup.DEFAULT_ACCOUNT_PRECISION)) > Decimal('0')
 #-----------------------------------------------------------------------------------------------------------------------
-
+# Values that are displayed for operations are kept in a row cache and aren't re-calculated by every data() call.
+# Rows that aren't cached yet are loaded in batches of PREFETCH_ROWS around requested row with one query per operation
+# type (see LedgerTransaction.preload()). Cache is limited by ROW_CACHE_SIZE rows, least recently used rows are dropped.
+# Cache is cleared completely with model reset or change of cached reference data (see JalDB.cache_version()) and
+# partially - for rows after frontier of ledger re-build (see ledger_updated()).
+# Operations are loaded from 'operation_sequence' table by pages of PAGE_SIZE rows when view needs them (fetchMore()).
 class OperationsModel(QAbstractTableModel):
+    ROW_CACHE_SIZE = 5000
+    PREFETCH_ROWS = 64
+    PAGE_SIZE = 1000
+
     def __init__(self, parent_view):
         super().__init__(parent_view)
         self._columns = [self.tr("Timestamp"), self.tr("Account"), self.tr("Notes"),
@@ -28,17 +39,34 @@ class OperationsModel(QAbstractTableModel):
         self._amount_delegate = None
         self._total_delegate = None
         self._data = []
+        self._more = False       # True if there are more operations than were loaded into self._data
         self._begin = 0
         self._end = 0
         self._account = 0
         self._bold_font = QFontDatabase.systemFont(QFontDatabase.GeneralFont)
         self._bold_font.setBold(True)
+        self._rows = OrderedDict()     # {row: cached values of operation or None if operation doesn't exist}
+        self._cache_version = JalDB.cache_version()
+        self._rebuilds_seen = Ledger.rebuild_count
+        self.modelReset.connect(self._clear_cache)
 
         self.prepareData()
 
     def rowCount(self, parent=None):
         return len(self._data)
 
+    def canFetchMore(self, parent=QModelIndex()):
+        return self._more
+
+    def fetchMore(self, parent=QModelIndex()):
+        page = Ledger.get_operations_sequence(self._begin, self._end, self._account,
+                                              after=self._data[-1] if self._data else None, limit=self.PAGE_SIZE)
+        self._more = len(page) == self.PAGE_SIZE
+        if page:
+            self.beginInsertRows(QModelIndex(), len(self._data), len(self._data) + len(page) - 1)
+            self._data += page
+            self.endInsertRows()
+
     def columnCount(self, parent=None):
         return len(self._columns)
 
@@ -57,38 +85,82 @@ class OperationsModel(QAbstractTableModel):
         row = index.row()
         if not index.isValid():
             return None
-        try:
-            operation = LedgerTransaction().get_operation(self._data[row]['op_type'],
-                                                          self._data[row]['id'],
-                                                          self._data[row]['subtype'])
-        except IndexError as e:
-            if str(e) == LedgerTransaction.NoOpException:
-                return None
-            raise e
+        if role == Qt.UserRole:  # return underlying data for given field extra parameter
+            return self._data[index.row()][field]
+        values = self._row_values(row)
+        if values is None:
+            return None
         if role == Qt.DisplayRole:
-            return self.data_text(operation, index.column())
+            return values['text'][index.column()]
         if role == Qt.DecorationRole and index.column() == 0:
-            return operation.icon()
+            return values['icon']
         if role == Qt.FontRole and index.column() == 0:
             # below line isn't related with font, it is put here to be called for each row minimal times (ideally 1)
-            self._view.setRowHeight(row, self._view.verticalHeader().fontMetrics().height() * operation.view_rows())
+            self._view.setRowHeight(row, self._view.verticalHeader().fontMetrics().height() * values['view_rows'])
             return self._view.font()
         if role == Qt.ForegroundRole and self._view.isEnabled():
-            if index.column() == 4 and operation.reconciled():
+            if index.column() == 4 and values['reconciled']:
                 return CustomColor.Blue
         if role == Qt.ToolTipRole:
             if index.column() == 0:
-                return operation.name()
+                return values['name']
             elif index.column() == 3 or index.column() == 4:
-                data = self.data_text(operation, index.column())
+                data = values['text'][index.column()]
                 if any([long_fraction(x) for x in data]):
                     return '\n'.join([localize_decimal(x) for x in data])
         if role == Qt.TextAlignmentRole:
             if index.column() == 3 or index.column() == 4:
                 return int(Qt.AlignRight)
             return int(Qt.AlignLeft)
-        if role == Qt.UserRole:  # return underlying data for given field extra parameter
-            return self._data[index.row()][field]
+
+    # Returns cached values of operation in given row (None if operation doesn't exist). Loads rows around if the row
+    # isn't cached yet.
+    def _row_values(self, row):
+        if self._cache_version != JalDB.cache_version():
+            self._clear_cache()
+        if row not in self._rows:
+            first = max(0, row - self.PREFETCH_ROWS // 2)
+            self._load_rows([x for x in range(first, min(first + self.PREFETCH_ROWS, len(self._data)))
+                             if x not in self._rows])
+        self._rows.move_to_end(row)
+        return self._rows[row]
+
+    def _load_rows(self, rows):
+        preloaded = LedgerTransaction.preload(operations=[(self._data[x]['op_type'], self._data[x]['id']) for x in rows],
+                                              totals=True)
+        for row in rows:
+            key = (self._data[row]['op_type'], self._data[row]['id'])
+            try:
+                operation = LedgerTransaction.get_operation(key[0], key[1], self._data[row]['subtype'],
+                                                            preloaded=preloaded.get(key))
+            except IndexError as e:
+                if str(e) == LedgerTransaction.NoOpException:
+                    self._rows[row] = None
+                    continue
+                raise e
+            self._rows[row] = {
+                'text': [self.data_text(operation, column) for column in range(len(self._columns))],
+                'icon': operation.icon(),
+                'name': operation.name(),
+                'view_rows': operation.view_rows(),
+                'reconciled': operation.reconciled()
+            }
+        while len(self._rows) > self.ROW_CACHE_SIZE:
+            self._rows.popitem(last=False)
+
+    @Slot()
+    def _clear_cache(self):
+        self._rows.clear()
+        self._cache_version = JalDB.cache_version()
+
+    # Drops cached rows that might be changed by ledger re-builds happened since previous call (or all rows if ledger
+    # wasn't re-built as it is called after other changes like reconciliation also) and updates the view
+    def ledger_updated(self):
+        frontier, self._rebuilds_seen = Ledger.frontier_since(self._rebuilds_seen)
+        for row in [x for x in self._rows if self._data[x]['timestamp'] >= frontier]:
+            del self._rows[row]
+        if self._data:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self._data) - 1, len(self._columns) - 1))
 
     def data_text(self, operation, column):
         if column == 0:
@@ -151,14 +223,17 @@ class OperationsModel(QAbstractTableModel):
         idx = idx[0] if idx else QModelIndex()  # Take first selected or empty index
         if self._view.model() != self:          # View uses some proxy model
             idx = self._view.model().mapToSource(idx)
+        loaded = len(self._data)
         self.prepareData()
+        while len(self._data) < loaded and self.canFetchMore():   # Keep previously loaded rows available
+            self.fetchMore()
         if self._view.model() != self:
             idx = self._view.model().mapFromSource(idx)
         self._view.setCurrentIndex(idx)
 
     def prepareData(self):
-        self._data = []
-        self._data = Ledger.get_operations_sequence(self._begin, self._end, self._account)
+        self._data = Ledger.get_operations_sequence(self._begin, self._end, self._account, limit=self.PAGE_SIZE)
+        self._more = len(self._data) == self.PAGE_SIZE
         self.modelReset.emit()
 
     def delete_rows(self, rows):
@@ -0,0 +1,124 @@
+import time
+from bisect import bisect_right
+from jal.constants import QuoteCoverage
+from jal.db.db import JalDB
+from jal.widgets.helpers import timestamp_range
+
+DAY = 86400
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Index of days for which quotes of an asset in given currency were checked with given quote source.
+# It is stored in 'quotes_coverage' table as intervals of days with the same status (see QuoteCoverage constants) and
+# is used to plan downloads (only days that have no quotes and aren't known to be holidays are requested) and to tell
+# whether a quote is actual or stale (see JalAsset.quote_state()). Intervals are cached on a class level.
+class JalQuoteCoverage(JalDB):
+    MERGE_GAP = 14          # Download intervals separated by less days are merged together to save requests
+    _intervals = {}         # {(asset_id, currency_id, source): ([begin timestamps], [(begin, end, status)])}
+    _cache_backend = None   # Database connection that intervals were loaded from
+
+    def __init__(self, asset_id: int, currency_id: int, source: int) -> None:
+        super().__init__()
+        self._key = (asset_id, currency_id, source)
+        if JalQuoteCoverage._cache_backend is not JalDB._backend:
+            JalQuoteCoverage._intervals = {}
+            JalQuoteCoverage._cache_backend = JalDB._backend
+        if self._key not in JalQuoteCoverage._intervals:
+            self._load()
+
+    # Returns a list of (begin, end, status) tuples sorted by time
+    def intervals(self) -> list:
+        return JalQuoteCoverage._intervals[self._key][1]
+
+    # Returns status of the day that contains given timestamp
+    def status(self, timestamp: int) -> int:
+        begins, intervals = JalQuoteCoverage._intervals[self._key]
+        i = bisect_right(begins, timestamp) - 1
+        if i >= 0 and timestamp < intervals[i][1] + DAY:
+            return intervals[i][2]
+        return QuoteCoverage.Unknown
+
+    # Returns a list of days between 'start' and 'end' timestamps that should be downloaded: days that have no quotes
+    # (day timestamps with quotes are given by 'quoted_days' set) and that aren't known to be without quotes
+    def missing_days(self, start: int, end: int, quoted_days: set) -> list:
+        return [day for day in timestamp_range(start, end)
+                if day not in quoted_days and self.status(day) != QuoteCoverage.Missing]
+
+    # Returns a list of (begin, end) intervals between 'start' and 'end' that cover all missing_days() with
+    # minimal number of requests
+    def plan(self, start: int, end: int, quoted_days: set) -> list:
+        intervals = []
+        for day in self.missing_days(start, end, quoted_days):
+            if intervals and day - intervals[-1][1] <= self.MERGE_GAP * DAY:
+                intervals[-1][1] = day
+            else:
+                intervals.append([day, day])
+        return [(max(begin, start), min(last_day + DAY - 1, end)) for begin, last_day in intervals]
+
+    # Records result of successful download of interval between 'begin' and 'end'. 'quoted_days' is a set of day
+    # timestamps that have quotes in this interval. Days before the last quote are marked as days without quotes if
+    # there is no quote for them, days after the last quote and current day are left intact as quotes may appear later.
+    # 'failed_days' is a list of days without reply from the source (if it is requested day by day), they are recorded
+    # the same way as record_failure() does.
+    def record(self, begin: int, end: int, quoted_days: set, failed_days: list = None) -> None:
+        days = {}
+        failed_days = set() if failed_days is None else set(failed_days)
+        last_quoted = max([x for x in quoted_days if begin - begin % DAY <= x <= end], default=0)
+        for day in timestamp_range(begin, min(end, self._last_completed_day())):
+            if day in quoted_days:
+                days[day] = QuoteCoverage.Complete
+            elif day in failed_days:
+                if self.status(day) == QuoteCoverage.Unknown:
+                    days[day] = QuoteCoverage.Failed
+            elif day < last_quoted:
+                days[day] = QuoteCoverage.Missing
+        self._update(days)
+
+    # Records failed download of interval between 'begin' and 'end' for days that weren't checked before
+    def record_failure(self, begin: int, end: int) -> None:
+        days = {}
+        for day in timestamp_range(begin, min(end, self._last_completed_day())):
+            if self.status(day) == QuoteCoverage.Unknown:
+                days[day] = QuoteCoverage.Failed
+        self._update(days)
+
+    @staticmethod
+    def _last_completed_day() -> int:
+        now = int(time.time())
+        return now - now % DAY - DAY
+
+    def _load(self) -> None:
+        begins = []
+        intervals = []
+        query = self._exec("SELECT begin_ts, end_ts, status FROM quotes_coverage "
+                           "WHERE asset_id=:asset_id AND currency_id=:currency_id AND source=:source ORDER BY begin_ts",
+                           [(":asset_id", self._key[0]), (":currency_id", self._key[1]), (":source", self._key[2])])
+        while query.next():
+            interval = self._read_record(query, cast=[int, int, int])
+            begins.append(interval[0])
+            intervals.append(tuple(interval))
+        JalQuoteCoverage._intervals[self._key] = (begins, intervals)
+
+    # Sets given statuses {day: status} and stores coverage as a list of intervals of adjacent days with the same status
+    def _update(self, days: dict) -> None:
+        if not days:
+            return
+        statuses = {}
+        for begin, end, status in self.intervals():
+            for day in range(begin, end + 1, DAY):
+                statuses[day] = status
+        statuses.update(days)
+        intervals = []
+        for day in sorted(statuses):
+            if intervals and intervals[-1][1] == day - DAY and intervals[-1][2] == statuses[day]:
+                intervals[-1][1] = day
+            else:
+                intervals.append([day, day, statuses[day]])
+        self.begin_transaction()
+        _ = self._exec("DELETE FROM quotes_coverage WHERE asset_id=:asset_id AND currency_id=:currency_id "
+                       "AND source=:source",
+                       [(":asset_id", self._key[0]), (":currency_id", self._key[1]), (":source", self._key[2])])
+        _ = self._exec_many("INSERT INTO quotes_coverage (asset_id, currency_id, source, begin_ts, end_ts, status) "
+                            "VALUES (?, ?, ?, ?, ?, ?)", [list(self._key) + x for x in intervals])
+        self.commit()
+        JalQuoteCoverage._intervals[self._key] = ([x[0] for x in intervals], [tuple(x) for x in intervals])
@@ -261,7 +261,7 @@ class SqlTreeModel(QAbstractItemModel, JalDB):
             return False
         item_id = index.internalId()
         col = index.column()
-        self.connection().transaction()
+        self.begin_transaction()
         _ = self._exec(f"UPDATE {self._table} SET {self._columns[col][0]}=:value WHERE id=:id",
                        [(":id", item_id), (":value", value)])
         self.dataChanged.emit(index, index, Qt.DisplayRole | Qt.EditRole)
@@ -311,7 +311,7 @@ class SqlTreeModel(QAbstractItemModel, JalDB):
         encoded_data = data.data(self.DRAG_DROP_MIME_TYPE)
         stream = QDataStream(encoded_data, QIODevice.ReadOnly)
         item_id = stream.readUInt64()
-        self.connection().transaction()
+        self.begin_transaction()
         if parent.isValid():
             self._exec(f"UPDATE {self._table} SET pid=:pid WHERE id=:id",
                        [(":id", item_id), (":pid", parent.internalId())])
@@ -362,7 +362,7 @@ class SqlTreeModel(QAbstractItemModel, JalDB):
             parent_id = parent.internalId()
 
         self.beginInsertRows(parent, row, row + count - 1)
-        self.connection().transaction()
+        self.begin_transaction()
         _ = self._exec(f"INSERT INTO {self._table}(pid, {self._default_name}) VALUES (:pid, '')", [(":pid", parent_id)])
         self.endInsertRows()
         self.layoutChanged.emit()
@@ -382,7 +382,7 @@ class SqlTreeModel(QAbstractItemModel, JalDB):
             parent_id = parent.internalId()
 
         self.beginRemoveRows(parent, row, row + count - 1)
-        self.connection().transaction()
+        self.begin_transaction()
         order_by = f"ORDER BY {self._sort_by}" if self._sort_by is not None else ''  # FIXME - this line repeats several times over the class - refactor
         query = self._exec(f"SELECT id FROM {self._table} WHERE pid=:pid {order_by} LIMIT :row_c OFFSET :row_n",
                            [(":pid", parent_id), (":row_c", count), (":row_n", row)])
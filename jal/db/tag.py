@@ -2,17 +2,15 @@ from jal.db.db import JalDB
 from jal.constants import AssetData
 
 class JalTag(JalDB):
-    db_cache = []
+    db_cache = {}           # Tag data by tag id: {tag_id: {field: value}}
+    _cache_backend = None   # Database connection that db_cache was loaded from
 
     def __init__(self, tag_id: int = 0) -> None:
         super().__init__(cached=True)
-        if not JalTag.db_cache:
+        if not JalTag.db_cache or JalTag._cache_backend is not JalDB._backend:
             self._fetch_data()
         self._id = tag_id
-        try:
-            self._data = [x for x in self.db_cache if x['id'] == self._id][0]
-        except IndexError:
-            self._data = None
+        self._data = JalTag.db_cache.get(self._id, None)
         self._name = self._data['tag'] if self._data is not None else ''
 
     def invalidate_cache(self):
@@ -24,10 +22,12 @@ class JalTag(JalDB):
         return True
 
     def _fetch_data(self):
-        JalTag.db_cache = []
+        JalTag._cache_backend = JalDB._backend
+        JalTag.db_cache = {}
         query = self._exec("SELECT * FROM tags ORDER BY id")
         while query.next():
-            JalTag.db_cache.append(self._read_record(query, named=True))
+            tag = self._read_record(query, named=True)
+            JalTag.db_cache[tag['id']] = tag
 
     def id(self) -> int:
         return self._id
@@ -176,8 +176,7 @@ class ClosedTradesModel(ReportTreeModel):
             self.prepareData()
 
     def prepareData(self):
-        self._trades = JalAccount(self._account_id).closed_trades_list()
-        self._trades = [x for x in self._trades if self._begin <= x.close_operation().timestamp() <= self._end]
+        self._trades = JalAccount(self._account_id).closed_trades_list(begin=self._begin, end=self._end)
         self._root = TradeTreeItem()
         for trade in self._trades:
             new_item = TradeTreeItem(trade)
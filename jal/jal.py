@@ -9,6 +9,7 @@ from jal.widgets.main_window import MainWindow
 from jal.db.db import JalDB, JalDBError
 from jal.db.settings import JalSettings
 from jal.db.helpers import get_app_path
+from jal import cli
 
 
 #-----------------------------------------------------------------------------------------------------------------------
@@ -19,7 +20,10 @@ def exception_logger(exctype, value, tb):
 
 
 #-----------------------------------------------------------------------------------------------------------------------
+# Starts application window or executes a command without window if it is given in command line (see cli.py)
 def main():
+    if cli.has_command(sys.argv[1:]):
+        sys.exit(cli.main(sys.argv[1:]))
     sys.excepthook = exception_logger
     os.environ['QT_MAC_WANTS_LAYER'] = '1'    # Workaround for https://bugreports.qt.io/browse/QTBUG-87014
     app = QApplication([])
@@ -34,6 +38,8 @@ def main():
 
     if error.code == JalDBError.OutdatedDbSchema:
         error = JalDB().update_db_schema(get_app_path())
+        if error.code == JalDBError.NoError:
+            error = JalDB().init_db(get_app_path())
 
     if error.code != JalDBError.NoError:
         window = QMessageBox()
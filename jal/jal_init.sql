@@ -179,14 +179,32 @@ CREATE TABLE ledger (
     book_account INTEGER NOT NULL,
     asset_id     INTEGER REFERENCES assets (id) ON DELETE SET NULL ON UPDATE SET NULL,
     account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
-    amount       TEXT,
-    value        TEXT,
-    amount_acc   TEXT,
-    value_acc    TEXT,
+    amount,                 -- amount columns have no type affinity as they keep either decimal TEXT or
+    value,                  -- INTEGER scaled by account precision (if 'LedgerFixedPoint' setting is set)
+    amount_acc,
+    value_acc,
     peer_id      INTEGER REFERENCES agents (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
     category_id  INTEGER REFERENCES categories (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
     tag_id       INTEGER REFERENCES tags (id) ON DELETE NO ACTION ON UPDATE NO ACTION
 );
+DROP INDEX IF EXISTS ledger_by_account_timestamp;
+CREATE INDEX ledger_by_account_timestamp ON ledger (account_id, timestamp);
+-- Last accumulated values of (account, asset, book) chain: rowid order of index is used for ORDER BY id DESC
+DROP INDEX IF EXISTS ledger_by_chain;
+CREATE INDEX ledger_by_chain ON ledger (account_id, asset_id, book_account);
+-- Covering index for account turnovers and flows
+DROP INDEX IF EXISTS ledger_by_account_book;
+CREATE INDEX ledger_by_account_book ON ledger (account_id, book_account, timestamp, asset_id, amount, value);
+DROP INDEX IF EXISTS ledger_by_operation;
+CREATE INDEX ledger_by_operation ON ledger (op_type, operation_id, book_account);
+-- Partial covering indices for operations lookup by category, peer and tag
+DROP INDEX IF EXISTS ledger_by_category;
+CREATE INDEX ledger_by_category ON ledger (category_id, timestamp, account_id, book_account, amount, op_type, operation_id)
+    WHERE category_id IS NOT NULL;
+DROP INDEX IF EXISTS ledger_by_peer;
+CREATE INDEX ledger_by_peer ON ledger (peer_id, timestamp, op_type, operation_id, account_id) WHERE peer_id IS NOT NULL;
+DROP INDEX IF EXISTS ledger_by_tag;
+CREATE INDEX ledger_by_tag ON ledger (tag_id, timestamp, op_type, operation_id, account_id) WHERE tag_id IS NOT NULL;
 
 -- Table: ledger_totals to keep last accumulated amount value for each transaction
 DROP TABLE IF EXISTS ledger_totals;
@@ -198,14 +216,29 @@ CREATE TABLE ledger_totals (
     book_account INTEGER NOT NULL,
     asset_id     INTEGER NOT NULL,
     account_id   INTEGER NOT NULL,
-    amount_acc   TEXT    NOT NULL,
-    value_acc    TEXT    NOT NULL
+    amount_acc           NOT NULL,   -- decimal TEXT or scaled INTEGER, the same as in 'ledger' table
+    value_acc            NOT NULL
 );
 DROP INDEX IF EXISTS ledger_totals_by_timestamp;
 CREATE INDEX ledger_totals_by_timestamp ON ledger_totals (timestamp);
 DROP INDEX IF EXISTS ledger_totals_by_operation_book;
 CREATE INDEX ledger_totals_by_operation_book ON ledger_totals (op_type, operation_id, book_account);
 
+-- Table: holdings_snapshots to keep positions of accounts at checkpoints (see JalHoldings)
+DROP TABLE IF EXISTS holdings_snapshots;
+CREATE TABLE holdings_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    latest       INTEGER NOT NULL DEFAULT (0),   -- 1 for the last state of account ledger, 0 for periodic checkpoint
+    account_id   INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc           NOT NULL,   -- decimal TEXT or scaled INTEGER, the same as in 'ledger' table
+    value_acc            NOT NULL
+);
+DROP INDEX IF EXISTS holdings_snapshots_by_account;
+CREATE INDEX holdings_snapshots_by_account ON holdings_snapshots (account_id, timestamp);
+
 -- Table: map_category
 DROP TABLE IF EXISTS map_category;
 CREATE TABLE map_category (
@@ -239,6 +272,8 @@ CREATE TABLE trades_opened (
 
 DROP INDEX IF EXISTS open_trades_by_operation_idx;
 CREATE INDEX open_trades_by_operation_idx ON trades_opened (timestamp, op_type, operation_id);
+DROP INDEX IF EXISTS open_trades_by_account_asset_idx;
+CREATE INDEX open_trades_by_account_asset_idx ON trades_opened (account_id, asset_id, timestamp);
 
 -- Table: quotes
 DROP TABLE IF EXISTS quotes;
@@ -251,6 +286,22 @@ CREATE TABLE quotes (
 );
 CREATE UNIQUE INDEX unique_quotations ON quotes (asset_id, currency_id, timestamp);
 
+-- Table: quotes_coverage
+-- Intervals of days (begin_ts and end_ts are timestamps of the first and the last day) for which quotes of asset in
+-- given currency were checked with given quote source. Status: 1 - quotes were downloaded, 2 - source has no quotes
+-- (i.e. holidays), 3 - download failed
+DROP TABLE IF EXISTS quotes_coverage;
+CREATE TABLE quotes_coverage (
+    id          INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    asset_id    INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    currency_id INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    source      INTEGER NOT NULL,
+    begin_ts    INTEGER NOT NULL,
+    end_ts      INTEGER NOT NULL,
+    status      INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX quotes_coverage_idx ON quotes_coverage (asset_id, currency_id, source, begin_ts);
+
 -- Table: settings
 DROP TABLE IF EXISTS settings;
 CREATE TABLE settings (
@@ -323,6 +374,8 @@ CREATE TABLE trades_closed (
     close_price     TEXT    NOT NULL,
     qty             TEXT    NOT NULL
 );
+DROP INDEX IF EXISTS closed_trades_by_account_idx;
+CREATE INDEX closed_trades_by_account_idx ON trades_closed (account_id, close_timestamp);
 
 
 -- Table: transfers
@@ -365,29 +418,22 @@ DROP INDEX IF EXISTS deposit_actions_idx;
 CREATE UNIQUE INDEX deposit_actions_idx ON deposit_actions (deposit_id, timestamp, action_type);
 
 
--- View: operation_sequence
-DROP VIEW IF EXISTS operation_sequence;
-CREATE VIEW operation_sequence AS
-SELECT m.op_type, m.id, m.timestamp, m.account_id, subtype
-FROM
-(
-    SELECT op_type, 1 AS seq, id, timestamp, account_id, 0 AS subtype FROM actions
-    UNION ALL
-    SELECT op_type, 2 AS seq, id, timestamp, account_id, type AS subtype FROM dividends
-    UNION ALL
-    SELECT op_type, 3 AS seq, id, timestamp, account_id, type AS subtype FROM asset_actions
-    UNION ALL
-    SELECT op_type, 4 AS seq, id, timestamp, account_id, 0 AS subtype FROM trades
-    UNION ALL
-    SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, withdrawal_account AS account_id, -1 AS subtype FROM transfers
-    UNION ALL
-    SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, fee_account AS account_id, 0 AS subtype FROM transfers WHERE NOT fee IS NULL
-    UNION ALL
-    SELECT op_type, 5 AS seq, id, deposit_timestamp AS timestamp, deposit_account AS account_id, 1 AS subtype FROM transfers
-    UNION ALL
-    SELECT td.op_type, 6 AS seq, td.id, da.timestamp, td.account_id, da.id AS subtype FROM deposit_actions AS da LEFT JOIN term_deposits AS td ON da.deposit_id=td.id WHERE da.action_type<=100
-) AS m
-ORDER BY m.timestamp, m.seq, m.subtype, m.id;
+-- Table: operation_sequence - all operations in order of their processing, it is maintained by *_sequence_* triggers
+DROP TABLE IF EXISTS operation_sequence;
+CREATE TABLE operation_sequence (
+    op_type    INTEGER NOT NULL,
+    seq        INTEGER NOT NULL,
+    id         INTEGER NOT NULL,
+    timestamp  INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    subtype    INTEGER NOT NULL
+);
+DROP INDEX IF EXISTS operation_sequence_idx;
+CREATE INDEX operation_sequence_idx ON operation_sequence (timestamp, seq, subtype, id);
+DROP INDEX IF EXISTS operation_sequence_by_account;
+CREATE INDEX operation_sequence_by_account ON operation_sequence (account_id, timestamp, seq, subtype, id);
+DROP INDEX IF EXISTS operation_sequence_by_id;
+CREATE INDEX operation_sequence_by_id ON operation_sequence (id, op_type);
 
 
 -- View: currencies
@@ -399,9 +445,12 @@ LEFT JOIN asset_tickers AS s ON s.asset_id = a.id AND  s.active = 1
 WHERE a.type_id = 1;
 
 
--- View: frontier
+-- View: frontier - the earliest of last ledger records of accounts (or first operation of account without ledger)
 DROP VIEW IF EXISTS frontier;
-CREATE VIEW frontier AS SELECT MAX(ledger.timestamp) AS ledger_frontier FROM ledger;
+CREATE VIEW frontier AS
+SELECT MIN(COALESCE((SELECT MAX(l.timestamp) FROM ledger l WHERE l.account_id=s.account_id), s.first_timestamp))
+    AS ledger_frontier
+FROM (SELECT account_id, MIN(timestamp) AS first_timestamp FROM operation_sequence GROUP BY account_id) s;
 
 
 -- View: assets_ext
@@ -440,7 +489,8 @@ CREATE TRIGGER action_details_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM actions WHERE id = OLD.pid) AND
+                timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
 END;
 
 
@@ -451,7 +501,8 @@ CREATE TRIGGER action_details_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = NEW.pid);
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM actions WHERE id = NEW.pid) AND
+                timestamp >= (SELECT timestamp FROM actions WHERE id = NEW.pid);
 END;
 
 -- Trigger: action_details_after_update
@@ -461,7 +512,8 @@ CREATE TRIGGER action_details_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid );
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM actions WHERE id = OLD.pid) AND
+                timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
 END;
 
 -- Trigger: actions_after_delete
@@ -472,7 +524,7 @@ CREATE TRIGGER actions_after_delete
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
     DELETE FROM action_details WHERE pid = OLD.id;
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
 END;
 
 -- Trigger: actions_after_insert
@@ -482,7 +534,7 @@ CREATE TRIGGER actions_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
 END;
 
 -- Trigger: actions_after_update
@@ -492,7 +544,8 @@ CREATE TRIGGER actions_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
 END;
 
 -- Trigger: dividends_after_delete
@@ -502,8 +555,8 @@ CREATE TRIGGER dividends_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+    DELETE FROM trades_opened WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
 END;
 
 -- Trigger: dividends_after_insert
@@ -513,8 +566,8 @@ CREATE TRIGGER dividends_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
 END;
 
 -- Trigger: dividends_after_update
@@ -524,8 +577,10 @@ CREATE TRIGGER dividends_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS trades_after_delete;
@@ -534,8 +589,8 @@ CREATE TRIGGER trades_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+    DELETE FROM trades_opened WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
 END;
 
 DROP TRIGGER IF EXISTS trades_after_insert;
@@ -544,8 +599,8 @@ CREATE TRIGGER trades_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
 END;
 
 DROP TRIGGER IF EXISTS trades_after_update;
@@ -554,8 +609,10 @@ CREATE TRIGGER trades_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS asset_action_after_delete;
@@ -564,8 +621,8 @@ CREATE TRIGGER asset_action_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+    DELETE FROM trades_opened WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
 END;
 
 DROP TRIGGER IF EXISTS asset_action_after_insert;
@@ -574,8 +631,8 @@ CREATE TRIGGER asset_action_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
 END;
 
 DROP TRIGGER IF EXISTS asset_action_after_update;
@@ -584,8 +641,10 @@ CREATE TRIGGER asset_action_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
-    DELETE FROM trades_opened WHERE timestamp >= OLD.timestamp  OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_delete;
@@ -594,7 +653,8 @@ CREATE TRIGGER asset_result_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM asset_actions WHERE id = OLD.action_id) AND
+                timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_insert;
@@ -603,7 +663,8 @@ CREATE TRIGGER asset_result_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id);
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM asset_actions WHERE id = NEW.action_id) AND
+                timestamp >= (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id);
 END;
 
 DROP TRIGGER IF EXISTS asset_result_after_update;
@@ -612,7 +673,8 @@ CREATE TRIGGER asset_result_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM asset_actions WHERE id = OLD.action_id) AND
+                timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_delete;
@@ -621,7 +683,12 @@ CREATE TRIGGER transfers_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp;
+    DELETE FROM ledger WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_insert;
@@ -630,7 +697,12 @@ CREATE TRIGGER transfers_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    DELETE FROM ledger WHERE (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
+    DELETE FROM trades_opened WHERE (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
 END;
 
 DROP TRIGGER IF EXISTS transfers_after_update;
@@ -640,8 +712,18 @@ CREATE TRIGGER transfers_after_update
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.withdrawal_timestamp OR timestamp >= OLD.deposit_timestamp OR
-                timestamp >= NEW.withdrawal_timestamp OR timestamp >= NEW.deposit_timestamp;
+    DELETE FROM ledger WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp) OR
+                (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp) OR
+                (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
 END;
 
 DROP TRIGGER IF EXISTS deposit_action_after_delete;
@@ -650,7 +732,7 @@ CREATE TRIGGER deposit_action_after_delete
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp;
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM term_deposits WHERE id = OLD.deposit_id) AND timestamp >= OLD.timestamp;
 END;
 
 DROP TRIGGER IF EXISTS deposit_action_after_insert;
@@ -659,16 +741,165 @@ CREATE TRIGGER deposit_action_after_insert
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM term_deposits WHERE id = NEW.deposit_id) AND timestamp >= NEW.timestamp;
 END;
 
 DROP TRIGGER IF EXISTS deposit_action_after_update;
 CREATE TRIGGER deposit_action_after_update
-      AFTER UPDATE OF timestamp, account_id, type, asset_id, qty ON deposit_actions
+      AFTER UPDATE OF deposit_id, timestamp, action_type, amount ON deposit_actions
       FOR EACH ROW
       WHEN (SELECT value FROM settings WHERE id = 1)
 BEGIN
-    DELETE FROM ledger WHERE timestamp >= OLD.timestamp OR timestamp >= NEW.timestamp;
+    DELETE FROM ledger WHERE (account_id = (SELECT account_id FROM term_deposits WHERE id = OLD.deposit_id) AND timestamp >= OLD.timestamp) OR
+                (account_id = (SELECT account_id FROM term_deposits WHERE id = NEW.deposit_id) AND timestamp >= NEW.timestamp);
+END;
+
+-- Triggers that keep 'operation_sequence' table in sync with operations. They are always active (regardless of
+-- settings id = 1) as the table mirrors operations and doesn't depend on ledger state.
+DROP TRIGGER IF EXISTS actions_sequence_insert;
+CREATE TRIGGER actions_sequence_insert AFTER INSERT ON actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 1, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+
+DROP TRIGGER IF EXISTS actions_sequence_update;
+CREATE TRIGGER actions_sequence_update AFTER UPDATE OF timestamp, account_id ON actions FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS actions_sequence_delete;
+CREATE TRIGGER actions_sequence_delete AFTER DELETE ON actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS dividends_sequence_insert;
+CREATE TRIGGER dividends_sequence_insert AFTER INSERT ON dividends FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 2, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+
+DROP TRIGGER IF EXISTS dividends_sequence_update;
+CREATE TRIGGER dividends_sequence_update AFTER UPDATE OF timestamp, account_id, type ON dividends FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id, subtype = NEW.type
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS dividends_sequence_delete;
+CREATE TRIGGER dividends_sequence_delete AFTER DELETE ON dividends FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS asset_actions_sequence_insert;
+CREATE TRIGGER asset_actions_sequence_insert AFTER INSERT ON asset_actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 3, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+
+DROP TRIGGER IF EXISTS asset_actions_sequence_update;
+CREATE TRIGGER asset_actions_sequence_update AFTER UPDATE OF timestamp, account_id, type ON asset_actions FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id, subtype = NEW.type
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS asset_actions_sequence_delete;
+CREATE TRIGGER asset_actions_sequence_delete AFTER DELETE ON asset_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS trades_sequence_insert;
+CREATE TRIGGER trades_sequence_insert AFTER INSERT ON trades FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 4, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+
+DROP TRIGGER IF EXISTS trades_sequence_update;
+CREATE TRIGGER trades_sequence_update AFTER UPDATE OF timestamp, account_id ON trades FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS trades_sequence_delete;
+CREATE TRIGGER trades_sequence_delete AFTER DELETE ON trades FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS transfers_sequence_insert;
+CREATE TRIGGER transfers_sequence_insert AFTER INSERT ON transfers FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+
+DROP TRIGGER IF EXISTS transfers_sequence_update;
+CREATE TRIGGER transfers_sequence_update
+    AFTER UPDATE OF withdrawal_timestamp, withdrawal_account, deposit_timestamp, deposit_account, fee_account, fee
+    ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+
+DROP TRIGGER IF EXISTS transfers_sequence_delete;
+CREATE TRIGGER transfers_sequence_delete AFTER DELETE ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS term_deposits_sequence_update;
+CREATE TRIGGER term_deposits_sequence_update AFTER UPDATE OF account_id ON term_deposits FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET account_id = NEW.account_id WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS term_deposits_sequence_delete;
+CREATE TRIGGER term_deposits_sequence_delete AFTER DELETE ON term_deposits FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS deposit_actions_sequence_insert;
+CREATE TRIGGER deposit_actions_sequence_insert AFTER INSERT ON deposit_actions FOR EACH ROW WHEN NEW.action_type <= 100
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT op_type, 6, id, NEW.timestamp, account_id, NEW.id FROM term_deposits WHERE id = NEW.deposit_id;
+END;
+
+DROP TRIGGER IF EXISTS deposit_actions_sequence_update;
+CREATE TRIGGER deposit_actions_sequence_update
+    AFTER UPDATE OF deposit_id, timestamp, action_type ON deposit_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE id = OLD.deposit_id AND seq = 6 AND subtype = OLD.id;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT op_type, 6, id, NEW.timestamp, account_id, NEW.id FROM term_deposits
+    WHERE id = NEW.deposit_id AND NEW.action_type <= 100;
+END;
+
+DROP TRIGGER IF EXISTS deposit_actions_sequence_delete;
+CREATE TRIGGER deposit_actions_sequence_delete AFTER DELETE ON deposit_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE id = OLD.deposit_id AND seq = 6 AND subtype = OLD.id;
 END;
 
 DROP TRIGGER IF EXISTS validate_account_insert;
@@ -687,6 +918,20 @@ BEGIN
     SELECT RAISE(ABORT, "JAL_SQL_MSG_0001");
 END;
 
+-- Trigger: accounts_precision_update
+-- Fixed-point ledger amounts are scaled by account precision, so the ledger of account should be re-built after
+-- precision change
+DROP TRIGGER IF EXISTS accounts_precision_update;
+CREATE TRIGGER accounts_precision_update AFTER UPDATE OF precision ON accounts
+    FOR EACH ROW
+    WHEN OLD.precision != NEW.precision
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.id;
+    DELETE FROM ledger_totals WHERE account_id = NEW.id;
+    DELETE FROM holdings_snapshots WHERE account_id = NEW.id;
+    UPDATE settings SET value=1 WHERE name='RebuildDB';
+END;
+
 -- Trigger to keep predefinded categories from deletion
 DROP TRIGGER IF EXISTS keep_predefined_categories;
 CREATE TRIGGER keep_predefined_categories BEFORE DELETE ON categories FOR EACH ROW WHEN OLD.special = 1
@@ -696,7 +941,7 @@ END;
 
 
 -- Initialize default values for settings
-INSERT INTO settings(id, name, value) VALUES (0, 'SchemaVersion', 52);
+INSERT INTO settings(id, name, value) VALUES (0, 'SchemaVersion', 63);
 INSERT INTO settings(id, name, value) VALUES (1, 'TriggersEnabled', 1);
 -- INSERT INTO settings(id, name, value) VALUES (2, 'BaseCurrency', 1); -- Deprecated and ID shouldn't be re-used
 INSERT INTO settings(id, name, value) VALUES (3, 'Language', 1);
@@ -716,6 +961,9 @@ INSERT INTO settings(id, name, value) VALUES (16, 'EuLidlRefreshToken', '');
 INSERT INTO settings(id, name, value) VALUES (17, 'PtPingoDoceAccessToken', '');
 INSERT INTO settings(id, name, value) VALUES (18, 'PtPingoDoceRefreshToken', '');
 INSERT INTO settings(id, name, value) VALUES (19, 'PtPingoDoceUserProfile', '{}');
+INSERT INTO settings(id, name, value) VALUES (20, 'LedgerFixedPoint', 0);
+INSERT INTO settings(id, name, value) VALUES (21, 'DbPragmas', '{}');
+INSERT INTO settings(id, name, value) VALUES (22, 'DbBackend', '');
 
 -- Initialize available languages
 INSERT INTO languages (id, language) VALUES (1, 'en');
@@ -1,7 +1,7 @@
+import time
 import logging
 import xml.etree.ElementTree as xml_tree
 from datetime import datetime, timedelta, timezone
-from jal.widgets.helpers import timestamp_range
 from decimal import Decimal
 from io import StringIO, BytesIO
 
@@ -9,13 +9,17 @@ import pandas as pd
 from pandas.errors import ParserError
 import re
 import json
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from PySide6.QtCore import Qt, QObject, Signal, QDate
 from PySide6.QtWidgets import QApplication, QDialog, QListWidgetItem
 
 from jal.ui.ui_update_quotes_window import Ui_UpdateQuotesDlg
-from jal.constants import MarketDataFeed, PredefinedAsset
+from jal.constants import Setup, MarketDataFeed, PredefinedAsset
+from jal.db.db import JalDB
 from jal.db.asset import JalAsset
-from jal.net.helpers import get_web_data, post_web_data, isEnglish
+from jal.db.fx_matrix import FxMatrix
+from jal.net.helpers import get_web_data, post_web_data, isEnglish, trim_cache
 from jal.widgets.helpers import dependency_present
 try:
     from pypdf import PdfReader
@@ -69,10 +73,21 @@ class QuotesUpdateDialog(QDialog):
 # noinspection SpellCheckingInspection
 class QuoteDownloader(QObject):
     download_completed = Signal()
+    # Base URLs of quote sources
+    CBR_URL = "http://www.cbr.ru"
+    ECB_URL = "https://sdw-wsrest.ecb.europa.eu"
+    MOEX_URL = "https://iss.moex.com"
+    YAHOO_URL = "https://query1.finance.yahoo.com"
+    EURONEXT_URL = "https://live.euronext.com"
+    TMX_URL = "https://app-money.tmx.com"
+    COINBASE_URL = "https://api.coinbase.com"
+    DAILY_SOURCES = [MarketDataFeed.COIN]   # Sources that give one quote per request, only missing days are requested
 
     def __init__(self):
         super().__init__()
         self.CBR_codes = None
+        self._db_writes = None   # Queue of DB modifications from download threads while concurrent download is active
+        self._executor = None    # Thread pool of concurrent download that is shared by loaders for their requests
 
     def showQuoteDownloadDialog(self, parent):
         dialog = QuotesUpdateDialog(parent)
@@ -84,45 +99,119 @@ class QuoteDownloader(QObject):
         if MarketDataFeed.FX in sources_list:
             self.download_currency_rates(start_timestamp, end_timestamp)
         self.download_asset_prices(start_timestamp, end_timestamp, sources_list)
+        FxMatrix.update()   # Add new currency rates into cross-rates matrix right away to have it ready for reports
         logging.info(self.tr("Download completed"))
 
-    # Checks for present quotations of 'asset' in given 'currency' and adjusts 'start' timestamp to be at
-    # the end of available quotes interval if needed.
-    def _adjust_start(self, asset: JalAsset, currency_id: int, start) -> int:
-        quotes_begin, quotes_end = asset.quotes_range(currency_id)
-        if start < quotes_begin:
-            from_timestamp = start
-        else:
-            from_timestamp = quotes_end if quotes_end > start else start
-        return from_timestamp
+    # Fetches quotes for given 'days' (list of day timestamps) from a source that gives one quote per request.
+    # 'day_url' returns URL for a day timestamp and 'parse_reply' returns a quote from reply text (or None if there is
+    # no quote in reply). Requests are executed concurrently, replies for past days are kept in disk cache.
+    # Days without reply are listed in 'failed_days' attribute of result as they are not known to be without quotes.
+    def _fetch_daily(self, days: list, day_url, parse_reply) -> pd.DataFrame:
+        completed_day = int(time.time()) - 86400   # Quotes of current day aren't final yet and can't be cached
+
+        def fetch(timestamp):
+            reply = get_web_data(day_url(timestamp), cache=timestamp <= completed_day)
+            return (parse_reply(reply), False) if reply else (None, True)
+
+        replies = list(zip(days, self._map_concurrently(fetch, days)))
+        quotes = [{"Date": datetime.utcfromtimestamp(ts), "Close": quote}
+                  for ts, (quote, _failed) in replies if quote is not None]
+        data = pd.DataFrame(quotes, columns=["Date", "Close"])
+        data['Close'] = data['Close'].apply(Decimal)
+        close = data.set_index("Date")
+        close.attrs['failed_days'] = [ts for ts, (_quote, failed) in replies if failed]
+        return close
+
+    # Returns a list of function(item) results for all 'items' calculated concurrently. Loaders that are called by
+    # _download() share its thread pool: current thread executes itself all calls that weren't started by other
+    # threads yet, so the pool can't be blocked by loaders that wait for their calls.
+    def _map_concurrently(self, function, items: list) -> list:
+        if self._executor is None:
+            with ThreadPoolExecutor(max_workers=Setup.NET_WORKERS) as executor:
+                return list(executor.map(function, items))
+        futures = [self._executor.submit(function, item) for item in items]
+        return [function(item) if future.cancel() else future.result() for item, future in zip(items, futures)]
 
     def _store_quotations(self, asset: JalAsset, currency_id: int, data: pd.DataFrame) -> None:
-        if data is not None:
-            quotations = []
-            for date, quote in data.iterrows():  # Date in pandas dataset is in UTC by default
-                quotations.append({'timestamp': int(date.timestamp()), 'quote': quote[0]})
-            asset.set_quotes(quotations, currency_id)
+        if data is not None:   # Date in pandas dataset is in UTC by default
+            timestamps = (pd.to_datetime(data.index) - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+            asset.set_quotes_columns(timestamps, data.iloc[:, 0], currency_id)
+
+    # Calls 'method' with given arguments in main thread if it is a download thread that calls _db_write()
+    # (as all DB modifications are done by one thread) or calls it right away otherwise.
+    def _db_write(self, method, *args) -> None:
+        if self._db_writes is None:
+            method(*args)
+        else:
+            self._db_writes.put((method, args))
+
+    def _flush_db_writes(self) -> None:
+        while not self._db_writes.empty():
+            method, args = self._db_writes.get()
+            method(*args)
+
+    # Executes downloads concurrently. 'tasks' is a list of (loader, asset, currency_id, (begin, end), [loader arguments])
+    # tuples where (begin, end) is an interval that loader downloads. Loaders are called in worker threads and DB is read
+    # via connection pool there. Downloaded quotes and other DB modifications are streamed into main thread that stores
+    # them and updates quotes coverage index. Method returns when all downloads are completed.
+    def _download(self, tasks: list, warning: str) -> None:
+        self._db_writes = queue.SimpleQueue()
+        try:
+            with ThreadPoolExecutor(max_workers=Setup.NET_WORKERS) as executor:
+                self._executor = executor
+                pending = {executor.submit(self._run_loader, loader, args): (asset, currency_id, interval)
+                           for loader, asset, currency_id, interval, args in tasks}
+                while pending:
+                    done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    self._flush_db_writes()
+                    for future in done:
+                        asset, currency_id, (begin, end) = pending.pop(future)
+                        try:
+                            data = future.result()
+                        except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
+                            logging.warning(warning + f"{asset.symbol()}/{JalAsset(currency_id).symbol()}")
+                            data = None
+                        self._store_quotations(asset, currency_id, data)
+                        coverage = asset.quotes_coverage(currency_id)
+                        if data is None:
+                            coverage.record_failure(begin, end)
+                        else:
+                            coverage.record(begin, end, asset.quoted_days(begin, end, currency_id),
+                                            data.attrs.get('failed_days'))
+        finally:
+            self._executor = None
+            self._flush_db_writes()
+            self._db_writes = None
+            trim_cache()
+
+    @staticmethod
+    def _run_loader(loader, args):
+        with JalDB.reader():
+            return loader(*args)
 
     def download_currency_rates(self, start_timestamp, end_timestamp):
         data_loaders = {
             "RUB": self.CBR_DataReader,
             "EUR": self.ECB_DataReader
         }
-        self.PrepareRussianCBReader()
+        tasks = []
         for base in set([x[1] for x in JalAsset.get_base_currency_history(start_timestamp, end_timestamp)]):
             for currency in JalAsset.get_currencies():
                 if currency.id() == base or currency.quote_source(None) != MarketDataFeed.FX:
                     continue  # Skip as it is X/X ratio that is always 1
-                from_timestamp = self._adjust_start(currency, base, start_timestamp)
-                if end_timestamp < from_timestamp:
+                intervals = currency.quotes_coverage(base).plan(
+                    start_timestamp, end_timestamp, currency.quoted_days(start_timestamp, end_timestamp, base))
+                if not intervals:
                     continue
-                try:
-                    data = data_loaders[JalAsset(base).symbol()](currency, from_timestamp, end_timestamp)
-                except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
+                loader = data_loaders.get(JalAsset(base).symbol(), None)
+                if loader is None:
                     logging.warning(self.tr("No rates were downloaded for ") +
                                     f"{currency.symbol()}/{JalAsset(base).symbol()}")
                     continue
-                self._store_quotations(currency, base, data)
+                tasks += [(loader, currency, base, (begin, end), (currency, begin, end)) for begin, end in intervals]
+        if any(task[0] == self.CBR_DataReader for task in tasks):
+            self.PrepareRussianCBReader()
+        self._download(tasks, self.tr("No rates were downloaded for "))
 
     def download_asset_prices(self, start_timestamp, end_timestamp, sources_list):
         data_loaders = {
@@ -136,27 +225,36 @@ class QuoteDownloader(QObject):
             MarketDataFeed.SMA_VICTORIA: self.Victoria_Downloader,
             MarketDataFeed.COIN: self.Coinbase_Downloader
         }
+        tasks = []
         assets = JalAsset.get_active_assets(start_timestamp, end_timestamp)  # append assets list
         for asset_data in assets:
             asset = asset_data['asset']
             currency = asset_data['currency']
-            from_timestamp = self._adjust_start(asset, currency, start_timestamp)
-            if end_timestamp < from_timestamp:
+            data_source = asset.quote_source(currency)
+            if data_source not in sources_list:   # skip sources that are not requested
                 continue
-            try:
-                data_source = asset.quote_source(currency)
-                if data_source not in sources_list:   # skip sources that are not requested
-                    continue
-                data = data_loaders[data_source](asset, currency, from_timestamp, end_timestamp)
-            except (xml_tree.ParseError, pd.errors.EmptyDataError, KeyError):
+            coverage = asset.quotes_coverage(currency)
+            quoted_days = asset.quoted_days(start_timestamp, end_timestamp, currency)
+            if data_source in self.DAILY_SOURCES:   # request every missing day for daily sources
+                days = coverage.missing_days(start_timestamp, end_timestamp, quoted_days)
+                intervals = [(start_timestamp, end_timestamp)] if days else []
+            else:
+                intervals = coverage.plan(start_timestamp, end_timestamp, quoted_days)
+            if not intervals:
+                continue
+            if data_source not in data_loaders:
                 logging.warning(self.tr("No quotes were downloaded for ") + f"{asset.symbol()}")
                 continue
-            self._store_quotations(asset, currency, data)
+            for begin, end in intervals:
+                args = (asset, currency, begin, end, days) if data_source in self.DAILY_SOURCES else \
+                    (asset, currency, begin, end)
+                tasks.append((data_loaders[data_source], asset, currency, (begin, end), args))
+        self._download(tasks, self.tr("No quotes were downloaded for "))
 
     def PrepareRussianCBReader(self):
         rows = []
         try:
-            xml_root = xml_tree.fromstring(get_web_data("http://www.cbr.ru/scripts/XML_valFull.asp"))
+            xml_root = xml_tree.fromstring(get_web_data(f"{self.CBR_URL}/scripts/XML_valFull.asp"))
             for node in xml_root:
                 code = node.find("ParentCode").text.strip() if node is not None else None
                 iso = node.find("ISO_Char_Code").text if node is not None else None
@@ -178,7 +276,7 @@ class QuoteDownloader(QObject):
         except IndexError:
             logging.debug(self.tr("There are no CBR data for: ") + f"{currency.symbol()}")
             return None
-        url = f"http://www.cbr.ru/scripts/XML_dynamic.asp?date_req1={date1}&date_req2={date2}&VAL_NM_RQ={code}"
+        url = f"{self.CBR_URL}/scripts/XML_dynamic.asp?date_req1={date1}&date_req2={date2}&VAL_NM_RQ={code}"
         xml_root = xml_tree.fromstring(get_web_data(url))
         rows = []
         for node in xml_root:
@@ -200,7 +298,7 @@ class QuoteDownloader(QObject):
     def ECB_DataReader(self, currency, start_timestamp, end_timestamp):
         date1 = datetime.utcfromtimestamp(start_timestamp).strftime('%Y-%m-%d')
         date2 = datetime.utcfromtimestamp(end_timestamp).strftime('%Y-%m-%d')
-        url = f"https://sdw-wsrest.ecb.europa.eu/service/data/EXR/D.{currency.symbol()}.EUR.SP00.A?startPeriod={date1}&endPeriod={date2}"
+        url = f"{self.ECB_URL}/service/data/EXR/D.{currency.symbol()}.EUR.SP00.A?startPeriod={date1}&endPeriod={date2}"
         file = StringIO(get_web_data(url, headers={'Accept': 'text/csv'}))
         try:
             data = pd.read_csv(file, dtype={'TIME_PERIOD': str, 'OBS_VALUE': str})
@@ -271,7 +369,7 @@ class QuoteDownloader(QObject):
         asset = {}
         if not asset_code:
             return asset
-        url = f"http://iss.moex.com/iss/securities/{asset_code}.xml"
+        url = f"{QuoteDownloader.MOEX_URL}/iss/securities/{asset_code}.xml"
         xml_root = xml_tree.fromstring(get_web_data(url))
         info_rows = xml_root.findall("data[@id='description']/rows/*")
         boards = xml_root.findall("data[@id='boards']/rows/*")
@@ -321,20 +419,20 @@ class QuoteDownloader(QObject):
         secid = ''
         data = []
         if kwargs.get('reg_number', ''):
-            url = f"https://iss.moex.com/iss/securities.json?q={kwargs['reg_number']}&iss.meta=off&limit=10"
+            url = f"{QuoteDownloader.MOEX_URL}/iss/securities.json?q={kwargs['reg_number']}&iss.meta=off&limit=10"
             asset_data = json.loads(get_web_data(url))
             securities = asset_data['securities']
             columns = securities['columns']
             data = [x for x in securities['data'] if
                     x[columns.index('regnumber')] == kwargs['reg_number'] or x[columns.index('regnumber')] is None]
         if not data and kwargs.get('isin', ''):
-            url = f"https://iss.moex.com/iss/securities.json?q={kwargs['isin']}&iss.meta=off&limit=10"
+            url = f"{QuoteDownloader.MOEX_URL}/iss/securities.json?q={kwargs['isin']}&iss.meta=off&limit=10"
             asset_data = json.loads(get_web_data(url))
             securities = asset_data['securities']
             columns = securities['columns']
             data = securities['data']  # take the whole list if we search by isin
         if not data and 'name' in kwargs:
-            url = f"https://iss.moex.com/iss/securities.json?q={kwargs['name']}&iss.meta=off&limit=20"
+            url = f"{QuoteDownloader.MOEX_URL}/iss/securities.json?q={kwargs['name']}&iss.meta=off&limit=20"
             asset_data = json.loads(get_web_data(url))
             securities = asset_data['securities']
             columns = securities['columns']
@@ -372,12 +470,12 @@ class QuoteDownloader(QObject):
             expiry = moex_info['expiry'] if 'expiry' in moex_info else 0
             principal = moex_info['principal'] if 'principal' in moex_info else 0
             details = {'isin': isin, 'reg_number': reg_number, 'expiry': expiry, 'principal': principal}
-            asset.update_data(details)
+            self._db_write(asset.update_data, details)
 
         # Get price history
         date1 = datetime.utcfromtimestamp(start_timestamp).strftime('%Y-%m-%d')
         date2 = datetime.utcfromtimestamp(end_timestamp).strftime('%Y-%m-%d')
-        url = f"http://iss.moex.com/iss/history/engines/{moex_info['engine']}/markets/{moex_info['market']}/" \
+        url = f"{self.MOEX_URL}/iss/history/engines/{moex_info['engine']}/markets/{moex_info['market']}/" \
               f"boards/{moex_info['board']}/securities/{asset_code}.xml?from={date1}&till={date2}"
         xml_root = xml_tree.fromstring(get_web_data(url))
         history_rows = xml_root.findall("data[@id='history']/rows/*")
@@ -398,7 +496,7 @@ class QuoteDownloader(QObject):
 
     # noinspection PyMethodMayBeStatic
     def Yahoo_Downloader(self, asset, currency_id, start_timestamp, end_timestamp, suffix=''):
-        url = f"https://query1.finance.yahoo.com/v7/finance/download/{asset.symbol(currency_id)+suffix}?" \
+        url = f"{self.YAHOO_URL}/v7/finance/download/{asset.symbol(currency_id)+suffix}?" \
               f"period1={start_timestamp}&period2={end_timestamp}&interval=1d&events=history"
         file = StringIO(get_web_data(url))
         try:
@@ -426,7 +524,7 @@ class QuoteDownloader(QObject):
                   'base100': '', 'startdate': datetime.utcfromtimestamp(start_timestamp).strftime('%Y-%m-%d'),
                   'enddate': datetime.utcfromtimestamp(end_timestamp).strftime('%Y-%m-%d')}
         suffix = "ETFP" if asset.type() == PredefinedAsset.ETF else "XPAR"  # Dates don't work for ETFP due to glitch on their site
-        url = f"https://live.euronext.com/en/ajax/AwlHistoricalPrice/getFullDownloadAjax/{asset.isin()}-{suffix}"
+        url = f"{self.EURONEXT_URL}/en/ajax/AwlHistoricalPrice/getFullDownloadAjax/{asset.isin()}-{suffix}"
         quotes = post_web_data(url, params=params)
         quotes_text = quotes.replace(u'\ufeff', '').splitlines()    # Remove BOM from the beginning
         if len(quotes_text) < 4:
@@ -454,7 +552,7 @@ class QuoteDownloader(QObject):
 
     # noinspection PyMethodMayBeStatic
     def TMX_Downloader(self, asset, _currency_id, start_timestamp, end_timestamp):
-        url = 'https://app-money.tmx.com/graphql'
+        url = f"{self.TMX_URL}/graphql"
         params = {
             "operationName": "getCompanyPriceHistoryForDownload",
             "variables":
@@ -549,28 +647,26 @@ class QuoteDownloader(QObject):
         close = data.set_index("Date")
         return close
 
-    def Coinbase_Downloader(self, asset, currency_id, start_timestamp, end_timestamp):
-        currency_symbol = JalAsset(currency_id).symbol()
-        base_url = f"https://api.coinbase.com/v2/prices/{asset.symbol()}-{currency_symbol}/spot?date="
-        quotes = []
-        for ts in timestamp_range(start_timestamp, end_timestamp):
-            url = base_url + datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d')
-            result_data = json.loads(get_web_data(url))
+    # Downloads quotes for given 'days' (all days between start and end timestamps that have no quotes if omitted)
+    def Coinbase_Downloader(self, asset, currency_id, start_timestamp, end_timestamp, days=None):
+        if days is None:
+            days = asset.quotes_coverage(currency_id).missing_days(
+                start_timestamp, end_timestamp, asset.quoted_days(start_timestamp, end_timestamp, currency_id))
+        base_url = f"{self.COINBASE_URL}/v2/prices/{asset.symbol()}-{JalAsset(currency_id).symbol()}/spot?date="
+
+        def parse_reply(reply):
             try:
-                quote = result_data['data']['amount']
-            except:
-                continue
-            quotes.append({"Date": datetime.utcfromtimestamp(ts), "Close": quote})
-        data = pd.DataFrame(quotes, columns=["Date", "Close"])
-        data['Close'] = data['Close'].apply(Decimal)
-        data.dropna(inplace=True)
-        close = data.set_index("Date")
-        return close
+                return json.loads(reply)['data']['amount']
+            except (ValueError, KeyError, TypeError):
+                return None
+
+        return self._fetch_daily(days, lambda ts: base_url + datetime.utcfromtimestamp(ts).strftime('%Y-%m-%d'),
+                                 parse_reply)
 
     # Returns a list of currencies supported by Coinbase exchange as a list of {'symbol', 'name'}
     @staticmethod
     def Coinbase_GetCurrencyList() -> list:
-        result_data = json.loads(get_web_data("https://api.coinbase.com/v2/currencies/crypto"))
+        result_data = json.loads(get_web_data(f"{QuoteDownloader.COINBASE_URL}/v2/currencies/crypto"))
         data = result_data['data']
         assets = [{'symbol': x['code'], 'name': x['name']} for x in data if x['type'] == 'crypto']
         return assets
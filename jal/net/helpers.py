@@ -1,12 +1,19 @@
 import os
+import time
+import hashlib
+import threading
 import requests
-from requests.exceptions import ConnectTimeout, ConnectionError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import Timeout, ConnectionError
+from urllib.parse import urlsplit
+from urllib3.util.retry import Retry
 import logging
 import platform
 from PySide6.QtWidgets import QApplication
 from jal import __version__
 from jal.constants import Setup
 from jal.db.helpers import get_app_path
+from jal.db.db import JalDB
 
 
 # ===================================================================================================================
@@ -29,26 +36,74 @@ def isEnglish(text):
         return True
 
 
+# ===================================================================================================================
+# HTTP sessions are shared by all requests to the same host in order to keep connections alive. Every session has a
+# connection pool for concurrent downloads and retries failed requests with exponential backoff.
+_sessions = {}                 # {host: requests.Session}
+_next_request_time = {}        # {host: time.monotonic() value when next request to the host is allowed}
+_sessions_lock = threading.Lock()
+
+
+# Returns HTTP session that is shared by all requests to given host
+def host_session(host: str) -> requests.Session:
+    with _sessions_lock:
+        if host not in _sessions:
+            retry = Retry(total=Setup.NET_RETRIES, backoff_factor=Setup.NET_BACKOFF, allowed_methods=None,
+                          status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Setup.NET_WORKERS, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[host] = session
+        return _sessions[host]
+
+
+# Closes all HTTP sessions
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        _next_request_time.clear()
+
+
+# Waits until next request to given host is allowed by Setup.NET_RATE_LIMITS
+def wait_rate_limit(host: str):
+    rate = Setup.NET_RATE_LIMITS.get(host, 0)
+    if not rate:
+        return
+    with _sessions_lock:   # Reserve a time slot for request and wait for it outside the lock
+        now = time.monotonic()
+        request_time = max(now, _next_request_time.get(host, now))
+        _next_request_time[host] = request_time + 1.0 / rate
+    if request_time > now:
+        time.sleep(request_time - now)
+
+
 # ===================================================================================================================
 # Retrieve URL from web with given method and params
 def request_url(method, url, params=None, json_params=None, headers=None, binary=False, verify=True):
-    session = requests.Session()
-    session.headers['User-Agent'] = make_user_agent(url=url)
+    host = urlsplit(url).netloc
+    session = host_session(host)
+    request_headers = {'User-Agent': make_user_agent(url=url)}
     if headers is not None:
-        session.headers.update(headers)
+        request_headers.update(headers)
+    wait_rate_limit(host)
     try:
         if method == "GET":
-            response = session.get(url, verify=verify)
+            response = session.get(url, headers=request_headers, verify=verify, timeout=Setup.NET_TIMEOUT)
         elif method == "POST":
             if params:
-                response = session.post(url, data=params, verify=verify)
+                response = session.post(url, data=params, headers=request_headers, verify=verify,
+                                        timeout=Setup.NET_TIMEOUT)
             elif json_params:
-                response = session.post(url, json=json_params, verify=verify)
+                response = session.post(url, json=json_params, headers=request_headers, verify=verify,
+                                        timeout=Setup.NET_TIMEOUT)
             else:
-                response = session.post(url, verify=verify)
+                response = session.post(url, headers=request_headers, verify=verify, timeout=Setup.NET_TIMEOUT)
         else:
             raise ValueError("Unknown download method for URL")
-    except ConnectTimeout:
+    except Timeout:
         logging.error(f"URL {url}\nConnection timeout.")
         return ''
     except ConnectionError as e:
@@ -65,12 +120,78 @@ def request_url(method, url, params=None, json_params=None, headers=None, binary
         return ''
 
 
+# ===================================================================================================================
+# Returns a path to cache folder: it is Setup.NET_CACHE_PATH in the folder of database file as application folder may
+# be read-only
+def cache_path() -> str:
+    return os.path.join(os.path.dirname(JalDB._db_path()), Setup.NET_CACHE_PATH)
+
+
+# Returns a name of file in cache folder that keeps a reply for given URL
+def cache_file_name(url) -> str:
+    return os.path.join(cache_path(), hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+
+# Returns cached reply for given URL or None if there is no such reply in cache.
+# Modification time of the file is updated on every use in order to keep recently used replies in cache.
+def read_cache(url, binary=False):
+    file_name = cache_file_name(url)
+    try:
+        with open(file_name, 'rb' if binary else 'r', encoding=None if binary else 'utf-8') as cache_file:
+            data = cache_file.read()
+        os.utime(file_name)
+    except OSError:
+        return None
+    return data
+
+
+# Puts reply for given URL into cache. Failure isn't critical as reply may be downloaded again
+def write_cache(url, data):
+    file_name = cache_file_name(url)
+    binary = type(data) == bytes
+    try:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        with open(file_name + ".tmp", 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as cache_file:
+            cache_file.write(data)
+        os.replace(file_name + ".tmp", file_name)
+    except OSError as e:
+        logging.debug(f"Can't cache reply for {url}: {e}")
+
+
+# Removes cached replies that weren't used during Setup.NET_CACHE_AGE days. Then least recently used replies are
+# removed until total size of cache is not greater than Setup.NET_CACHE_SIZE
+def trim_cache():
+    try:
+        with os.scandir(cache_path()) as entries:
+            files = [(x.stat().st_mtime, x.stat().st_size, x.path) for x in entries if x.is_file()]
+    except OSError:
+        return   # No cache
+    files.sort(reverse=True)
+    expiration = time.time() - Setup.NET_CACHE_AGE * 86400
+    size = 0
+    for used, file_size, path in files:
+        size += file_size
+        if used < expiration or size > Setup.NET_CACHE_SIZE:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.debug(f"Can't remove cached reply {path}: {e}")
+
+
 # ===================================================================================================================
 # Function download URL and return it content as string or empty string if site returns error
-def get_web_data(url, headers=None, binary=False, verify=True):
+# If 'cache' is True then reply is taken from disk cache if present, successful reply is put into the cache otherwise
+def get_web_data(url, headers=None, binary=False, verify=True, cache=False):
+    if cache:
+        data = read_cache(url, binary=binary)
+        if data is not None:
+            return data
     if type(verify) != bool:  # there is a certificate path given -> add full path to it
         verify = get_app_path() + Setup.NET_PATH + os.sep + verify
-    return request_url("GET", url, headers=headers, binary=binary, verify=verify)
+    data = request_url("GET", url, headers=headers, binary=binary, verify=verify)
+    if cache and data:
+        write_cache(url, data)
+    return data
 
 
 # ===================================================================================================================
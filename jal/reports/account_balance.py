@@ -96,8 +96,8 @@ class AccountBalanceHistoryReportWindow(MdiWidget):
         if self.ui.ReportAccountButton.account_id == 0:
             return
         account = JalAccount(self.ui.ReportAccountButton.account_id)
-        balances = []
         date_range = self.ui.ReportRange.getRange()
-        for ts in timestamp_range(date_range[0], date_range[1]):
-            balances.append({'timestamp': ts*1000, 'balance': account.balance(ts)})
+        timestamps = list(timestamp_range(date_range[0], date_range[1]))
+        money, assets = account.balance_history(timestamps)
+        balances = [{'timestamp': ts*1000, 'balance': x + y} for ts, x, y in zip(timestamps, money, assets)]
         self.chart.updateView(balances, JalAsset(account.currency()).symbol())
@@ -193,6 +193,7 @@ class IncomeSpendingReportModel(QAbstractItemModel):
         self._period_list = []
         self._view = parent_view
         self._root = None
+        self._turnovers = {}      # {category_id: [turnover for every period of self._period_list]}
         self._grid_delegate = None
         self._float_delegate = None
 
@@ -352,6 +353,8 @@ class IncomeSpendingReportModel(QAbstractItemModel):
             assert False, "Wrong period for Income/Spending report"
         self._root = ReportTreeItem(self._begin, self._end, -1, "ROOT", periods=self._periodicity)  # invisible root
         self._root.appendChild(ReportTreeItem(self._begin, self._end, 0, self.tr("TOTAL"), periods=self._periodicity))  # visible root
+        self._turnovers = JalCategory.get_turnovers([(x['begin_ts'], x['end_ts']) for x in self._period_list],
+                                                    self._currency)
         self._load_child_amounts(root_category)
         self._root.removeEmptyChildren()
         self.modelReset.emit()
@@ -364,9 +367,8 @@ class IncomeSpendingReportModel(QAbstractItemModel):
                 parent = self._root.getLeafById(category.parent_id())
                 leaf = ReportTreeItem(self._begin, self._end, category.id(), category.name(), parent=parent)
                 parent.appendChild(leaf)
-            for period in self._period_list:
-                leaf.addAmount(period['year'], period['number'],
-                               category.get_turnover(period['begin_ts'], period['end_ts'], self._currency))
+            for period, amount in zip(self._period_list, self._turnovers.get(category.id(), [])):
+                leaf.addAmount(period['year'], period['number'], amount)   # Parent totals are updated by leaf
             self._load_child_amounts(category)
 
 
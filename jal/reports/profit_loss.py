@@ -22,6 +22,8 @@ class ProfitLossModel(QAbstractTableModel):
         self._columns = [self.tr("Period"), self.tr("Money"), self.tr("In / Out"), self.tr("Dividends"), self.tr("%"),
                          self.tr("Fees"), self.tr("Taxes"), self.tr("Assets"), self.tr("P&L"), self.tr("Total"),
                          self.tr("Change"), self.tr("Change, %")]
+        self._categories = [PredefinedCategory.Dividends, PredefinedCategory.Interest, PredefinedCategory.Fees,
+                            PredefinedCategory.Taxes, PredefinedCategory.Profit]
         self.month_name = [
             self.tr('Jan'), self.tr('Feb'), self.tr('Mar'), self.tr('Apr'), self.tr('May'), self.tr('Jun'),
             self.tr('Jul'), self.tr('Aug'), self.tr('Sep'), self.tr('Oct'), self.tr('Nov'), self.tr('Dec')
@@ -73,22 +75,20 @@ class ProfitLossModel(QAbstractTableModel):
     # assets - valuation of assets held by account by prices at the end of the period
     # p&l - profit and loss of deals closed during the period
     # total - total amount of money and assets by end of the period
-    def data4period(self, begin: int, end: int, account: JalAccount) -> dict:
-        assets = account.assets_list(end)
-        asset_value = Decimal('0')
-        for asset_data in assets:
-            asset = asset_data['asset']
-            asset_value += asset_data['amount'] * asset.quote(end, account.currency())[1]
+    # 'money' and 'asset_value' are amount of money and value of assets at the end of the period
+    # (see JalAccount.balance_history()), 'books' and 'categories' are turnovers for the period
+    # (see JalAccount.get_turnovers())
+    def data4period(self, money: Decimal, asset_value: Decimal, books: dict, categories: dict) -> dict:
         data = {
-            'money': account.get_asset_amount(end, account.currency()),
-            'transfers': -account.get_book_turnover(BookAccount.Transfers, begin, end),
-            'dividends': -account.get_category_turnover(PredefinedCategory.Dividends, begin, end),
-            'interest': -account.get_category_turnover(PredefinedCategory.Interest, begin, end),
-            'fees': -account.get_category_turnover(PredefinedCategory.Fees, begin, end),
-            'taxes': -account.get_category_turnover(PredefinedCategory.Taxes, begin, end),
+            'money': money,
+            'transfers': -books[BookAccount.Transfers],
+            'dividends': -categories[PredefinedCategory.Dividends],
+            'interest': -categories[PredefinedCategory.Interest],
+            'fees': -categories[PredefinedCategory.Fees],
+            'taxes': -categories[PredefinedCategory.Taxes],
             'assets': asset_value,
-            'p&l': -account.get_category_turnover(PredefinedCategory.Profit, begin, end),
-            'total': account.get_asset_amount(end, account.currency()) + asset_value
+            'p&l': -categories[PredefinedCategory.Profit],
+            'total': money + asset_value
         }
         return data
 
@@ -103,8 +103,12 @@ class ProfitLossModel(QAbstractTableModel):
         months = [{'begin_ts': self._month_list[0]['begin_ts'], 'end_ts': self._month_list[0]['begin_ts']}]
         months.extend(self._month_list)
         months.append({'begin_ts': self._month_list[0]['begin_ts'], 'end_ts': self._month_list[-1]['end_ts']})
+        money, assets = account.balance_history([x['end_ts'] for x in months])
+        books, categories = account.get_turnovers([(x['begin_ts'], x['end_ts']) for x in months],
+                                                  [BookAccount.Transfers], self._categories)
         for i, month in enumerate(months):
-            values = self.data4period(month['begin_ts'], month['end_ts'], account)
+            values = self.data4period(money[i], assets[i], {k: v[i] for k, v in books.items()},
+                                      {k: v[i] for k, v in categories.items()})
             if i == 0:
                 row_name = self.tr("Period start")
                 money_p = money_0 = values['money']
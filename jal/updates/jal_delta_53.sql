@@ -0,0 +1,286 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+DROP INDEX IF EXISTS ledger_by_account_timestamp;
+CREATE INDEX ledger_by_account_timestamp ON ledger (account_id, timestamp);
+
+-- Trigger: action_details_after_delete
+DROP TRIGGER IF EXISTS action_details_after_delete;
+CREATE TRIGGER action_details_after_delete
+      AFTER DELETE ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM actions WHERE id = OLD.pid) AND
+                timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
+END;
+
+
+-- Trigger: action_details_after_insert
+DROP TRIGGER IF EXISTS action_details_after_insert;
+CREATE TRIGGER action_details_after_insert
+      AFTER INSERT ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM actions WHERE id = NEW.pid) AND
+                timestamp >= (SELECT timestamp FROM actions WHERE id = NEW.pid);
+END;
+
+-- Trigger: action_details_after_update
+DROP TRIGGER IF EXISTS action_details_after_update;
+CREATE TRIGGER action_details_after_update
+      AFTER UPDATE ON action_details
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM actions WHERE id = OLD.pid) AND
+                timestamp >= (SELECT timestamp FROM actions WHERE id = OLD.pid);
+END;
+
+-- Trigger: actions_after_delete
+DROP TRIGGER IF EXISTS actions_after_delete;
+CREATE TRIGGER actions_after_delete
+      AFTER DELETE ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM action_details WHERE pid = OLD.id;
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+END;
+
+-- Trigger: actions_after_insert
+DROP TRIGGER IF EXISTS actions_after_insert;
+CREATE TRIGGER actions_after_insert
+      AFTER INSERT ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+END;
+
+-- Trigger: actions_after_update
+DROP TRIGGER IF EXISTS actions_after_update;
+CREATE TRIGGER actions_after_update
+      AFTER UPDATE OF timestamp, account_id, peer_id ON actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+END;
+
+-- Trigger: dividends_after_delete
+DROP TRIGGER IF EXISTS dividends_after_delete;
+CREATE TRIGGER dividends_after_delete
+      AFTER DELETE ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+    DELETE FROM trades_opened WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+END;
+
+-- Trigger: dividends_after_insert
+DROP TRIGGER IF EXISTS dividends_after_insert;
+CREATE TRIGGER dividends_after_insert
+      AFTER INSERT ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+END;
+
+-- Trigger: dividends_after_update
+DROP TRIGGER IF EXISTS dividends_after_update;
+CREATE TRIGGER dividends_after_update
+      AFTER UPDATE OF timestamp, type, account_id, asset_id, amount, tax ON dividends
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS trades_after_delete;
+CREATE TRIGGER trades_after_delete
+         AFTER DELETE ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+    DELETE FROM trades_opened WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS trades_after_insert;
+CREATE TRIGGER trades_after_insert
+      AFTER INSERT ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS trades_after_update;
+CREATE TRIGGER trades_after_update
+      AFTER UPDATE OF timestamp, account_id, asset_id, qty, price, fee ON trades
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_delete;
+CREATE TRIGGER asset_action_after_delete
+      AFTER DELETE ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+    DELETE FROM trades_opened WHERE account_id = OLD.account_id AND timestamp >= OLD.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_insert;
+CREATE TRIGGER asset_action_after_insert
+      AFTER INSERT ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+    DELETE FROM trades_opened WHERE account_id = NEW.account_id AND timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS asset_action_after_update;
+CREATE TRIGGER asset_action_after_update
+      AFTER UPDATE OF timestamp, account_id, type, asset_id, qty ON asset_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.account_id AND timestamp >= OLD.timestamp) OR
+                (account_id = NEW.account_id AND timestamp >= NEW.timestamp);
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_delete;
+CREATE TRIGGER asset_result_after_delete
+      AFTER DELETE ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM asset_actions WHERE id = OLD.action_id) AND
+                timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_insert;
+CREATE TRIGGER asset_result_after_insert
+      AFTER INSERT ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM asset_actions WHERE id = NEW.action_id) AND
+                timestamp >= (SELECT timestamp FROM asset_actions WHERE id = NEW.action_id);
+END;
+
+DROP TRIGGER IF EXISTS asset_result_after_update;
+CREATE TRIGGER asset_result_after_update
+      AFTER UPDATE OF asset_id, qty, value_share ON action_results
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM asset_actions WHERE id = OLD.action_id) AND
+                timestamp >= (SELECT timestamp FROM asset_actions WHERE id = OLD.action_id);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_delete;
+CREATE TRIGGER transfers_after_delete
+      AFTER DELETE ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_insert;
+CREATE TRIGGER transfers_after_insert
+      AFTER INSERT ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
+    DELETE FROM trades_opened WHERE (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
+END;
+
+DROP TRIGGER IF EXISTS transfers_after_update;
+CREATE TRIGGER transfers_after_update
+      AFTER UPDATE OF withdrawal_timestamp, deposit_timestamp, withdrawal_account, deposit_account, fee_account,
+                      withdrawal, deposit, fee, asset ON transfers
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp) OR
+                (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
+    DELETE FROM trades_opened WHERE (account_id = OLD.withdrawal_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.fee_account AND timestamp >= OLD.withdrawal_timestamp) OR
+                (account_id = OLD.deposit_account AND timestamp >= OLD.deposit_timestamp) OR
+                (account_id = NEW.withdrawal_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.fee_account AND timestamp >= NEW.withdrawal_timestamp) OR
+                (account_id = NEW.deposit_account AND timestamp >= NEW.deposit_timestamp);
+END;
+
+DROP TRIGGER IF EXISTS deposit_action_after_delete;
+CREATE TRIGGER deposit_action_after_delete
+      AFTER DELETE ON deposit_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM term_deposits WHERE id = OLD.deposit_id) AND timestamp >= OLD.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS deposit_action_after_insert;
+CREATE TRIGGER deposit_action_after_insert
+      AFTER INSERT ON deposit_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE account_id = (SELECT account_id FROM term_deposits WHERE id = NEW.deposit_id) AND timestamp >= NEW.timestamp;
+END;
+
+DROP TRIGGER IF EXISTS deposit_action_after_update;
+CREATE TRIGGER deposit_action_after_update
+      AFTER UPDATE OF deposit_id, timestamp, action_type, amount ON deposit_actions
+      FOR EACH ROW
+      WHEN (SELECT value FROM settings WHERE id = 1)
+BEGIN
+    DELETE FROM ledger WHERE (account_id = (SELECT account_id FROM term_deposits WHERE id = OLD.deposit_id) AND timestamp >= OLD.timestamp) OR
+                (account_id = (SELECT account_id FROM term_deposits WHERE id = NEW.deposit_id) AND timestamp >= NEW.timestamp);
+END;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=53 WHERE name='SchemaVersion';
+COMMIT;
+-- Reduce file size
+VACUUM;
\ No newline at end of file
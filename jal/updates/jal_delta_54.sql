@@ -0,0 +1,32 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Last accumulated values of (account, asset, book) chain: rowid order of index is used for ORDER BY id DESC
+DROP INDEX IF EXISTS ledger_by_chain;
+CREATE INDEX ledger_by_chain ON ledger (account_id, asset_id, book_account);
+-- Covering index for account turnovers and flows
+DROP INDEX IF EXISTS ledger_by_account_book;
+CREATE INDEX ledger_by_account_book ON ledger (account_id, book_account, timestamp, asset_id, amount, value);
+DROP INDEX IF EXISTS ledger_by_operation;
+CREATE INDEX ledger_by_operation ON ledger (op_type, operation_id, book_account);
+-- Partial covering indices for operations lookup by category, peer and tag
+DROP INDEX IF EXISTS ledger_by_category;
+CREATE INDEX ledger_by_category ON ledger (category_id, timestamp, account_id, book_account, amount, op_type, operation_id)
+    WHERE category_id IS NOT NULL;
+DROP INDEX IF EXISTS ledger_by_peer;
+CREATE INDEX ledger_by_peer ON ledger (peer_id, timestamp, op_type, operation_id, account_id) WHERE peer_id IS NOT NULL;
+DROP INDEX IF EXISTS ledger_by_tag;
+CREATE INDEX ledger_by_tag ON ledger (tag_id, timestamp, op_type, operation_id, account_id) WHERE tag_id IS NOT NULL;
+DROP INDEX IF EXISTS open_trades_by_account_asset_idx;
+CREATE INDEX open_trades_by_account_asset_idx ON trades_opened (account_id, asset_id, timestamp);
+DROP INDEX IF EXISTS closed_trades_by_account_idx;
+CREATE INDEX closed_trades_by_account_idx ON trades_closed (account_id, close_timestamp);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=54 WHERE name='SchemaVersion';
+COMMIT;
+-- Reduce file size
+VACUUM;
\ No newline at end of file
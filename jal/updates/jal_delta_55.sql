@@ -0,0 +1,70 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 0;
+--------------------------------------------------------------------------------
+-- Ledger tables are re-created without type affinity of amount columns, ledger will be re-built
+-- Table: ledger
+DROP TABLE IF EXISTS ledger;
+CREATE TABLE ledger (
+    id           INTEGER PRIMARY KEY NOT NULL UNIQUE,
+    timestamp    INTEGER NOT NULL,
+    op_type      INTEGER NOT NULL,
+    operation_id INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER REFERENCES assets (id) ON DELETE SET NULL ON UPDATE SET NULL,
+    account_id   INTEGER NOT NULL REFERENCES accounts (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
+    amount,                 -- amount columns have no type affinity as they keep either decimal TEXT or
+    value,                  -- INTEGER scaled by account precision (if 'LedgerFixedPoint' setting is set)
+    amount_acc,
+    value_acc,
+    peer_id      INTEGER REFERENCES agents (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
+    category_id  INTEGER REFERENCES categories (id) ON DELETE NO ACTION ON UPDATE NO ACTION,
+    tag_id       INTEGER REFERENCES tags (id) ON DELETE NO ACTION ON UPDATE NO ACTION
+);
+DROP INDEX IF EXISTS ledger_by_account_timestamp;
+CREATE INDEX ledger_by_account_timestamp ON ledger (account_id, timestamp);
+-- Last accumulated values of (account, asset, book) chain: rowid order of index is used for ORDER BY id DESC
+DROP INDEX IF EXISTS ledger_by_chain;
+CREATE INDEX ledger_by_chain ON ledger (account_id, asset_id, book_account);
+-- Covering index for account turnovers and flows
+DROP INDEX IF EXISTS ledger_by_account_book;
+CREATE INDEX ledger_by_account_book ON ledger (account_id, book_account, timestamp, asset_id, amount, value);
+DROP INDEX IF EXISTS ledger_by_operation;
+CREATE INDEX ledger_by_operation ON ledger (op_type, operation_id, book_account);
+-- Partial covering indices for operations lookup by category, peer and tag
+DROP INDEX IF EXISTS ledger_by_category;
+CREATE INDEX ledger_by_category ON ledger (category_id, timestamp, account_id, book_account, amount, op_type, operation_id)
+    WHERE category_id IS NOT NULL;
+DROP INDEX IF EXISTS ledger_by_peer;
+CREATE INDEX ledger_by_peer ON ledger (peer_id, timestamp, op_type, operation_id, account_id) WHERE peer_id IS NOT NULL;
+DROP INDEX IF EXISTS ledger_by_tag;
+CREATE INDEX ledger_by_tag ON ledger (tag_id, timestamp, op_type, operation_id, account_id) WHERE tag_id IS NOT NULL;
+
+-- Table: ledger_totals to keep last accumulated amount value for each transaction
+DROP TABLE IF EXISTS ledger_totals;
+CREATE TABLE ledger_totals (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    op_type      INTEGER NOT NULL,
+    operation_id INTEGER NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    account_id   INTEGER NOT NULL,
+    amount_acc           NOT NULL,   -- decimal TEXT or scaled INTEGER, the same as in 'ledger' table
+    value_acc            NOT NULL
+);
+DROP INDEX IF EXISTS ledger_totals_by_timestamp;
+CREATE INDEX ledger_totals_by_timestamp ON ledger_totals (timestamp);
+DROP INDEX IF EXISTS ledger_totals_by_operation_book;
+CREATE INDEX ledger_totals_by_operation_book ON ledger_totals (op_type, operation_id, book_account);
+
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (20, 'LedgerFixedPoint', 0);
+--------------------------------------------------------------------------------
+PRAGMA foreign_keys = 1;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=55 WHERE name='SchemaVersion';
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (7, 'RebuildDB', 1);
+COMMIT;
+-- Reduce file size
+VACUUM;
\ No newline at end of file
@@ -0,0 +1,8 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- JSON dictionary of SQLite pragmas that override defaults of Setup.DB_PRAGMAS, i.e. '{"mmap_size": 0}'
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (21, 'DbPragmas', '{}');
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=56 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,30 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- Quotes coverage index: intervals of days that were checked with given quote source
+DROP TABLE IF EXISTS quotes_coverage;
+CREATE TABLE quotes_coverage (
+    id          INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    asset_id    INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    currency_id INTEGER REFERENCES assets (id) ON DELETE CASCADE ON UPDATE CASCADE NOT NULL,
+    source      INTEGER NOT NULL,
+    begin_ts    INTEGER NOT NULL,
+    end_ts      INTEGER NOT NULL,
+    status      INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX quotes_coverage_idx ON quotes_coverage (asset_id, currency_id, source, begin_ts);
+-- Gaps between existing quotes were never re-downloaded before, so they are treated as days without quotes (status 2)
+INSERT INTO quotes_coverage (asset_id, currency_id, source, begin_ts, end_ts, status)
+SELECT g.asset_id, g.currency_id, g.source, g.prev_day + 86400, g.day - 86400, 2
+FROM (
+    SELECT q.asset_id, q.currency_id, q.timestamp - q.timestamp % 86400 AS day,
+        LAG(q.timestamp - q.timestamp % 86400) OVER (PARTITION BY q.asset_id, q.currency_id ORDER BY q.timestamp) AS prev_day,
+        CASE WHEN a.type_id=1 THEN 0
+             ELSE (SELECT MAX(t.quote_source) FROM asset_tickers t WHERE t.asset_id=q.asset_id AND t.currency_id=q.currency_id)
+        END AS source
+    FROM quotes q JOIN assets a ON a.id=q.asset_id
+) g
+WHERE g.source IS NOT NULL AND g.day - g.prev_day > 86400;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=57 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,183 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- View 'operation_sequence' is replaced by a table that is maintained by triggers
+DROP VIEW IF EXISTS operation_sequence;
+DROP TABLE IF EXISTS operation_sequence;
+CREATE TABLE operation_sequence (
+    op_type    INTEGER NOT NULL,
+    seq        INTEGER NOT NULL,
+    id         INTEGER NOT NULL,
+    timestamp  INTEGER NOT NULL,
+    account_id INTEGER NOT NULL,
+    subtype    INTEGER NOT NULL
+);
+INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+SELECT op_type, 1 AS seq, id, timestamp, account_id, 0 AS subtype FROM actions
+UNION ALL
+SELECT op_type, 2 AS seq, id, timestamp, account_id, type AS subtype FROM dividends
+UNION ALL
+SELECT op_type, 3 AS seq, id, timestamp, account_id, type AS subtype FROM asset_actions
+UNION ALL
+SELECT op_type, 4 AS seq, id, timestamp, account_id, 0 AS subtype FROM trades
+UNION ALL
+SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, withdrawal_account AS account_id, -1 AS subtype FROM transfers
+UNION ALL
+SELECT op_type, 5 AS seq, id, withdrawal_timestamp AS timestamp, fee_account AS account_id, 0 AS subtype FROM transfers WHERE NOT fee IS NULL
+UNION ALL
+SELECT op_type, 5 AS seq, id, deposit_timestamp AS timestamp, deposit_account AS account_id, 1 AS subtype FROM transfers
+UNION ALL
+SELECT td.op_type, 6 AS seq, td.id, da.timestamp, td.account_id, da.id AS subtype FROM deposit_actions AS da JOIN term_deposits AS td ON da.deposit_id=td.id WHERE da.action_type<=100;
+CREATE INDEX operation_sequence_idx ON operation_sequence (timestamp, seq, subtype, id);
+CREATE INDEX operation_sequence_by_id ON operation_sequence (id, op_type);
+--------------------------------------------------------------------------------
+-- Triggers that keep 'operation_sequence' table in sync with operations. They are always active (regardless of
+-- settings id = 1) as the table mirrors operations and doesn't depend on ledger state.
+DROP TRIGGER IF EXISTS actions_sequence_insert;
+CREATE TRIGGER actions_sequence_insert AFTER INSERT ON actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 1, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+
+DROP TRIGGER IF EXISTS actions_sequence_update;
+CREATE TRIGGER actions_sequence_update AFTER UPDATE OF timestamp, account_id ON actions FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS actions_sequence_delete;
+CREATE TRIGGER actions_sequence_delete AFTER DELETE ON actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS dividends_sequence_insert;
+CREATE TRIGGER dividends_sequence_insert AFTER INSERT ON dividends FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 2, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+
+DROP TRIGGER IF EXISTS dividends_sequence_update;
+CREATE TRIGGER dividends_sequence_update AFTER UPDATE OF timestamp, account_id, type ON dividends FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id, subtype = NEW.type
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS dividends_sequence_delete;
+CREATE TRIGGER dividends_sequence_delete AFTER DELETE ON dividends FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS asset_actions_sequence_insert;
+CREATE TRIGGER asset_actions_sequence_insert AFTER INSERT ON asset_actions FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 3, NEW.id, NEW.timestamp, NEW.account_id, NEW.type);
+END;
+
+DROP TRIGGER IF EXISTS asset_actions_sequence_update;
+CREATE TRIGGER asset_actions_sequence_update AFTER UPDATE OF timestamp, account_id, type ON asset_actions FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id, subtype = NEW.type
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS asset_actions_sequence_delete;
+CREATE TRIGGER asset_actions_sequence_delete AFTER DELETE ON asset_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS trades_sequence_insert;
+CREATE TRIGGER trades_sequence_insert AFTER INSERT ON trades FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 4, NEW.id, NEW.timestamp, NEW.account_id, 0);
+END;
+
+DROP TRIGGER IF EXISTS trades_sequence_update;
+CREATE TRIGGER trades_sequence_update AFTER UPDATE OF timestamp, account_id ON trades FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET timestamp = NEW.timestamp, account_id = NEW.account_id
+    WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS trades_sequence_delete;
+CREATE TRIGGER trades_sequence_delete AFTER DELETE ON trades FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS transfers_sequence_insert;
+CREATE TRIGGER transfers_sequence_insert AFTER INSERT ON transfers FOR EACH ROW
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+
+DROP TRIGGER IF EXISTS transfers_sequence_update;
+CREATE TRIGGER transfers_sequence_update
+    AFTER UPDATE OF withdrawal_timestamp, withdrawal_account, deposit_timestamp, deposit_account, fee_account, fee
+    ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.withdrawal_account, -1);
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT NEW.op_type, 5, NEW.id, NEW.withdrawal_timestamp, NEW.fee_account, 0 WHERE NOT NEW.fee IS NULL;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    VALUES (NEW.op_type, 5, NEW.id, NEW.deposit_timestamp, NEW.deposit_account, 1);
+END;
+
+DROP TRIGGER IF EXISTS transfers_sequence_delete;
+CREATE TRIGGER transfers_sequence_delete AFTER DELETE ON transfers FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS term_deposits_sequence_update;
+CREATE TRIGGER term_deposits_sequence_update AFTER UPDATE OF account_id ON term_deposits FOR EACH ROW
+BEGIN
+    UPDATE operation_sequence SET account_id = NEW.account_id WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS term_deposits_sequence_delete;
+CREATE TRIGGER term_deposits_sequence_delete AFTER DELETE ON term_deposits FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE op_type = OLD.op_type AND id = OLD.id;
+END;
+
+DROP TRIGGER IF EXISTS deposit_actions_sequence_insert;
+CREATE TRIGGER deposit_actions_sequence_insert AFTER INSERT ON deposit_actions FOR EACH ROW WHEN NEW.action_type <= 100
+BEGIN
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT op_type, 6, id, NEW.timestamp, account_id, NEW.id FROM term_deposits WHERE id = NEW.deposit_id;
+END;
+
+DROP TRIGGER IF EXISTS deposit_actions_sequence_update;
+CREATE TRIGGER deposit_actions_sequence_update
+    AFTER UPDATE OF deposit_id, timestamp, action_type ON deposit_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE id = OLD.deposit_id AND seq = 6 AND subtype = OLD.id;
+    INSERT INTO operation_sequence (op_type, seq, id, timestamp, account_id, subtype)
+    SELECT op_type, 6, id, NEW.timestamp, account_id, NEW.id FROM term_deposits
+    WHERE id = NEW.deposit_id AND NEW.action_type <= 100;
+END;
+
+DROP TRIGGER IF EXISTS deposit_actions_sequence_delete;
+CREATE TRIGGER deposit_actions_sequence_delete AFTER DELETE ON deposit_actions FOR EACH ROW
+BEGIN
+    DELETE FROM operation_sequence WHERE id = OLD.deposit_id AND seq = 6 AND subtype = OLD.id;
+END;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=58 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,9 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- Index for account-filtered selects from operation_sequence in order of operations processing
+DROP INDEX IF EXISTS operation_sequence_by_account;
+CREATE INDEX operation_sequence_by_account ON operation_sequence (account_id, timestamp, seq, subtype, id);
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=59 WHERE name='SchemaVersion';
+COMMIT;
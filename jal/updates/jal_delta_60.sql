@@ -0,0 +1,21 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- Table: holdings_snapshots to keep positions of accounts at checkpoints (see JalHoldings)
+DROP TABLE IF EXISTS holdings_snapshots;
+CREATE TABLE holdings_snapshots (
+    id           INTEGER PRIMARY KEY UNIQUE NOT NULL,
+    timestamp    INTEGER NOT NULL,
+    latest       INTEGER NOT NULL DEFAULT (0),   -- 1 for the last state of account ledger, 0 for periodic checkpoint
+    account_id   INTEGER NOT NULL,
+    book_account INTEGER NOT NULL,
+    asset_id     INTEGER NOT NULL,
+    amount_acc           NOT NULL,   -- decimal TEXT or scaled INTEGER, the same as in 'ledger' table
+    value_acc            NOT NULL
+);
+DROP INDEX IF EXISTS holdings_snapshots_by_account;
+CREATE INDEX holdings_snapshots_by_account ON holdings_snapshots (account_id, timestamp);
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=60 WHERE name='SchemaVersion';
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (7, 'RebuildDB', 1);
+COMMIT;
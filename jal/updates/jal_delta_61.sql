@@ -0,0 +1,19 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- Trigger: accounts_precision_update
+-- Fixed-point ledger amounts are scaled by account precision, so the ledger of account should be re-built after
+-- precision change
+DROP TRIGGER IF EXISTS accounts_precision_update;
+CREATE TRIGGER accounts_precision_update AFTER UPDATE OF precision ON accounts
+    FOR EACH ROW
+    WHEN OLD.precision != NEW.precision
+BEGIN
+    DELETE FROM ledger WHERE account_id = NEW.id;
+    DELETE FROM ledger_totals WHERE account_id = NEW.id;
+    DELETE FROM holdings_snapshots WHERE account_id = NEW.id;
+    UPDATE settings SET value=1 WHERE name='RebuildDB';
+END;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=61 WHERE name='SchemaVersion';
+COMMIT;
@@ -0,0 +1,8 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- Name of database backend that is used by application ('qtsql' or 'sqlite3'), empty value selects Setup.DB_BACKEND
+INSERT OR REPLACE INTO settings(id, name, value) VALUES (22, 'DbBackend', '');
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=62 WHERE name='SchemaVersion';
+COMMIT;
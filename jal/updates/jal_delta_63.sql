@@ -0,0 +1,12 @@
+BEGIN TRANSACTION;
+--------------------------------------------------------------------------------
+-- Ledger is cleared for changed accounts only, so frontier is the earliest of last ledger records of accounts
+DROP VIEW IF EXISTS frontier;
+CREATE VIEW frontier AS
+SELECT MIN(COALESCE((SELECT MAX(l.timestamp) FROM ledger l WHERE l.account_id=s.account_id), s.first_timestamp))
+    AS ledger_frontier
+FROM (SELECT account_id, MIN(timestamp) AS first_timestamp FROM operation_sequence GROUP BY account_id) s;
+--------------------------------------------------------------------------------
+-- Set new DB schema version
+UPDATE settings SET value=63 WHERE name='SchemaVersion';
+COMMIT;
@@ -3,13 +3,14 @@ import logging
 from datetime import datetime
 from jal.constants import CustomColor
 from jal.widgets.icons import JalIcon
-from PySide6.QtCore import Qt, Slot, qInstallMessageHandler, QtMsgType
+from PySide6.QtCore import Qt, Signal, Slot, qInstallMessageHandler, QtMsgType
 from PySide6.QtWidgets import QApplication, QPlainTextEdit, QLabel, QPushButton
 from PySide6.QtGui import QBrush
 
 
 # Adapter class to have custom log handler that may be passed to logger.addHandler/logger.removeHandler methods and
-# then forward all messages parent view to display them
+# then forward all messages parent view to display them. Messages may be logged from worker threads (i.e. by data
+# loaders) so they are passed via parent view signal that delivers them into GUI thread.
 class LogHandler(logging.Handler):
     def __init__(self, parent_view):
         self._parent_view = parent_view
@@ -28,13 +29,17 @@ class LogHandler(logging.Handler):
             message_color = colors[record.levelno]
         except KeyError:
             message_color = CustomColor.LightRed
-        self._parent_view.displayMessage(message, message_color)
+        self._parent_view.message_logged.emit(message, message_color)
 
 
 # A GUI class to display messages from python logging unit in a normal multi-line text area
 class LogViewer(QPlainTextEdit):
+    message_logged = Signal(str, object)   # Is emitted by log handlers in any thread
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        # Direct call in GUI thread and queued one from other threads (auto connection type)
+        self.message_logged.connect(self.displayMessage)
         self.app = QApplication.instance()
         self._logger = None     # Here an instance of current logger will be stored
         self._log_handler = LogHandler(self)
@@ -78,7 +83,7 @@ class LogViewer(QPlainTextEdit):
         except KeyError:
             message_color = CustomColor.LightRed
         message = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]} - Qt - {message}"
-        self.displayMessage(message, message_color)
+        self.message_logged.emit(message, message_color)
 
     def stopLogging(self):
         self._logger.removeHandler(self._log_handler)    # Removing handler (but it doesn't prevent exception at exit)
@@ -1,5 +1,6 @@
 import logging
 from datetime import time, datetime, timedelta, timezone
+from PySide6.QtCore import QCoreApplication
 from PySide6.QtGui import QImage
 from PySide6.QtWidgets import QApplication
 from jal.constants import Setup
@@ -26,6 +27,17 @@ def is_signal_connected(object, signal_name) -> bool:
     method_index = meta_object.indexOfSignal(signal_name)
     return object.isSignalConnected(meta_object.method(method_index))
 
+# -----------------------------------------------------------------------------------------------------------------------
+# Switches dialogs off while command-line interface runs (it may be called in a process that has GUI application)
+_headless = False
+def set_headless(headless: bool):
+    global _headless
+    _headless = headless
+
+# Returns True if application has GUI and may ask user with dialogs (False for headless command-line run)
+def is_interactive() -> bool:
+    return not _headless and isinstance(QCoreApplication.instance(), QApplication)
+
 # -----------------------------------------------------------------------------------------------------------------------
 # center given window with respect to main application window
 def center_window(window):
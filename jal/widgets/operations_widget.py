@@ -165,6 +165,7 @@ class OperationsWidget(MdiWidget):
 
     def refresh(self):
         self.balances_model.update()
+        self.operations_model.ledger_updated()
 
     @Slot()
     def assign_tag(self):
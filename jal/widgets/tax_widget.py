@@ -10,8 +10,6 @@ from jal.ui.ui_flow_export_widget import Ui_MoneyFlowWidget
 from jal.widgets.mdi import MdiWidget
 from jal.widgets.helpers import ts2d
 from jal.widgets.icons import JalIcon
-from jal.db.asset import JalAsset
-from jal.db.peer import JalPeer
 from jal.db.settings import JalSettings, FolderFor
 from jal.data_export.taxes import TaxReport
 from jal.data_export.taxes_flow import TaxesFlowRus
@@ -121,13 +119,7 @@ class TaxWidget(MdiWidget):
             return
 
         reports_xls = XLSX(self.xls_filename)
-        parameters = {
-            "period": f"{ts2d(taxes.year_begin)} - {ts2d(taxes.year_end - 1)}",
-            "account": f"{taxes.account.number()} ({JalAsset(taxes.account.currency()).symbol()})",
-            "currency": JalAsset(taxes.account.currency()).symbol(),
-            "broker_name": JalPeer(taxes.account.organization()).name(),
-            "broker_iso_country": taxes.account.country().iso_code()
-        }
+        parameters = taxes.report_parameters()
         for section in tax_report:
             reports_xls.output_data(tax_report[section], taxes.report_template(section), parameters)
         reports_xls.save()
@@ -0,0 +1,74 @@
+# Benchmark of JalDB backends (see jal/db/backend.py) on a synthetic database (see ledger_rebuild.py).
+# Every backend is used to rebuild ledger and to generate report data (holdings, balances and turnovers for every
+# month of the period). Results are verified to be identical for all backends.
+# Usage: python tests/benchmarks/db_backends.py [--operations 50000] [--months 24]
+import os
+import sys
+import argparse
+import tempfile
+from datetime import datetime
+from PySide6.QtCore import QCoreApplication
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from jal.constants import BookAccount, PredefinedCategory
+from jal.db.db import JalDB, JalDBError
+from jal.db.backend import DbBackend
+from jal.db.ledger import Ledger
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.category import JalCategory
+from ledger_rebuild import BASE_TIMESTAMP, init_db, generate_operations
+from tests.helpers import dump_ledger_tables
+
+MONTH = 2592000   # 30 days
+
+
+# Collects data that are used by typical reports: holdings, money balances and turnovers at the end of every month
+def generate_reports(months: int) -> list:
+    reports = []
+    for month in range(months):
+        begin = BASE_TIMESTAMP + month * MONTH
+        end = begin + MONTH - 1
+        for account in JalAccount.get_all_accounts():
+            reports.append([(x['asset'].id(), x['amount'], x['value']) for x in account.assets_list(end)])
+            reports.append(account.get_asset_amount(end, account.currency()))
+            reports.append(account.get_book_turnover(BookAccount.Costs, begin, end))
+            reports.append(account.get_category_turnover(PredefinedCategory.Fees, begin, end))
+        reports.append(JalCategory(PredefinedCategory.Fees).get_turnover(begin, end, 2))
+        reports.append([x['asset'].id() for x in JalAsset.get_active_assets(begin, end)])
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DB backends benchmark")
+    parser.add_argument("--operations", type=int, default=50000, help="Number of operations to generate")
+    parser.add_argument("--months", type=int, default=24, help="Number of months for reports generation")
+    args = parser.parse_args()
+    _app = QCoreApplication(sys.argv)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = tmp_dir + os.sep
+        init_db(db_path)
+        generate_operations(args.operations)
+        print(f"Operations: {JalDB._read('SELECT COUNT(id) FROM operation_sequence')}")
+        for backend in [DbBackend.QTSQL, DbBackend.SQLITE3]:
+            error = JalDB().init_db(db_path, backend=backend)
+            if error.code != JalDBError.NoError:
+                raise RuntimeError(f"Database initialization failed: {error.message} {error.details}")
+            start_time = datetime.now()
+            Ledger().rebuild(from_timestamp=0)
+            rebuild_time = (datetime.now() - start_time).total_seconds()
+            start_time = datetime.now()
+            reports = generate_reports(args.months)
+            reports_time = (datetime.now() - start_time).total_seconds()
+            print(f"{backend}: ledger rebuild {rebuild_time:.1f}s, reports {reports_time:.1f}s")
+            results[backend] = (dump_ledger_tables(), reports)
+        JalDB.close_db()
+    identical = results[DbBackend.QTSQL] == results[DbBackend.SQLITE3]
+    print(f"Results are identical: {identical}")
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Index advisor for ledger hot queries.
+# It generates a synthetic database (see ledger_rebuild.py), records every SQL query that application executes
+# during ledger rebuild and a set of typical report/UI calls, then replays these queries under EXPLAIN QUERY PLAN
+# and flags full scans of ledger tables (including skip-scans of an index, that read the whole index anyway).
+# Exit code is non-zero if any unexpected full scan was found.
+# Usage: python tests/benchmarks/index_advisor.py [--operations 20000] [--verbose]
+import os
+import re
+import sys
+import logging
+import argparse
+import tempfile
+from PySide6.QtCore import QCoreApplication
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from jal.constants import BookAccount, PredefinedCategory
+from jal.db.db import JalDB
+from jal.db.ledger import Ledger
+from jal.db.account import JalAccount
+from jal.db.asset import JalAsset
+from jal.db.category import JalCategory
+from jal.db.peer import JalPeer
+from ledger_rebuild import BASE_TIMESTAMP, init_db, generate_operations
+
+WATCHED_TABLES = ['ledger', 'ledger_totals', 'trades_opened', 'trades_closed']
+# Queries that are expected to read the whole table (text prefix of the query)
+EXPECTED_SCANS = [
+    "SELECT * FROM ledger ORDER BY id",        # dump of tables in benchmarks and tests
+    "SELECT MAX(l.id) AS id, l.asset_id, a.currency_id FROM ledger l",   # JalAsset.get_active_assets() needs all
+    # Rebuild from given timestamp - skip-scan by account is cheap as number of accounts is small
+    "DELETE FROM ledger WHERE timestamp >= :frontier",
+    "DELETE FROM trades_closed WHERE close_timestamp >= :frontier"
+]
+
+
+# Replaces JalDB._exec() with a wrapper that puts every executed query with its parameters into 'queries' dictionary
+def record_queries(queries: dict):
+    original_exec = JalDB._exec.__func__
+
+    def recorder(cls, sql_text, params=None, forward_only=True, commit=False, cached=True):
+        queries.setdefault(sql_text, params)
+        return original_exec(cls, sql_text, params, forward_only, commit, cached)
+
+    JalDB._exec = classmethod(recorder)
+    return classmethod(original_exec)
+
+
+# Calls a set of methods that query ledger tables in the same way as application reports and widgets do
+def run_workload():
+    Ledger().rebuild(from_timestamp=0)
+    begin = BASE_TIMESTAMP
+    end = Ledger().getCurrentFrontier()
+    for account in JalAccount.get_all_accounts():
+        account.assets_list(end)
+        account.balance(end)
+        account.get_asset_amount(end, account.currency())
+        account.get_book_turnover(BookAccount.Money, begin, end)
+        account.get_category_turnover(PredefinedCategory.Fees, begin, end)
+        account.get_flow(begin, end, JalAccount.MONEY_FLOW, 'in')
+        account.get_flow(begin, end, JalAccount.ASSETS_FLOW, 'out')
+        account.closed_trades_list()
+        for asset in account.assets_list(end):
+            account.open_trades_list(asset['asset'], end)
+    JalCategory(PredefinedCategory.Fees).get_turnover(begin, end, 2)
+    JalPeer(1).number_of_documents()
+    JalAsset.get_active_assets(begin, end)
+    Ledger.get_operations_by_peer(begin, end, 1)
+    Ledger.get_operations_by_category(begin, end, PredefinedCategory.Fees)
+    Ledger.get_operations_by_tag(begin, end, 1)
+
+
+# Returns a dictionary {alias: table} for tables that are mentioned in FROM/JOIN clauses of the query
+def table_aliases(sql_text: str) -> dict:
+    aliases = {}
+    for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", sql_text, re.IGNORECASE):
+        aliases[table] = table
+        if alias and alias.upper() not in ['WHERE', 'LEFT', 'JOIN', 'ON', 'GROUP', 'ORDER', 'INNER', 'LIMIT']:
+            aliases[alias] = table
+    return aliases
+
+
+# Returns a list of lines of query plan that describe full scan or skip-scan of watched tables
+def full_scans(sql_text: str, params) -> list:
+    scans = []
+    aliases = table_aliases(sql_text)
+    query = JalDB._exec("EXPLAIN QUERY PLAN " + sql_text, params)
+    if query is None:
+        return scans
+    while query.next():
+        detail = query.value(3)
+        scan = re.match(r"(SCAN|SEARCH) (\w+)", detail)
+        if scan is None or aliases.get(scan.group(2), scan.group(2)) not in WATCHED_TABLES:
+            continue
+        if scan.group(1) == "SCAN" or "ANY(" in detail:   # Full scan of table or index or skip-scan of index
+            scans.append(detail)
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index advisor for ledger queries")
+    parser.add_argument("--operations", type=int, default=20000, help="Number of operations to generate")
+    parser.add_argument("--verbose", action="store_true", help="Print query plan of every recorded query")
+    args = parser.parse_args()
+    _app = QCoreApplication(sys.argv)
+    logging.getLogger().setLevel(logging.ERROR)   # Suppress warnings about missing quotes in synthetic data
+    flagged = 0
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        init_db(tmp_dir + os.sep)
+        generate_operations(args.operations)
+        queries = {}
+        original_exec = record_queries(queries)
+        run_workload()
+        JalDB._exec = original_exec
+        _ = JalDB._exec("ANALYZE")
+        for sql_text, params in queries.items():
+            if not re.match(r"\s*(SELECT|WITH|DELETE|UPDATE)", sql_text, re.IGNORECASE):
+                continue
+            scans = full_scans(sql_text, params)
+            if args.verbose or scans:
+                print(f"{'FULL SCAN' if scans else 'OK'}: {' '.join(sql_text.split())}")
+                for scan in scans:
+                    print(f"    {scan}")
+            if scans and not any([sql_text.startswith(x) for x in EXPECTED_SCANS]):
+                flagged += 1
+        print(f"Queries checked: {len(queries)}, queries with unexpected full scans: {flagged}")
+        JalDB.connection().close()
+    if flagged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
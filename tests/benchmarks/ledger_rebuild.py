@@ -0,0 +1,130 @@
+# Benchmark of ledger rebuild on a synthetic database.
+# It generates a database with given number of operations (income/spending, trades, transfers, dividends),
+# rebuilds ledger in reference (row-by-row), batched and parallel mode and verifies that results are byte-identical.
+# Usage: python tests/benchmarks/ledger_rebuild.py [--operations 100000] [--skip-reference] [--workers 4]
+import os
+import sys
+import random
+import argparse
+import tempfile
+from shutil import copyfile
+from datetime import datetime
+from PySide6.QtCore import QCoreApplication
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+sys.path.insert(1, os.path.join(sys.path[0], 'jal'))   # Test helpers import modules of 'jal' package directly
+from jal.constants import Setup, PredefinedAccountType, PredefinedAsset, PredefinedCategory
+from jal.db.db import JalDB, JalDBError
+from jal.db.ledger import Ledger
+from jal.db.operations import Dividend
+from tests.helpers import dump_ledger_tables
+
+BASE_TIMESTAMP = 1420070400   # 01/01/2015
+ACCOUNTS = 4                  # 2 bank accounts and 2 investment accounts
+ASSETS = 20
+
+
+def init_db(db_path: str) -> None:
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    copyfile(project_root + os.sep + 'jal' + os.sep + Setup.INIT_SCRIPT_PATH, db_path + Setup.INIT_SCRIPT_PATH)
+    error = JalDB().init_db(db_path)
+    if error.code != JalDBError.NoError:
+        raise RuntimeError(f"Database initialization failed: {error.message}")
+
+
+def generate_operations(count: int) -> None:
+    db = JalDB()
+    random.seed(2023)
+    db._exec("INSERT INTO agents (pid, name) VALUES (0, 'Bank')")
+    for i in range(ACCOUNTS):
+        account_type = PredefinedAccountType.Bank if i < 2 else PredefinedAccountType.Investment
+        db._exec("INSERT INTO accounts (type_id, name, currency_id, active, number, organization_id, precision) "
+                 "VALUES (:type, :name, 2, 1, :number, 1, 2)",
+                 [(":type", account_type), (":name", f"Account {i + 1}"), (":number", f"N{i + 1}")])
+    for i in range(ASSETS):
+        db._exec("INSERT INTO assets (type_id, full_name) VALUES (:type, :name)",
+                 [(":type", PredefinedAsset.Stock), (":name", f"Stock {i}")])
+        db._exec("INSERT INTO asset_tickers (asset_id, symbol, currency_id) VALUES (last_insert_rowid(), :symbol, 2)",
+                 [(":symbol", f"S{i}")])
+    first_asset = db._read("SELECT MIN(id) FROM assets WHERE type_id=:type", [(":type", PredefinedAsset.Stock)])
+    db.enable_triggers(False)
+    db.connection().transaction()
+    actions, details, trades, transfers, dividends = [], [], [], [], []
+    for i in range(ACCOUNTS):   # starting balances
+        actions.append((BASE_TIMESTAMP, i + 1, 1))
+        details.append((len(actions), PredefinedCategory.StartingBalance, '1000000'))
+    timestamp = BASE_TIMESTAMP
+    for i in range(count - ACCOUNTS):
+        timestamp += random.choice([0, 60, 3600])
+        kind = random.random()
+        if kind < 0.4:
+            actions.append((timestamp, random.randint(1, 2), 1))
+            amount = f"{random.randint(-50000, 20000) / 100:.2f}"
+            details.append((len(actions), random.choice([5, 6, 8]), amount))
+        elif kind < 0.85:
+            qty = random.choice([-3, -2, -1, 1, 2, 3, 5])
+            trades.append((timestamp, timestamp, random.randint(3, 4), first_asset + random.randint(0, ASSETS - 1),
+                           str(qty), f"{random.randint(1000, 20000) / 100:.2f}", f"{random.randint(0, 300) / 100:.2f}"))
+        elif kind < 0.95:
+            amount = f"{random.randint(100, 100000) / 100:.2f}"
+            source, target = random.sample(range(1, ACCOUNTS + 1), 2)
+            transfers.append((timestamp, source, amount, timestamp, target, amount))
+        else:
+            dividends.append((timestamp, Dividend.Dividend, random.randint(3, 4),
+                              first_asset + random.randint(0, ASSETS - 1),
+                              f"{random.randint(100, 10000) / 100:.2f}", f"{random.randint(0, 100) / 100:.2f}"))
+    db._exec_many("INSERT INTO actions (timestamp, account_id, peer_id) VALUES (?, ?, ?)", actions)
+    db._exec_many("INSERT INTO action_details (pid, category_id, amount) VALUES (?, ?, ?)", details)
+    db._exec_many("INSERT INTO trades (timestamp, settlement, account_id, asset_id, qty, price, fee) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?)", trades)
+    db._exec_many("INSERT INTO transfers (withdrawal_timestamp, withdrawal_account, withdrawal, "
+                  "deposit_timestamp, deposit_account, deposit) VALUES (?, ?, ?, ?, ?, ?)", transfers)
+    db._exec_many("INSERT INTO dividends (timestamp, type, account_id, asset_id, amount, tax) "
+                  "VALUES (?, ?, ?, ?, ?, ?)", dividends)
+    db.commit()
+    db.enable_triggers(True)
+
+
+def timed_rebuild(batched: bool, workers: int = 1) -> float:
+    start_time = datetime.now()
+    Ledger().rebuild(from_timestamp=0, batched=batched, workers=workers)
+    return (datetime.now() - start_time).total_seconds()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ledger rebuild benchmark")
+    parser.add_argument("--operations", type=int, default=100000, help="Number of operations to generate")
+    parser.add_argument("--skip-reference", action="store_true", help="Don't run row-by-row reference rebuild")
+    parser.add_argument("--workers", type=int, default=ACCOUNTS, help="Number of processes for parallel rebuild")
+    args = parser.parse_args()
+    _app = QCoreApplication(sys.argv)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        init_db(tmp_dir + os.sep)
+        generate_operations(args.operations)
+        print(f"Operations: {JalDB._read('SELECT COUNT(id) FROM operation_sequence')}")
+        reference = None
+        if not args.skip_reference:
+            elapsed = timed_rebuild(batched=False)
+            reference = dump_ledger_tables()
+            print(f"Row-by-row rebuild: {elapsed:.1f}s, ledger rows: {len(reference['ledger'])}")
+        elapsed = timed_rebuild(batched=True)
+        print(f"Batched rebuild: {elapsed:.1f}s")
+        stats = JalDB.statement_cache_stats()
+        print(f"Prepared queries cache: {stats['size']} queries, hit rate {stats['hit_rate']:.1%}")
+        if reference is not None:
+            identical = dump_ledger_tables() == reference
+            print(f"Results are identical: {identical}")
+            if not identical:
+                sys.exit(1)
+        reference = dump_ledger_tables()
+        elapsed = timed_rebuild(batched=True, workers=args.workers)
+        print(f"Parallel rebuild ({args.workers} workers): {elapsed:.1f}s")
+        identical = dump_ledger_tables() == reference
+        print(f"Results are identical: {identical}")
+        if not identical:
+            sys.exit(1)
+        JalDB.connection().close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 from decimal import Decimal
 from datetime import datetime, timezone
 from jal.db.asset import JalAsset
-from jal.db.operations import LedgerTransaction, Dividend
+from jal.db.db import JalDB
+from jal.db.operations import LedgerTransaction, Dividend, TermDeposit
 from constants import PredefinedAsset
 
 
@@ -147,3 +148,25 @@ def create_transfers(transfers):
                 'deposit_timestamp': transfer[0],'deposit_account': transfer[3], 'deposit': transfer[4],
                 'asset': transfer[5]}
         LedgerTransaction.create_new(LedgerTransaction.Transfer, data)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Create term deposits for given account_id in database: deposits is a list of tuples
+# (note, [(timestamp, action_type, amount), (timestamp, action_type, amount), ...])
+def create_term_deposits(account_id, deposits):
+    for deposit in deposits:
+        actions = [{'timestamp': x[0], 'action_type': x[1], 'amount': x[2]} for x in deposit[1]]
+        data = {'account_id': account_id, 'note': deposit[0], 'actions': actions}
+        JalDB().create_operation(TermDeposit._db_table, TermDeposit._db_fields, data)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Returns content of all tables that are filled by ledger rebuild
+def dump_ledger_tables() -> dict:
+    tables = {}
+    for table in ['ledger', 'ledger_totals', 'trades_opened', 'trades_closed']:
+        tables[table] = []
+        query = JalDB._exec(f"SELECT * FROM {table} ORDER BY id")
+        while query.next():
+            tables[table].append(JalDB._read_record(query))
+    return tables
@@ -1,13 +1,19 @@
+import os
+import time
+import threading
 import pandas as pd
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
 from decimal import Decimal
 from pandas._testing import assert_frame_equal
 
-from tests.fixtures import project_root, data_path, prepare_db, prepare_db_moex
-from tests.helpers import d2t, create_stocks, create_assets
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_moex, prepare_db_fifo
+from tests.helpers import d2t, create_stocks, create_assets, create_trades
 from jal.db.asset import JalAsset
-from jal.constants import PredefinedAsset
-from jal.net.helpers import isEnglish
+from jal.db.ledger import Ledger
+from jal.constants import Setup, PredefinedAsset, MarketDataFeed, QuoteCoverage
+from jal.net.helpers import isEnglish, close_sessions, trim_cache
 from jal.net.downloader import QuoteDownloader
 from jal.data_import.receipt_api.ru_fns import ReceiptRuFNS
 
@@ -265,3 +271,143 @@ def test_Coinbase_downloader(prepare_db):
     downloader = QuoteDownloader()
     quotes_downloaded = downloader.Coinbase_Downloader(JalAsset(4), 3, d2t(230412), d2t(230414))
     assert_frame_equal(quotes, quotes_downloaded)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+# HTTP server that imitates Yahoo, CBR and Coinbase web-services for offline tests. It fails the first request for every
+# path that contains 'RETRY' and tracks max number of requests that were processed concurrently.
+class StubHandler(BaseHTTPRequestHandler):
+    yahoo = {'AAA': ["2021-04-13,1,1,1,10.5,1,1", "2021-04-14,1,1,1,11.5,1,1"],
+             'BBB': ["2021-04-13,1,1,1,20.5,1,1", "2021-04-14,1,1,1,21.5,1,1"],
+             'RETRY': ["2021-04-14,1,1,1,30.5,1,1"]}
+    cbr_codes = "<Valuta><Item><ParentCode>R01235    </ParentCode><ISO_Char_Code>USD</ISO_Char_Code></Item>" \
+                "<Item><ParentCode>R01239    </ParentCode><ISO_Char_Code>EUR</ISO_Char_Code></Item></Valuta>"
+    cbr_rates = {'R01235': '<ValCurs><Record Date="14.04.2021"><Nominal>1</Nominal><Value>77,2535</Value></Record>'
+                           '</ValCurs>',
+                 'R01239': '<ValCurs><Record Date="14.04.2021"><Nominal>1</Nominal><Value>92,3684</Value></Record>'
+                           '</ValCurs>'}
+    coinbase = {'2021-04-12': '60000.5', '2021-04-13': '63000.5', '2021-04-14': '64000.5', '2021-04-16': '61000.5'}
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+    failed = set()
+    requests = []
+
+    def do_GET(self):
+        with StubHandler.lock:
+            StubHandler.active += 1
+            StubHandler.max_active = max(StubHandler.max_active, StubHandler.active)
+            StubHandler.requests.append(self.path)
+        time.sleep(0.2)
+        url = urlsplit(self.path)
+        status, reply = 404, ''
+        if url.path.startswith("/v7/finance/download/"):
+            symbol = url.path.split('/')[-1]
+            if symbol == 'RETRY' and symbol not in StubHandler.failed:
+                StubHandler.failed.add(symbol)
+                status = 503
+            elif symbol in self.yahoo:
+                status, reply = 200, "\n".join(["Date,Open,High,Low,Close,Adj Close,Volume"] + self.yahoo[symbol])
+        elif url.path == "/scripts/XML_valFull.asp":
+            status, reply = 200, self.cbr_codes
+        elif url.path == "/scripts/XML_dynamic.asp":
+            status, reply = 200, self.cbr_rates[parse_qs(url.query)['VAL_NM_RQ'][0]]
+        elif url.path == "/v2/prices/BTC-USD/spot":
+            date = parse_qs(url.query)['date'][0]
+            if date in self.coinbase:
+                status, reply = 200, f'{{"data":{{"base":"BTC","currency":"USD","amount":"{self.coinbase[date]}"}}}}'
+        self.send_response(status)
+        self.end_headers()
+        self.wfile.write(reply.encode('utf-8'))
+        with StubHandler.lock:
+            StubHandler.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_concurrent_download(prepare_db_fifo, monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(QuoteDownloader, 'YAHOO_URL', stub_url)
+    monkeypatch.setattr(QuoteDownloader, 'CBR_URL', stub_url)
+    monkeypatch.setattr(Setup, 'NET_BACKOFF', 0.01)
+    close_sessions()
+    try:
+        create_assets([('AAA', 'A', '', 2, PredefinedAsset.Stock, 0),     # ID = 4
+                       ('BBB', 'B', '', 2, PredefinedAsset.Stock, 0),     # ID = 5
+                       ('RETRY', 'R', '', 2, PredefinedAsset.Stock, 0),   # ID = 6
+                       ('NONE', 'N', '', 2, PredefinedAsset.Stock, 0)])   # ID = 7
+        for asset_id in range(4, 8):
+            JalAsset(asset_id).add_symbol(JalAsset(asset_id).symbol(2), 2, '', MarketDataFeed.US)
+            create_trades(1, [(d2t(210101), d2t(210101), asset_id, 1.0, 10.0, 0.0)])
+        Ledger().rebuild(from_timestamp=0)
+
+        QuoteDownloader().DownloadData(d2t(210413), d2t(210414), [MarketDataFeed.US, MarketDataFeed.FX])
+        assert JalAsset(4).quote(d2t(210414), 2) == (d2t(210414), Decimal('11.5'))
+        assert JalAsset(5).quote(d2t(210414), 2) == (d2t(210414), Decimal('21.5'))
+        assert JalAsset(6).quote(d2t(210414), 2) == (d2t(210414), Decimal('30.5'))   # Loaded after retry
+        assert JalAsset(7).quote(d2t(210414), 2) == (0, Decimal('0'))
+        assert JalAsset(2).quote(d2t(210415), 1) == (d2t(210414), Decimal('77.2535'))
+        assert JalAsset(3).quote(d2t(210415), 1) == (d2t(210414), Decimal('92.3684'))
+        assert StubHandler.max_active > 1
+
+        StubHandler.requests = []   # Covered days aren't downloaded again, failed download is retried
+        QuoteDownloader().DownloadData(d2t(210413), d2t(210414), [MarketDataFeed.US, MarketDataFeed.FX])
+        assert [urlsplit(x).path for x in StubHandler.requests] == ["/v7/finance/download/NONE"]
+    finally:
+        close_sessions()
+        server.shutdown()
+        server.server_close()
+
+
+def test_daily_download(prepare_db_fifo, monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(QuoteDownloader, 'COINBASE_URL', f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setattr(Setup, 'NET_CACHE_PATH', 'net_cache_test')
+    close_sessions()
+    try:
+        create_assets([('BTC', 'Bitcoin', '', 2, PredefinedAsset.Crypto, 0)])   # ID = 4
+        JalAsset(4).add_symbol('BTC', 2, '', MarketDataFeed.COIN)
+        create_trades(1, [(d2t(210101), d2t(210101), 4, 1.0, 10.0, 0.0)])
+        Ledger().rebuild(from_timestamp=0)
+        JalAsset(4).set_quotes([{'timestamp': d2t(210413), 'quote': Decimal('63000')}], 2)
+
+        StubHandler.requests = []
+        QuoteDownloader().DownloadData(d2t(210412), d2t(210415), [MarketDataFeed.COIN])
+        assert sorted([parse_qs(urlsplit(x).query)['date'][0] for x in StubHandler.requests]) == \
+               ['2021-04-12', '2021-04-14', '2021-04-15']   # Only days without quotes are requested
+        assert JalAsset(4).quotes(d2t(210412), d2t(210415), 2) == [(d2t(210412), Decimal('60000.5')),
+                                                                   (d2t(210413), Decimal('63000')),
+                                                                   (d2t(210414), Decimal('64000.5'))]
+
+        StubHandler.requests = []   # Repeated download takes replies from disk cache, failed request isn't cached
+        quotes = QuoteDownloader().Coinbase_Downloader(JalAsset(4), 2, d2t(210412), d2t(210415),
+                                                        days=[d2t(210412), d2t(210414), d2t(210415)])
+        assert StubHandler.requests == ["/v2/prices/BTC-USD/spot?date=2021-04-15"]
+        assert quotes['Close'].tolist() == [Decimal('60000.5'), Decimal('64000.5')]
+        assert quotes.attrs['failed_days'] == [d2t(210415)]
+
+        # Day without reply is requested again later even if there is a quote after it
+        StubHandler.requests = []
+        QuoteDownloader().DownloadData(d2t(210415), d2t(210416), [MarketDataFeed.COIN])
+        assert sorted(StubHandler.requests) == ["/v2/prices/BTC-USD/spot?date=2021-04-15",
+                                                "/v2/prices/BTC-USD/spot?date=2021-04-16"]
+        assert JalAsset(4).quotes_coverage(2).status(d2t(210415)) == QuoteCoverage.Failed
+
+        # Cache is kept in database folder and is trimmed by age and by size of replies
+        cache_folder = os.path.join(str(tmp_path), 'net_cache_test')
+        files = sorted(os.listdir(cache_folder))
+        assert len(files) == 3
+        os.utime(os.path.join(cache_folder, files[0]), (0, 0))
+        trim_cache()
+        assert sorted(os.listdir(cache_folder)) == files[1:]
+        monkeypatch.setattr(Setup, 'NET_CACHE_SIZE', 0)
+        trim_cache()
+        assert os.listdir(cache_folder) == []
+    finally:
+        close_sessions()
+        server.shutdown()
+        server.server_close()
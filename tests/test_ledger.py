@@ -1,14 +1,19 @@
+import pytest
 from decimal import Decimal
 
 from tests.fixtures import project_root, data_path, prepare_db, prepare_db_fifo, prepare_db_ledger
 from tests.helpers import d2t, create_stocks, create_actions, create_trades, create_quotes, \
-    create_corporate_actions, create_stock_dividends, create_transfers
-from constants import BookAccount, PredefinedAccountType
+    create_corporate_actions, create_stock_dividends, create_transfers, create_term_deposits, dump_ledger_tables
+from constants import BookAccount, PredefinedAccountType, PredefinedCategory, PredefinedAsset, DepositActions
+from jal.db.db import JalDB
+from jal.db.backend import DbBackend
 from jal.db.ledger import Ledger, LedgerAmounts
 from jal.db.account import JalAccount
+from jal.db.holdings import JalHoldings
 from jal.db.asset import JalAsset
 from jal.db.peer import JalPeer
-from jal.db.operations import LedgerTransaction, Dividend
+from jal.db.operations import LedgerTransaction, LedgerError, Dividend, CorporateAction
+from jal.db.closed_trade import JalClosedTrade
 
 
 #-----------------------------------------------------------------------------------------------------------------------
@@ -475,3 +480,415 @@ def test_asset_transfer(prepare_db):
     trades = JalAccount(2).closed_trades_list()
     assert len(trades) == 1
     assert sum([x.profit() for x in trades]) == Decimal('995')
+
+
+# Creates a set of operations in 2 accounts (with asset transfer between them) that is used to test ledger rebuild
+def create_rebuild_operations():
+    JalPeer(data={'name': 'Test Peer', 'parent': 0}, create=True)
+    JalAccount(data={'type': PredefinedAccountType.Investment, 'name': 'account.USD', 'number': 'U7654321',
+                     'currency': 2, 'active': 1, 'organization': 1, 'precision': 10}, create=True)
+    JalAccount(data={'type': PredefinedAccountType.Investment, 'name': 'account.RUB', 'number': 'U7654321',
+                     'currency': 1, 'active': 1, 'organization': 1, 'precision': 10}, create=True)
+    create_actions([(d2t(220101), 1, 1, [(4, 10000.0)]), (d2t(220101), 2, 1, [(4, 50000.0)])])
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE'), ('C', 'C SHARE')], currency_id=2)   # id = 4, 5, 6
+    JalAsset(4).add_symbol('A.RUB', 1, '')
+    create_trades(1, [
+        (d2t(220201), d2t(220203), 4, 2.0, 100.0, 1.0),
+        (d2t(220201), d2t(220203), 4, 3.0, 101.0, 1.0),    # the same timestamp as previous one
+        (d2t(220201), d2t(220203), 5, 10.0, 10.0, 0.5),
+        (d2t(220202), d2t(220204), 5, -4.0, 12.0, 0.5),
+        (d2t(220203), d2t(220205), 5, -3.0, 11.0, 0.5),
+        (d2t(220204), d2t(220206), 6, -5.0, 20.0, 0.5),    # short position
+        (d2t(220210), d2t(220212), 6, 5.0, 18.0, 0.5),
+        (d2t(220301), d2t(220303), 5, -6.0, 9.0, 0.5)      # closes long position and opens short one
+    ])
+    create_corporate_actions(1, [(d2t(220215), 4, 5, 3.0, 'Split B 3 -> 6', [(5, 6.0, 1.0)])])
+    create_transfers([(d2t(220207), 1, 5.0, 2, 37500.0, 4)])
+    create_trades(2, [(d2t(220211), d2t(220213), 4, -4.0, 8000.0, 5.0)])
+    create_term_deposits(2, [('Deposit', [(d2t(220110), DepositActions.Opening, 10000.0),
+                                          (d2t(220301), DepositActions.InterestAccrued, 100.0),
+                                          (d2t(220301), DepositActions.TaxWithheld, 13.0),
+                                          (d2t(220302), DepositActions.Closing, 0.0)])])
+
+
+def test_batched_rebuild(prepare_db):
+    create_rebuild_operations()
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0, batched=False)
+    expected = dump_ledger_tables()
+    assert len(expected['trades_closed']) > 0
+    ledger.rebuild(from_timestamp=0, batched=True)
+    assert dump_ledger_tables() == expected
+
+    # Check partial rebuild that should take into account ledger data and open trades before frontier
+    ledger.rebuild(from_timestamp=d2t(220210), batched=False)
+    expected = dump_ledger_tables()
+    ledger.rebuild(from_timestamp=d2t(220210), batched=True)
+    assert dump_ledger_tables() == expected
+
+
+def test_incremental_rebuild(prepare_db, monkeypatch):
+    create_rebuild_operations()
+    JalAccount(data={'type': PredefinedAccountType.Investment, 'name': 'account.other', 'number': 'U1234567',
+                     'currency': 2, 'active': 1, 'organization': 1, 'precision': 10}, create=True)   # id = 3
+    JalAccount(data={'type': PredefinedAccountType.Cash, 'name': 'account.empty', 'number': '',
+                     'currency': 2, 'active': 1, 'organization': 1, 'precision': 2}, create=True)    # id = 4
+    create_actions([(d2t(220101), 3, 1, [(4, 1000.0)]), (d2t(220401), 3, 1, [(5, -100.0)])])
+    create_trades(3, [(d2t(220102), d2t(220104), 4, 1.0, 100.0, 1.0)])
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    query = JalDB._exec("SELECT * FROM ledger WHERE account_id=3 ORDER BY id")
+    untouched = []
+    while query.next():
+        untouched.append(JalDB._read_record(query))
+
+    # Back-dated trade in account 1 should invalidate account 1 and account 2 (via asset transfer) but not account 3
+    create_trades(1, [(d2t(220205), d2t(220207), 4, 1.0, 105.0, 1.0)])
+    assert JalDB._read("SELECT COUNT(id) FROM ledger WHERE account_id=3") == len(untouched)
+    accounts = ledger._get_invalidated_accounts()
+    assert accounts[1] < d2t(220205) and accounts[2] == d2t(220207) and accounts[3] == d2t(220401)
+    assert 4 not in accounts    # Account without operations doesn't move frontier back
+    assert ledger.getCurrentFrontier() == accounts[1]
+    preloaded = []   # operations that were loaded for rebuild
+    preload = LedgerTransaction.preload
+
+    def tracked_preload(timestamp=0, operations=None, totals=False):
+        preloaded.append(operations)
+        return preload(timestamp, operations, totals)
+
+    monkeypatch.setattr(LedgerTransaction, "preload", tracked_preload)
+    ledger.rebuild()
+    monkeypatch.undo()
+    assert len(preloaded) == 1 and len(preloaded[0]) == JalDB._read(
+        f"SELECT COUNT(*) FROM operation_sequence WHERE {ledger._accounts_condition(accounts[1], accounts)}")
+    query = JalDB._exec("SELECT * FROM ledger WHERE account_id=3 ORDER BY id")
+    ledger_rows = []
+    while query.next():
+        ledger_rows.append(JalDB._read_record(query))
+    # Records before account frontier are kept intact, records at frontier are re-created with the same values
+    assert [x for x in ledger_rows if x[1] < d2t(220401)] == [x for x in untouched if x[1] < d2t(220401)]
+    assert [x[1:] for x in ledger_rows] == [x[1:] for x in untouched]
+    # Result should be the same as after full rebuild (apart from records ids)
+    actual = dump_ledger_tables()
+    ledger.rebuild(from_timestamp=0)
+    expected = dump_ledger_tables()
+    for table in expected:
+        assert sorted([x[1:] for x in actual[table]], key=str) == sorted([x[1:] for x in expected[table]], key=str)
+
+def test_parallel_rebuild(prepare_db):
+    create_rebuild_operations()
+    JalAccount(data={'type': PredefinedAccountType.Investment, 'name': 'account.other', 'number': 'U1234567',
+                     'currency': 2, 'active': 1, 'organization': 1, 'precision': 10}, create=True)   # id = 3
+    create_actions([(d2t(220101), 3, 1, [(4, 1000.0)]), (d2t(220401), 3, 1, [(5, -100.0)])])
+    create_trades(3, [(d2t(220102), d2t(220104), 4, 1.0, 100.0, 1.0), (d2t(220202), d2t(220204), 4, -1.0, 110.0, 1.0)])
+    ledger = Ledger()
+    assert ledger._get_account_groups() == {1: 2, 2: 2}
+    ledger.rebuild(from_timestamp=0)
+    expected = dump_ledger_tables()
+    ledger.rebuild(from_timestamp=0, workers=2)
+    assert dump_ledger_tables() == expected
+
+    ledger.rebuild(from_timestamp=d2t(220210))
+    expected = dump_ledger_tables()
+    ledger.rebuild(from_timestamp=d2t(220210), workers=2)
+    assert dump_ledger_tables() == expected
+
+    # Failure in one group stops other groups and leaves the same ledger as serial rebuild does
+    create_actions([(d2t(220205), 3, 1, [])])   # Action without details can't be processed
+    with pytest.raises(LedgerError):
+        ledger.rebuild(from_timestamp=0)
+    expected = dump_ledger_tables()
+    assert max([x[1] for x in expected['ledger']]) < d2t(220205)
+    with pytest.raises(LedgerError):
+        ledger.rebuild(from_timestamp=0, workers=2)
+    assert dump_ledger_tables() == expected
+
+def test_ledger_flush_failure(prepare_db_fifo):
+    create_actions([(d2t(220101), 1, 1, [(5, -10.0)]), (d2t(220102), 1, 1, [(5, -20.0)])])
+    _ = JalDB._exec("CREATE TEMP TRIGGER fail_ledger_insert BEFORE INSERT ON ledger BEGIN SELECT RAISE(ABORT, 'Fail'); END")
+    try:
+        ledger = Ledger()
+        ledger.BATCH_SIZE = 1    # Buffered rows are written during processing of operations
+        with pytest.raises(LedgerError):
+            ledger.rebuild(from_timestamp=0)
+        ledger = Ledger()        # Buffered rows are written after processing of all operations
+        ledger.rebuild(from_timestamp=0)
+        assert JalDB._read("SELECT COUNT(*) FROM ledger") == 0
+        assert JalDB._read("SELECT value FROM settings WHERE name='TriggersEnabled'") == 1
+    finally:
+        _ = JalDB._exec("DROP TRIGGER fail_ledger_insert")
+    Ledger().rebuild(from_timestamp=0)
+    assert JalDB._read("SELECT COUNT(*) FROM ledger") > 0
+
+
+def test_operations_preload(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)   # id = 4, 5
+    create_actions([(d2t(220102), 1, 1, [(5, -10.0, 'fee'), (8, 25.0, 'interest')])])
+    create_trades(1, [(d2t(220103), d2t(220105), 4, 10.0, 100.0, 1.0)])
+    create_stock_dividends([(Dividend.StockDividend, d2t(220110), 1, 4, 1.0, 2, 105.0, 0.0, 'Stock dividend +1 A')])
+    create_corporate_actions(1, [(d2t(220115), 3, 4, 11.0, 'Symbol change A -> B', [(5, 11.0, 1.0)])])
+    JalAccount(data={'type': PredefinedAccountType.Bank, 'name': 'Bank', 'number': 'B1', 'currency': 2,
+                     'active': 1, 'organization': 1}, create=True)
+    create_transfers([(d2t(220120), 1, 100.0, 2, 100.0, None)])
+    create_term_deposits(2, [('Deposit', [(d2t(220121), DepositActions.Opening, 500.0),
+                                          (d2t(220125), DepositActions.Closing, 0.0)])])
+
+    preloaded = LedgerTransaction.preload(d2t(220102))
+    assert len(preloaded) == 6
+    sequence = Ledger.get_operations_sequence(d2t(220101), d2t(220131))
+    assert len(sequence) == 8
+    for item in sequence:
+        operation = LedgerTransaction.get_operation(item['op_type'], item['id'], item['subtype'])
+        preloaded_operation = LedgerTransaction.get_operation(item['op_type'], item['id'], item['subtype'],
+                                                              preloaded=preloaded[(item['op_type'], item['id'])])
+        assert preloaded_operation._data == operation._data
+        assert preloaded_operation.timestamp() == operation.timestamp()
+        assert preloaded_operation.description() == operation.description()
+        assert preloaded_operation.view_rows() == operation.view_rows()
+
+    # Operations before given timestamp shouldn't be loaded
+    assert len(LedgerTransaction.preload(d2t(220115))) == 3
+
+    # Load only given operations together with their ledger totals
+    Ledger().rebuild(from_timestamp=0)
+    operations = [(x['op_type'], x['id']) for x in sequence]
+    preloaded = LedgerTransaction.preload(operations=operations[2:], totals=True)
+    assert sorted(preloaded.keys()) == sorted(set(operations[2:]))
+    for item in sequence[2:]:
+        operation = LedgerTransaction.get_operation(item['op_type'], item['id'], item['subtype'])
+        preloaded_operation = LedgerTransaction.get_operation(item['op_type'], item['id'], item['subtype'],
+                                                              preloaded=preloaded[(item['op_type'], item['id'])])
+        assert preloaded_operation._totals is not None
+        assert preloaded_operation.value_change() == operation.value_change()
+        assert preloaded_operation.value_total() == operation.value_total()
+
+
+def test_operations_sequence(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE')], currency_id=2)   # id = 4
+    create_actions([(d2t(220102), 1, 1, [(5, -10.0, 'fee')])])
+    create_trades(1, [(d2t(220103), d2t(220105), 4, 10.0, 100.0, 1.0)])
+    create_stock_dividends([(Dividend.StockDividend, d2t(220110), 1, 4, 1.0, 2, 105.0, 0.0, 'Stock dividend +1 A')])
+    JalAccount(data={'type': PredefinedAccountType.Bank, 'name': 'Bank', 'number': 'B1', 'currency': 2,
+                     'active': 1, 'organization': 1}, create=True)
+    create_transfers([(d2t(220120), 1, 100.0, 2, 100.0, None)])
+    create_term_deposits(2, [('Deposit', [(d2t(220121), DepositActions.Opening, 500.0),
+                                          (d2t(220125), DepositActions.Closing, 0.0)])])
+
+    def sequence():
+        return [(x['op_type'], x['id'], x['timestamp'], x['account_id'], x['subtype'])
+                for x in Ledger.get_operations_sequence(d2t(220101), d2t(221231))]
+
+    assert sequence() == [(1, 2, d2t(220102), 1, 0), (3, 1, d2t(220103), 1, 0), (2, 1, d2t(220110), 1, 3),
+                          (4, 1, d2t(220120), 1, -1), (4, 1, d2t(220120), 2, 1), (6, 1, d2t(220121), 2, 1),
+                          (6, 1, d2t(220125), 2, 2)]
+    # Table is kept in sync with operations by triggers
+    _ = JalDB._exec("UPDATE trades SET timestamp=:timestamp WHERE id=1", [(":timestamp", d2t(220111))])
+    _ = JalDB._exec("UPDATE transfers SET fee_account=2, fee='1' WHERE id=1")
+    _ = JalDB._exec("DELETE FROM deposit_actions WHERE id=2")
+    _ = JalDB._exec("DELETE FROM actions WHERE id=2")
+    assert sequence() == [(2, 1, d2t(220110), 1, 3), (3, 1, d2t(220111), 1, 0), (4, 1, d2t(220120), 1, -1),
+                          (4, 1, d2t(220120), 2, 0), (4, 1, d2t(220120), 2, 1), (6, 1, d2t(220121), 2, 1)]
+    _ = JalDB._exec("DELETE FROM term_deposits WHERE id=1")
+    assert len(sequence()) == 5
+    # Sequence may be read page by page
+    pages = [Ledger.get_operations_sequence(d2t(220101), d2t(221231), limit=2)]
+    while len(pages[-1]) == 2:
+        pages.append(Ledger.get_operations_sequence(d2t(220101), d2t(221231), after=pages[-1][-1], limit=2))
+    assert [(x['op_type'], x['id'], x['subtype']) for page in pages for x in page] == \
+           [(x[0], x[1], x[4]) for x in sequence()]
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert JalAccount(2).last_operation_date() == d2t(220120)
+    # Consistency check finds and repairs missing and duplicated records
+    ledger = Ledger()
+    assert ledger.check_operations_sequence(repair=False) == 0
+    _ = JalDB._exec("DELETE FROM operation_sequence WHERE op_type=2 AND timestamp=:timestamp",
+                    [(":timestamp", d2t(220110))])
+    _ = JalDB._exec("INSERT INTO operation_sequence SELECT * FROM operation_sequence WHERE op_type=3 AND "
+                    "timestamp=:timestamp", [(":timestamp", d2t(220111))])
+    assert ledger.check_operations_sequence(repair=False) == 2
+    assert ledger.check_operations_sequence() == 2
+    assert ledger.check_operations_sequence(repair=False) == 0
+    assert len(sequence()) == 5
+
+
+def test_balance_history(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)   # id = 4, 5
+    create_quotes(4, 2, [(d2t(220101), 100.0), (d2t(220105), 105.0), (d2t(220120), 95.0)])
+    create_quotes(5, 2, [(d2t(220103), 50.0), (d2t(220125), 55.0)])
+    create_trades(1, [(d2t(220103), d2t(220105), 4, 10.0, 100.0, 1.0), (d2t(220104), d2t(220106), 5, 20.0, 50.0, 1.0),
+                      (d2t(220110), d2t(220112), 4, -4.0, 104.0, 1.0), (d2t(220115), d2t(220117), 5, -20.0, 52.0, 1.0),
+                      (d2t(220121), d2t(220123), 4, 500.0, 95.0, 1.0)])   # The last trade creates a debt
+    create_actions([(d2t(220112), 1, 1, [(5, -25.0, 'fee')])])
+    Ledger().rebuild(from_timestamp=0)
+
+    account = JalAccount(1)
+    timestamps = [d2t(211230) + i * 43200 for i in range(70)]
+    money, assets = account.balance_history(timestamps)
+    for timestamp, money_value, assets_value in zip(timestamps, money, assets):
+        expected_assets = sum([x['amount'] * x['asset'].quote(timestamp, 2)[1] for x in account.assets_list(timestamp)])
+        assert money_value == account.get_asset_amount(timestamp, 2)
+        assert assets_value == expected_assets
+        assert account.balance(timestamp) == money_value + assets_value
+    assert money[-1] < Decimal('0')
+    assert account.balance_history([]) == ([], [])
+
+
+def test_account_turnovers(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE')], currency_id=2)   # id = 4
+    create_trades(1, [(d2t(220103), d2t(220105), 4, 10.0, 100.0, 1.0), (d2t(220210), d2t(220212), 4, -4.0, 104.0, 1.0),
+                      (d2t(220315), d2t(220317), 4, -6.0, 90.0, 1.0)])
+    create_actions([(d2t(220201), 1, 1, [(5, -25.0, 'fee')]), (d2t(220301), 1, 1, [(5, -5.0, 'fee')])])
+    JalAccount(data={'type': PredefinedAccountType.Bank, 'name': 'Bank', 'number': 'B1', 'currency': 2,
+                     'active': 1, 'organization': 1}, create=True)
+    create_transfers([(d2t(220120), 1, 100.0, 2, 100.0, None)])
+    Ledger().rebuild(from_timestamp=0)
+
+    account = JalAccount(1)
+    categories = [PredefinedCategory.Fees, PredefinedCategory.Profit, PredefinedCategory.Dividends]
+    periods = [(d2t(220103), d2t(220103)), (d2t(220101), d2t(220131)), (d2t(220201), d2t(220228)),
+               (d2t(220301), d2t(220331)), (d2t(220101), d2t(220331)), (d2t(220401), d2t(220430))]
+    books, turnovers = account.get_turnovers(periods, [BookAccount.Transfers], categories)
+    for i, (begin, end) in enumerate(periods):
+        assert books[BookAccount.Transfers][i] == account.get_book_turnover(BookAccount.Transfers, begin, end)
+        for category_id in categories:
+            assert turnovers[category_id][i] == account.get_category_turnover(category_id, begin, end)
+    assert turnovers[PredefinedCategory.Fees][4] == Decimal('33')
+    assert turnovers[PredefinedCategory.Profit][4] != Decimal('0')
+    assert books[BookAccount.Transfers][1] == Decimal('100')
+    assert account.get_turnovers([], [BookAccount.Transfers], categories) == ({BookAccount.Transfers: []},
+                                                                              {x: [] for x in categories})
+
+
+def test_holdings_snapshots(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)   # id = 4, 5
+    create_trades(1, [(d2t(220103), d2t(220105), 4, 10.0, 100.0, 1.0), (d2t(220204), d2t(220206), 5, 20.0, 50.0, 1.0),
+                      (d2t(220210), d2t(220212), 4, -4.0, 104.0, 1.0), (d2t(220415), d2t(220417), 5, -20.0, 52.0, 1.0),
+                      (d2t(220421), d2t(220423), 4, 500.0, 95.0, 1.0)])   # The last trade creates a debt
+    create_actions([(d2t(220112), 1, 1, [(5, -25.0, 'fee')])])
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+
+    account = JalAccount(1)
+    timestamps = [d2t(211230) + i * 86400 for i in range(150)]
+
+    def check_positions():
+        for timestamp in timestamps:
+            positions = JalHoldings.positions(timestamp).get(account.id(), {})
+            assert JalHoldings.positions(timestamp, account.id()).get(account.id(), {}) == positions
+            assets = {x['asset'].id(): (x['amount'], x['value']) for x in account.assets_list(timestamp)}
+            assert {x['asset'].id(): (x['amount'], x['value']) for x in JalHoldings.assets_list(positions)} == assets
+            assert JalHoldings.money(positions, 2) == account.get_asset_amount(timestamp, 2)
+            assert JalHoldings.balance(positions, account, timestamp) == account.balance(timestamp)
+
+    assert JalDB._read("SELECT COUNT(DISTINCT timestamp) FROM holdings_snapshots WHERE latest=0") == 3   # No Feb end
+    assert JalDB._read("SELECT MAX(timestamp) FROM holdings_snapshots WHERE latest=1") == d2t(220421)
+    check_positions()
+    create_actions([(d2t(220301), 1, 1, [(5, -10.0, 'fee')])])   # Ledger of account is truncated by triggers
+    check_positions()
+    ledger.rebuild()
+    assert JalDB._read("SELECT COUNT(DISTINCT timestamp) FROM holdings_snapshots WHERE latest=0") == 4   # +Feb end
+    check_positions()
+    ledger.set_fixed_point(True)
+    check_positions()
+    ledger.set_fixed_point(False)
+
+
+def test_closed_trades_list(prepare_db_fifo):
+    create_stocks([('A', 'A SHARE'), ('B', 'B SHARE')], currency_id=2)   # id = 4, 5
+    create_trades(1, [(d2t(220103), d2t(220105), 4, 10.0, 100.0, 1.0), (d2t(220104), d2t(220106), 5, 20.0, 50.0, 1.0),
+                      (d2t(220110), d2t(220112), 4, -4.0, 104.0, 1.0), (d2t(221230), d2t(230103), 5, -10.0, 52.0, 1.0)])
+    create_stock_dividends([(Dividend.StockDividend, d2t(220115), 1, 4, 1.0, 2, 105.0, 0.0, 'Stock dividend +1 A')])
+    create_corporate_actions(1, [(d2t(220201), CorporateAction.Split, 4, 7.0, 'Split A 7 -> 14', [(4, 14.0, 1.0)])])
+    create_trades(1, [(d2t(220301), d2t(220303), 4, -14.0, 60.0, 2.0)])
+    Ledger().rebuild(from_timestamp=0)
+
+    ids = []
+    query = JalDB._exec("SELECT id FROM trades_closed ORDER BY id")
+    while query.next():
+        ids.append(JalDB._read_record(query, cast=[int]))
+    expected = [JalClosedTrade(x) for x in ids]
+    trades = JalAccount(1).closed_trades_list()
+    assert [x.id() for x in trades] == ids
+    for trade, old_trade in zip(trades, expected):
+        assert trade.dump() == old_trade.dump()
+        assert trade.open_operation().type() == old_trade.open_operation().type()
+        assert trade.close_operation().settlement() == old_trade.close_operation().settlement()
+
+    def select(trade_filter) -> list:
+        return [x.id() for x in expected if trade_filter(x)]
+
+    assert [x.id() for x in JalAccount(1).closed_trades_list(begin=d2t(220201), end=d2t(221231))] == \
+           select(lambda x: d2t(220201) <= x.close_operation().timestamp() <= d2t(221231))
+    assert [x.id() for x in JalAccount(1).closed_trades_list(begin=d2t(220101), end=d2t(221231), settlement=True)] == \
+           select(lambda x: x.close_operation().settlement() <= d2t(221231))
+    assert [x.id() for x in JalAccount(1).closed_trades_list(asset_types=[PredefinedAsset.Bond])] == []
+    assert [x.id() for x in JalAccount(1).closed_trades_list(open_types=[LedgerTransaction.Dividend])] == \
+           select(lambda x: x.open_operation().type() == LedgerTransaction.Dividend)
+    closed_by_split = JalAccount(1).closed_trades_list(close_types=[LedgerTransaction.CorporateAction])
+    assert [x.id() for x in closed_by_split] == \
+           select(lambda x: x.close_operation().type() == LedgerTransaction.CorporateAction)
+    assert len(closed_by_split) == 2 and closed_by_split[0].close_operation() is closed_by_split[1].close_operation()
+
+
+def test_fixed_point_ledger(prepare_db):
+    create_rebuild_operations()
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    text_ledger = dump_ledger_tables()
+
+    def ledger_metrics() -> list:
+        metrics = []
+        for account in [JalAccount(1), JalAccount(2)]:
+            metrics.append([(x['asset'].id(), x['amount'], x['value']) for x in account.assets_list(d2t(220401))])
+            metrics.append(account.get_asset_amount(d2t(220401), account.currency()))
+            metrics.append(account.get_book_turnover(BookAccount.Costs, d2t(220101), d2t(220401)))
+            metrics.append(LedgerAmounts("value_acc")[(BookAccount.Assets, account.id(), 4)])
+        return metrics
+
+    expected = ledger_metrics()
+    ledger.set_fixed_point(True)
+    assert JalDB._read("SELECT COUNT(id) FROM ledger WHERE typeof(amount_acc)!='integer'") == 0
+    assert JalDB._read("SELECT amount_acc FROM ledger WHERE account_id=1 ORDER BY id LIMIT 1") == 10000 * 10**10
+    assert ledger_metrics() == expected
+    # Precision change removes ledger of the account as its fixed-point amounts have another scale now
+    for precision in [12, 10]:
+        _ = JalDB._exec("UPDATE accounts SET precision=:precision WHERE id=1", [(":precision", precision)])
+        JalAccount(1).invalidate_cache()
+        assert JalDB._read("SELECT COUNT(id) FROM ledger WHERE account_id=1") == 0
+        assert JalDB._read("SELECT value FROM settings WHERE name='RebuildDB'") == 1
+        ledger.rebuild()
+        assert JalDB._read("SELECT amount_acc FROM ledger WHERE account_id=1 ORDER BY id LIMIT 1") == \
+               10000 * 10**precision
+        assert ledger_metrics() == expected
+    ledger.set_fixed_point(False)
+    assert dump_ledger_tables() == text_ledger
+
+
+def test_sqlite3_backend(prepare_db):
+    create_rebuild_operations()
+    ledger = Ledger()
+    ledger.rebuild(from_timestamp=0)
+    expected = dump_ledger_tables()
+    turnover = JalAccount(1).get_book_turnover(BookAccount.Costs, d2t(220101), d2t(220401))
+    db_file = JalDB._db_path()
+    try:
+        assert JalDB._open_db(DbBackend.SQLITE3, db_file) == ''
+        assert JalDB().backend_name() == DbBackend.SQLITE3
+        assert JalDB._read("SELECT name FROM accounts WHERE id=1") == 'account.USD'
+        assert JalDB._read("SELECT id, name FROM accounts WHERE id=1", named=True) == {'id': 1, 'name': 'account.USD'}
+        assert JalDB._read("SELECT NULL") == ''
+        # Failed row is reported the same way as QtSql backend does
+        for backend in [DbBackend.SQLITE3, DbBackend.QTSQL]:
+            assert JalDB._open_db(backend, db_file) == ''
+            JalDB.begin_transaction()
+            assert JalDB._active_backend().execute_many("INSERT INTO tags (id, pid, tag) VALUES (?, ?, ?)",
+                                                        [(101, 0, 'A'), (102, 0, 'B'), (101, 0, 'C')])[2] == \
+                   (101, 0, 'C')
+            JalDB().rollback()
+            assert JalDB._read("SELECT COUNT(*) FROM tags WHERE id>100") == 0
+        assert JalDB._open_db(DbBackend.SQLITE3, db_file) == ''
+        ledger.rebuild(from_timestamp=0)
+        assert dump_ledger_tables() == expected
+        assert JalAccount(1).get_book_turnover(BookAccount.Costs, d2t(220101), d2t(220401)) == turnover
+    finally:
+        assert JalDB._open_db(DbBackend.QTSQL, db_file) == ''
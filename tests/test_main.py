@@ -1,15 +1,29 @@
 import os
+import logging
 from shutil import copyfile
+from collections import deque
 import sqlite3
+import threading
+import pytest
 from decimal import Decimal
 
-from tests.fixtures import project_root
+from tests.fixtures import project_root, data_path, prepare_db, prepare_db_ledger
 from constants import Setup
 from jal.db.db import JalDB, JalDBError
+from jal.db.backend import DbBackend
+from jal.constants import MarketDataFeed, PredefinedAsset, PredefinedAccountType, QuoteCoverage, QuoteState
 from jal.db.asset import JalAsset
+from jal.db.account import JalAccount
+from jal.db.country import JalCountry
+from jal.db.category import JalCategory
+from jal.db.fx_matrix import FxMatrix
+from jal.db.quote_coverage import JalQuoteCoverage
+from jal.db.ledger import Ledger
+from jal.db.operations_model import OperationsModel
 from jal.db.helpers import get_dbfilename, localize_decimal
 from jal.db.backup_restore import JalBackup
-from tests.helpers import pop2minor_digits, d2t, dt2t
+from jal import cli
+from tests.helpers import pop2minor_digits, d2t, dt2t, create_quotes, create_actions
 
 
 # ----------------------------------------------------------------------------------------------------------------------
@@ -106,3 +120,389 @@ def test_backup_load(tmp_path, project_root):
     JalDB.connection().close()
     os.remove(target_path)  # Clean db init script
     os.remove(get_dbfilename(str(tmp_path) + os.sep))  # Clean db file
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_statement_cache(prepare_db):
+    sql = "SELECT id FROM assets WHERE id<=:id ORDER BY id"
+    stats = JalDB.statement_cache_stats()
+    assert JalDB._read(sql, [(":id", 1)]) == 1
+    assert JalDB._read(sql, [(":id", 2)]) == 1
+    assert JalDB.statement_cache_stats()['hits'] == stats['hits'] + 1
+    # Nested query with the same text shouldn't break iteration of outer query
+    pairs = []
+    outer = JalDB._exec(sql, [(":id", 2)])
+    while outer.next():
+        inner = JalDB._exec(sql, [(":id", 3)])
+        while inner.next():
+            pairs.append((outer.value(0), inner.value(0)))
+    assert pairs == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)]
+    # Query is re-used after it was released only: partly read result keeps it checked out until finish() or drop
+    stats = JalDB.statement_cache_stats()
+    held = JalDB._exec(sql, [(":id", 2)])
+    assert held.next() and held.value(0) == 1
+    assert JalDB._read(sql, [(":id", 3)]) == 1
+    assert JalDB.statement_cache_stats()['misses'] == stats['misses'] + 1
+    assert held.next() and held.value(0) == 2   # Result of held query isn't affected by other executions
+    held.finish()
+    assert not held.next()
+    assert JalDB._read(sql, [(":id", 3)]) == 1
+    assert JalDB.statement_cache_stats()['hits'] == stats['hits'] + 2
+    held = JalDB._exec(sql, [(":id", 2)])
+    assert held.next()
+    del held
+    assert JalDB._read(sql, [(":id", 3)]) == 1
+    assert JalDB.statement_cache_stats()['hits'] == stats['hits'] + 4
+    # Least recently used queries are evicted from cache
+    cache_size = JalDB.STATEMENT_CACHE_SIZE
+    JalDB.STATEMENT_CACHE_SIZE = 2
+    try:
+        for i in range(3):
+            assert JalDB._read(f"SELECT {i}") == i
+        assert JalDB.statement_cache_stats()['size'] == 2
+    finally:
+        JalDB.STATEMENT_CACHE_SIZE = cache_size
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_quotes_cache(prepare_db):
+    usd = JalAsset(2)
+    eur = JalAsset(3)
+    create_quotes(2, 1, [(d2t(230101), 70), (d2t(230201), 75)])
+    create_quotes(3, 1, [(d2t(230101), 75), (d2t(230201), 80)])
+    assert usd.quote(d2t(221231), 1) == (0, Decimal('0'))
+    assert usd.quote(d2t(230115), 1) == (d2t(230101), Decimal('70'))
+    assert usd.quote(d2t(230201), 1) == (d2t(230201), Decimal('75'))
+    assert usd.quotes(d2t(230101), d2t(230131), 1) == [(d2t(230101), Decimal('70'))]
+    assert usd.quotes_range(1) == (d2t(230101), d2t(230201))
+    assert usd.quotes_range(3) == (0, 0)
+    assert eur.quote(d2t(230215), 2) == (d2t(230215), Decimal('80') / Decimal('75'))   # cross-rate via base currency
+    assert JalAsset.get_base_currency(d2t(230101)) == 1
+    assert JalAsset.get_base_currency(0) == 0
+    # Cached series is updated by set_quotes() and should be dropped explicitly after direct modification of db
+    create_quotes(2, 1, [(d2t(230110), 72)])
+    assert usd.quote(d2t(230115), 1) == (d2t(230110), Decimal('72'))
+    _ = JalDB._exec("DELETE FROM quotes WHERE asset_id=2 AND timestamp=:timestamp", [(":timestamp", d2t(230110))])
+    assert usd.quote(d2t(230115), 1) == (d2t(230110), Decimal('72'))
+    JalAsset.drop_quotes_cache(2, 1)
+    assert usd.quote(d2t(230115), 1) == (d2t(230101), Decimal('70'))
+    # Least recently used series are evicted if cache is full
+    cache_size = JalAsset.QUOTES_CACHE_SIZE
+    JalAsset.QUOTES_CACHE_SIZE = 4
+    try:
+        JalAsset.drop_quotes_cache()
+        assert usd.quote(d2t(230115), 1)[1] == Decimal('70')
+        assert eur.quote(d2t(230115), 1)[1] == Decimal('75')
+        assert list(JalAsset._quotes_cache.keys()) == [(3, 1)]
+        assert usd.quote(d2t(230115), 1)[1] == Decimal('70')
+        assert list(JalAsset._quotes_cache.keys()) == [(2, 1)]
+    finally:
+        JalAsset.QUOTES_CACHE_SIZE = cache_size
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_set_quotes(prepare_db, monkeypatch):
+    monkeypatch.setattr(JalAsset, 'QUOTES_CHUNK', 3)
+    usd = JalAsset(2)
+    stats = usd.set_quotes_columns([d2t(230101) + i * 86400 for i in range(10)] + [None, d2t(230201), d2t(230202)],
+                                   [Decimal(70 + i) for i in range(10)] + [Decimal('1'), float('nan'), None], 1)
+    assert stats == {'new': 10, 'updated': 0, 'unchanged': 0}
+    assert JalDB._read("SELECT COUNT(*) FROM quotes WHERE asset_id=2") == 10
+    assert usd.quotes(d2t(230101), d2t(230201), 1)[-1] == (d2t(230110), Decimal('79'))
+    stats = usd.set_quotes([{'timestamp': d2t(230110), 'quote': Decimal('79.0')},
+                            {'timestamp': d2t(230109), 'quote': Decimal('80')},
+                            {'timestamp': d2t(230111), 'quote': Decimal('81')},
+                            {'timestamp': d2t(230112), 'quote': '82'},
+                            {'timestamp': d2t(230113), 'quote': None}], 1)
+    assert stats == {'new': 2, 'updated': 1, 'unchanged': 1}
+    assert usd.quote(d2t(230115), 1) == (d2t(230112), Decimal('82'))
+    assert usd.quote(d2t(230109), 1) == (d2t(230109), Decimal('80'))
+    assert usd.set_quotes([{'timestamp': None, 'quote': Decimal('1')}], 1) == {'new': 0, 'updated': 0, 'unchanged': 0}
+    # Nothing is stored if any chunk fails
+    _ = JalDB._exec(f"CREATE TEMP TRIGGER fail_quote BEFORE INSERT ON quotes WHEN NEW.timestamp={d2t(230125)} "
+                    f"BEGIN SELECT RAISE(ABORT, 'Test failure'); END")
+    stats = usd.set_quotes_columns([d2t(230120) + i * 86400 for i in range(10)], [Decimal(90 + i) for i in range(10)], 1)
+    assert stats == {'new': 0, 'updated': 0, 'unchanged': 0}
+    assert JalDB._read("SELECT COUNT(*) FROM quotes WHERE asset_id=2 AND timestamp>=:begin",
+                       [(":begin", d2t(230120))]) == 0
+    _ = JalDB._exec("DROP TRIGGER fail_quote")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_quotes_coverage(prepare_db, monkeypatch):
+    usd = JalAsset(2)
+    create_quotes(2, 1, [(d2t(230102), 70), (d2t(230103), 71), (d2t(230106), 72), (d2t(230109), 73)])
+    coverage = usd.quotes_coverage(1)
+    assert coverage.plan(d2t(230101), d2t(230110), usd.quoted_days(d2t(230101), d2t(230110), 1)) == \
+           [(d2t(230101), d2t(230110))]   # Gaps are merged into one interval
+    coverage.record(d2t(230101), d2t(230110) + 86399, usd.quoted_days(d2t(230101), d2t(230110) + 86399, 1))
+    M, C = QuoteCoverage.Missing, QuoteCoverage.Complete
+    intervals = [(d2t(230101), d2t(230101), M), (d2t(230102), d2t(230103), C), (d2t(230104), d2t(230105), M),
+                 (d2t(230106), d2t(230106), C), (d2t(230107), d2t(230108), M), (d2t(230109), d2t(230109), C)]
+    assert coverage.intervals() == intervals   # Days after the last quote aren't known yet
+    assert usd.quote_state(d2t(221231), 1) == QuoteState.NoData
+    assert usd.quote_state(d2t(230108) + 3600, 1) == QuoteState.Actual
+    assert usd.quote_state(d2t(230110), 1) == QuoteState.Stale
+    assert usd.quote_state(d2t(230110), 2) == QuoteState.Actual
+    end = d2t(230131) + 86399
+    assert coverage.plan(d2t(230101), end, usd.quoted_days(d2t(230101), end, 1)) == [(d2t(230110), end)]
+    _ = JalDB._exec("DELETE FROM quotes WHERE asset_id=2 AND timestamp=:timestamp", [(":timestamp", d2t(230103))])
+    JalAsset.drop_quotes_cache(2, 1)
+    monkeypatch.setattr(JalQuoteCoverage, 'MERGE_GAP', 3)
+    assert coverage.plan(d2t(230101), end, usd.quoted_days(d2t(230101), end, 1)) == \
+           [(d2t(230103), d2t(230103) + 86399), (d2t(230110), end)]   # Deleted quote is requested again
+    coverage.record_failure(d2t(230109), d2t(230111))
+    assert coverage.status(d2t(230109)) == QuoteCoverage.Complete
+    assert coverage.status(d2t(230111) + 7200) == QuoteCoverage.Failed
+    assert usd.quote_state(d2t(230111), 1) == QuoteState.Stale
+    JalQuoteCoverage._intervals = {}   # Coverage index is kept in database
+    assert usd.quotes_coverage(1).intervals() == intervals + [(d2t(230110), d2t(230111), QuoteCoverage.Failed)]
+    # Days without reply aren't marked as days without quotes even if they are before the last quote
+    coverage = usd.quotes_coverage(1)
+    coverage.record(d2t(230112), d2t(230115) + 86399, {d2t(230115)}, [d2t(230113)])
+    assert [coverage.status(d2t(x)) for x in [230112, 230113, 230114, 230115]] == \
+           [M, QuoteCoverage.Failed, M, C]
+    assert coverage.missing_days(d2t(230112), d2t(230115), {d2t(230115)}) == [d2t(230113)]
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_fx_matrix(prepare_db_ledger, monkeypatch):
+    create_quotes(2, 1, [(d2t(230101), 70), (d2t(230201), 75)])
+    create_quotes(3, 1, [(d2t(230101), 75), (d2t(230201), 80)])
+    assert FxMatrix.rate(d2t(221231), 2, 1) == 0
+    assert FxMatrix.rate(d2t(230115), 2, 1) == 70   # forward-filled direct rate
+    assert FxMatrix.rate(d2t(230115), 2, 2) == 1
+    assert FxMatrix.rate(d2t(230301), 3, 2) == pytest.approx(80 / 75)   # cross-rate via base currency
+    assert list(FxMatrix.rates([d2t(230101), d2t(230201), d2t(230201)], [2, 3, 1], 1)) == [70, 80, 1]
+    # Matrix is updated incrementally after set_quotes() and is re-built after direct modification of db
+    create_quotes(2, 1, [(d2t(230110), 72)])
+    assert FxMatrix.rate(d2t(230115), 2, 1) == 72
+    assert FxMatrix.rate(d2t(230215), 2, 1) == 75
+    _ = JalDB._exec("DELETE FROM quotes WHERE asset_id=2 AND timestamp=:timestamp", [(":timestamp", d2t(230110))])
+    JalAsset.drop_quotes_cache()
+    assert FxMatrix.rate(d2t(230115), 2, 1) == 70
+    # Change of quote value is noticed both after direct modification of db and after set_quotes()
+    _ = JalDB._exec("UPDATE quotes SET quote='71' WHERE asset_id=2 AND timestamp=:timestamp",
+                    [(":timestamp", d2t(230101))])
+    JalAsset.drop_quotes_cache()
+    assert FxMatrix.rate(d2t(230115), 2, 1) == 71
+    assert JalAsset(2).set_quotes([{'timestamp': d2t(230101), 'quote': Decimal('70')}], 1)['updated'] == 1
+    assert FxMatrix.rate(d2t(230115), 2, 1) == 70
+    # Matrix is stored in file next to database and is loaded from it after re-connection
+    assert os.path.exists(JalDB._db_path() + FxMatrix.FILE_SUFFIX + ".npy")
+    FxMatrix._connection = None
+    assert FxMatrix.rate(d2t(230115), 3, 1) == 75
+    # Turnover of category is converted into other currency with rates from matrix
+    create_actions([(d2t(230115), 1, 1, [(7, 140.0)])])
+    Ledger().rebuild(from_timestamp=0)
+    turnover = JalCategory(7).get_turnover(d2t(230101), d2t(230201), 1)
+    assert turnover != Decimal('0')
+    assert JalCategory(7).get_turnover(d2t(230101), d2t(230201), 2) == pytest.approx(turnover / Decimal('70'))
+    # Turnovers of all categories are calculated for all periods at once
+    create_actions([(d2t(230210), 1, 1, [(7, 10.0), (5, -3.0)]), (d2t(230305), 1, 1, [(5, -4.0)])])
+    Ledger().rebuild(from_timestamp=0)
+    periods = [(d2t(230101), d2t(230131)), (d2t(230201), d2t(230228)), (d2t(230301), d2t(230331))]
+    for currency_id in [1, 2]:
+        turnovers = JalCategory.get_turnovers(periods, currency_id)
+        assert sorted(turnovers.keys()) == [5, 7]
+        for category_id in [5, 7]:
+            expected = [JalCategory(category_id).get_turnover(begin, end, currency_id) for begin, end in periods]
+            assert turnovers[category_id] == pytest.approx(expected)
+    assert JalCategory.get_turnovers(periods, 1)[5] == [Decimal('0'), Decimal('-3'), Decimal('-4')]
+    assert JalCategory.get_turnovers([], 1) == {}
+    # Absence of rate is reported for amounts that can't be converted
+    warnings = []
+    monkeypatch.setattr(logging, "warning", lambda message: warnings.append(message))
+    create_actions([(d2t(221215), 1, 1, [(7, 5.0)])])
+    Ledger().rebuild(from_timestamp=0)
+    assert JalCategory(7).get_turnover(d2t(221201), d2t(221231), 2) == Decimal('0')
+    assert JalCategory.get_turnovers([(d2t(221201), d2t(221231))], 2)[7] == [Decimal('0')]
+    assert len(warnings) == 2 and warnings[0].startswith("There are no quote/rate for ")
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_reference_caches(prepare_db_ledger):
+    asset = JalAsset(data={'type': PredefinedAsset.Bond, 'name': 'Test Bond', 'isin': 'RU000A0JX0J2'}, create=True)
+    asset.add_symbol('TBND', 1)
+    asset.update_data({'reg_number': '4-01-00001-A'})
+    assert JalAsset(data={'isin': 'RU000A0JX0J2'}, search=True).id() == asset.id()
+    assert JalAsset(data={'isin': 'RU000A0JX0J2', 'symbol': 'TBND2'}, search=True).id() == asset.id()
+    assert JalAsset(data={'reg_number': '4-01-00001-A'}, search=True).id() == asset.id()
+    assert JalAsset(data={'symbol': 'tbnd', 'type': PredefinedAsset.Bond}, search=True).id() == asset.id()
+    assert JalAsset(data={'symbol': 'TBND', 'type': PredefinedAsset.Stock}, search=True).id() == 0
+    assert JalAsset(data={'name': 'TEST BOND'}, search=True).id() == asset.id()
+    # Symbol change is visible without full cache reload
+    asset.add_symbol('TBND2', 1)
+    assert JalAsset(data={'symbol': 'TBND'}, search=True).id() == 0
+    assert JalAsset(data={'symbol': 'TBND2'}, search=True).id() == asset.id()
+    assert JalAsset(asset.id()).symbol(1) == 'TBND2'
+    assert JalAsset(2).quote_source(None) == MarketDataFeed.FX
+    # Accounts are found by number and currency, new currency account is created from similar one
+    account = JalAccount(data={'type': PredefinedAccountType.Cash, 'number': 'N/A', 'currency': 2}, search=True, create=True)
+    assert account.id() == 2 and account.name() == 'Wallet.USD'
+    assert JalAccount(data={'number': 'N/A', 'currency': 2}, search=True).id() == 2
+    assert JalAccount(data={'number': 'N/A', 'currency': 1}, search=True).id() == 1
+    assert JalAccount(data={'number': 'N/A', 'currency': 3}, search=True).id() == 0
+    assert JalCountry(data={'code': 'us'}, search=True).id() == 2
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_operations_model_cache(prepare_db_ledger, monkeypatch):
+    from PySide6.QtWidgets import QApplication, QTableView
+    from jal.db.operations import LedgerTransaction
+    app = QApplication.instance() or QApplication([])   # Widgets require application object
+    create_actions([(d2t(230101 + i), 1, 1, [(7, 10.0 + i)]) for i in range(5)])
+    Ledger().rebuild(from_timestamp=0)
+    preload_calls = []   # lists of operations that were loaded by the model
+    preload = LedgerTransaction.preload
+
+    def tracked_preload(timestamp=0, operations=None, totals=False):
+        if operations is not None:
+            preload_calls.append(operations)
+        return preload(timestamp, operations, totals)
+
+    monkeypatch.setattr(LedgerTransaction, "preload", tracked_preload)
+    view = QTableView()
+    model = OperationsModel(view)
+    model.setDateRange(d2t(230101), d2t(231231))
+    assert model.rowCount() == 5
+    totals = [model.data(model.index(row, 4))[0] for row in range(model.rowCount())]
+    assert totals == [Decimal('10'), Decimal('21'), Decimal('33'), Decimal('46'), Decimal('60')]
+    assert model.data(model.index(2, 3)) == [Decimal('12')]
+    assert len(preload_calls) == 1 and len(preload_calls[0]) == 5   # all rows were loaded at once
+    # Rows after ledger frontier are re-loaded after ledger update
+    _ = JalDB._exec("UPDATE action_details SET amount=100 WHERE pid=4")
+    Ledger().rebuild(from_timestamp=d2t(230104))
+    model.ledger_updated()
+    assert model.data(model.index(4, 4)) == [Decimal('147')]
+    assert len(preload_calls) == 2 and len(preload_calls[1]) == 2
+    # All rows are re-loaded after model reset
+    model.update()
+    assert model.data(model.index(0, 3)) == [Decimal('10')]
+    assert len(preload_calls) == 3 and len(preload_calls[2]) == 5
+    # Operations are loaded page by page
+    monkeypatch.setattr(OperationsModel, "PAGE_SIZE", 2)
+    model.update()
+    assert model.rowCount() == 2 and model.canFetchMore()
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == 5
+    assert [model.data(model.index(row, 3))[0] for row in range(model.rowCount())] == \
+           [Decimal('10'), Decimal('11'), Decimal('12'), Decimal('100'), Decimal('14')]
+    # Only frontiers of the last re-builds are kept, older re-builds are treated as re-builds from scratch
+    seen = Ledger.rebuild_count
+    for timestamp in [d2t(230105), d2t(230103), d2t(230104)]:
+        Ledger().rebuild(from_timestamp=timestamp)
+    assert Ledger.frontier_since(seen) == (d2t(230103), seen + 3)
+    assert Ledger.frontier_since(seen + 3) == (0, seen + 3)
+    monkeypatch.setattr(Ledger, "rebuilds", deque(list(Ledger.rebuilds)[-2:], maxlen=2))
+    assert Ledger.frontier_since(seen) == (0, seen + 3)
+    assert Ledger.frontier_since(seen + 1) == (d2t(230103), seen + 3)
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_connection_pool(tmp_path, prepare_db):
+    assert JalDB._read("PRAGMA journal_mode") == 'wal'
+    assert JalDB._read("PRAGMA cache_size") == Setup.DB_PRAGMAS['cache_size']
+    # Readers see committed data only, they aren't blocked by write transaction and can't write themselves
+    JalDB.begin_transaction()
+    _ = JalDB._exec("UPDATE settings SET value='uncommitted' WHERE name='MessageOnce'")
+    results = []
+
+    def read_settings():
+        with JalDB.reader():
+            results.append((JalDB._read("SELECT value FROM settings WHERE name='MessageOnce'"),
+                            JalDB._exec("UPDATE settings SET value='' WHERE name='MessageOnce'")))
+
+    readers = [threading.Thread(target=read_settings) for _ in range(Setup.DB_READERS + 2)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(timeout=30)
+    JalDB.commit()
+    assert results == [('', None)] * len(readers)
+    assert 0 < JalDB._pool.size() <= Setup.DB_READERS
+    assert JalDB._read("SELECT value FROM settings WHERE name='MessageOnce'") == 'uncommitted'
+
+    # Pragmas are overridden by settings
+    _ = JalDB._exec("UPDATE settings SET value='{\"mmap_size\": 0, \"cache_size\": null}' WHERE name='DbPragmas'",
+                    commit=True)
+    assert JalDB().init_db(str(tmp_path) + os.sep).code == JalDBError.NoError
+    assert JalDB._read("PRAGMA mmap_size") == 0
+    assert JalDB._read("PRAGMA cache_size") == -2000   # SQLite default
+    with JalDB.reader():
+        assert JalDB._read("PRAGMA mmap_size") == 0
+
+    # Backend is selected by settings if it isn't given explicitly
+    _ = JalDB._exec("UPDATE settings SET value='sqlite3' WHERE name='DbBackend'", commit=True)
+    assert JalDB().init_db(str(tmp_path) + os.sep).code == JalDBError.NoError
+    assert JalDB.backend_name() == DbBackend.SQLITE3
+    values = "SELECT '0.1' UNION ALL SELECT '0.2' UNION ALL SELECT ''"
+    assert JalDB._ledger_sum(values, [], 2) == Decimal('0.3')   # Exact sum of text values by DECIMAL_SUM()
+    assert JalDB().init_db(str(tmp_path) + os.sep, backend=DbBackend.QTSQL).code == JalDBError.NoError
+    assert JalDB.backend_name() == DbBackend.QTSQL
+    assert JalDB._ledger_sum(values.replace(" UNION ALL SELECT ''", ""), [], 2) == Decimal('0.3')
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_cli(tmp_path, project_root, data_path):
+    src_path = project_root + os.sep + 'jal' + os.sep + Setup.INIT_SCRIPT_PATH
+    target_path = str(tmp_path) + os.sep + Setup.INIT_SCRIPT_PATH
+    copyfile(src_path, target_path)
+    db_path = ['--data-path', str(tmp_path)]
+    assert cli.has_command(['file.xml', 'import']) is False
+    assert cli.has_command(['--verbose', '--data-path', 'rebuild', 'file.xml']) is False
+    assert cli.has_command(['--data-path=import', '--verbose', 'import', 'file.xml']) is True
+    assert cli.has_command(['--help']) is True and cli.has_command([]) is False
+
+    assert cli.main(db_path + ['rebuild', '--full']) == cli.EXIT_OK    # creates new database
+    assert cli.main(db_path + ['import', '--format', 'unknown', 'statement.xml']) == cli.EXIT_FAILURE
+    assert cli.main(db_path + ['import', '--format', 'ibkr', data_path + 'missing.xml']) == cli.EXIT_FAILURE
+    assert cli.main(db_path + ['import', '--format', 'ibkr', data_path + 'ibkr_dividends.xml']) == cli.EXIT_OK
+    # Repeated import overlaps with imported operations and is done only if it is allowed explicitly
+    assert cli.main(db_path + ['import', '--format', 'ibkr', data_path + 'ibkr_dividends.xml']) == cli.EXIT_FAILURE
+    assert cli.main(db_path + ['import', '--format', 'ibkr', '--allow-overlap',
+                               data_path + 'ibkr_dividends.xml']) == cli.EXIT_OK
+    assert cli.main(db_path + ['rebuild', '--from', '2020-01-01', '--workers', '2']) == cli.EXIT_OK
+    assert cli.main(db_path + ['rebuild', '--fixed-point', 'on']) == cli.EXIT_OK
+    connection = sqlite3.connect(get_dbfilename(str(tmp_path) + os.sep))
+    assert connection.execute("SELECT value, (SELECT typeof(amount) FROM ledger LIMIT 1) FROM settings "
+                              "WHERE name='LedgerFixedPoint'").fetchone() == (1, 'integer')
+    connection.close()
+    assert cli.main(db_path + ['tax', '--country', 'xx', '--year', '2020', '--account', 'U7654321',
+                               '--output', str(tmp_path) + os.sep + 'taxes.xlsx']) == cli.EXIT_FAILURE
+    assert cli.main(db_path + ['tax', '--country', 'ru', '--year', '2020', '--account', 'U7654321',
+                               '--output', str(tmp_path) + os.sep + 'taxes.xlsx']) == cli.EXIT_OK
+    assert os.path.getsize(str(tmp_path) + os.sep + 'taxes.xlsx') > 0
+    with pytest.raises(SystemExit):
+        cli.main(db_path + ['quotes', '--start', '2020-01-01', '--sources', 'FX,NOWHERE'])
+
+    # Database is closed after every command
+    os.remove(target_path)
+    os.remove(get_dbfilename(str(tmp_path) + os.sep))
+
+
+# ----------------------------------------------------------------------------------------------------------------------
+def test_log_viewer_threads():
+    import logging
+    from PySide6.QtWidgets import QApplication, QStatusBar
+    from jal.widgets.custom.log_viewer import LogViewer
+
+    app = QApplication.instance() or QApplication([])   # Widgets require application object
+    viewer = LogViewer()
+    status_bar = QStatusBar()
+    viewer.setStatusBar(status_bar)
+    viewer.startLogging()
+    try:
+        logging.info("Main thread message")
+        assert viewer.toPlainText().endswith("Main thread message")   # Is displayed immediately in GUI thread
+
+        worker = threading.Thread(target=lambda: logging.warning("Worker thread message"))
+        worker.start()
+        worker.join()
+        assert "Worker thread message" not in viewer.toPlainText()    # Isn't touched from worker thread
+        app.processEvents()
+        assert viewer.toPlainText().endswith("Worker thread message")
+    finally:
+        viewer.stopLogging()
+        logging.raiseExceptions = True